@@ -0,0 +1,173 @@
+"""
+報酬分析：由逐年現金流計算內部報酬率 (IRR)、損益兩平年度與累積報酬率 (ROI)
+現金流慣例：第 t 年的繳費在年初支付，價值 (總淨資產、帳戶價值) 為第 t 年末的數值
+
+IRR 以整批情境同時求解：每個情境的現金流為矩陣的一列 (最後一欄為結清的那一期，期數較少的情境在前面補 0)，
+以牛頓法為主、超出夾擠區間或導數為 0 時改走二分法，一般 5~8 輪收斂；逐列計算，不需逐情境呼叫
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+IRR_BOUNDS = (-0.99, 1.0)   # 搜尋範圍；根不在範圍內的情境為 NaN
+SMALL_BATCH = 64            # 情境數少於此時直接以次方矩陣計算 (逐期迴圈的固定成本較高)
+
+
+def _fv_and_slope(columns, growth):
+    """
+    各情境以成長率 growth (= 1 + r) 複利到最後一期的終值，及對 growth 的導數
+    columns 為轉置後的現金流 (期數, 情境)，以 Horner 法逐期累加 (不需逐項計算次方)
+    """
+    if len(growth) < SMALL_BATCH:
+        exponents = np.arange(len(columns) - 1, -1, -1, dtype=float)[:, None]
+        terms = columns * growth ** exponents
+        return terms.sum(axis=0), (terms * exponents).sum(axis=0) / growth
+    value = np.zeros(len(growth))
+    slope = np.zeros(len(growth))
+    for flow in columns:
+        slope *= growth
+        slope += value
+        value *= growth
+        value += flow
+    return value, slope
+
+
+def irr(cash_flows, tol=1e-12, max_iter=60):
+    """
+    cash_flows: (情境, 期數) 每期現金流 (流出為負，最後一欄為最後一期)；一維時視為單一情境
+    回傳各情境的每期報酬率；只有流出、只有流入或根不在 IRR_BOUNDS 內為 NaN
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    n, m = cash_flows.shape
+    exponents = np.arange(m - 1, -1, -1, dtype=float)
+    outflow = np.minimum(cash_flows, 0)
+    paid = -outflow.sum(axis=1)
+    received = cash_flows.sum(axis=1) + paid
+    # 各列前段補的 0 不影響終值，從第一個有現金流的期數開始累加
+    nonzero = np.flatnonzero(cash_flows.any(axis=0))
+    columns = np.ascontiguousarray(cash_flows[:, nonzero[0]:].T) if nonzero.size else np.zeros((0, n))
+    low = np.full(n, 1 + IRR_BOUNDS[0])
+    high = np.full(n, 1 + IRR_BOUNDS[1])
+    f_low, _ = _fv_and_slope(columns, low)
+    f_high, _ = _fv_and_slope(columns, high)
+    solvable = (np.sign(f_low) * np.sign(f_high) <= 0) & ((paid > 0) | (received > 0))
+
+    # 初始值：流入/流出比例依流出的平均期數開根號
+    duration = np.divide(-(outflow @ exponents), paid, out=np.ones(n), where=paid > 0)
+    ratio = np.divide(received, paid, out=np.ones(n), where=paid > 0)
+    growth = np.clip(np.maximum(ratio, 1e-12) ** (1 / np.maximum(duration, 1)), low, high)
+
+    active = solvable.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+        g = growth[idx]
+        value, slope = _fv_and_slope(columns if len(idx) == n else columns[:, idx], g)
+        # 依符號縮小夾擠區間 (與下界同號則取代下界)
+        same_as_low = np.sign(value) == np.sign(f_low[idx])
+        low[idx] = np.where(same_as_low, g, low[idx])
+        f_low[idx] = np.where(same_as_low, value, f_low[idx])
+        high[idx] = np.where(same_as_low, high[idx], g)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = g - value / slope
+        bisect = ~np.isfinite(step) | (step < low[idx]) | (step > high[idx])
+        new = np.where(value == 0, g, np.where(bisect, (low[idx] + high[idx]) / 2, step))
+        growth[idx] = new
+        converged = (np.abs(new - g) <= tol * np.maximum(1, np.abs(g))) | (value == 0) | (high[idx] - low[idx] <= tol)
+        active[idx[converged]] = False
+
+    rate = growth - 1
+    rate[~solvable] = np.nan
+    return rate
+
+
+def settled_flows(paid, value, end=None):
+    """
+    年初繳費、年末結清 -> irr 的現金流矩陣 (各列右對齊)
+    paid: (情境, 年數) 每年繳費；value: 各情境結清時的價值
+    end: 各情境結清的年度索引 (預設為最後一年)；小於 0 的情境整列為 0 (IRR 為 NaN)
+    """
+    paid = np.atleast_2d(np.asarray(paid, dtype=float))
+    n, years = paid.shape
+    if end is None:
+        end = np.full(n, years - 1)
+    else:
+        end = np.broadcast_to(np.asarray(end, dtype=np.int64), (n,))
+        years = min(years, int(end.max()) + 1) if n else years  # 最晚結清年度之後的繳費不影響
+        paid = paid[:, :years]
+    flows = np.zeros((n, years + 1))
+    # 左側補 years 個 0 後，第 i 列取 [end + 1, end + 1 + years) 的視窗即為右對齊 (j > end 的年度移出範圍)
+    padded = np.zeros((n, 2 * years))
+    padded[:, years:] = paid
+    flows[:, :years] = sliding_window_view(padded, years, axis=1)[np.arange(n), end + 1]
+    np.negative(flows[:, :years], out=flows[:, :years])
+    valid = end >= 0
+    flows[valid, years] = np.broadcast_to(np.asarray(value, dtype=float), (n,))[valid]
+    return flows
+
+
+def settled_irr(paid, value, end=None):
+    """整批情境：繳費後於 end 年末 (預設最後一年) 以 value 結清的 IRR；價值 0 以下為 -100%"""
+    rate = irr(settled_flows(paid, value, end))
+    value = np.broadcast_to(np.asarray(value, dtype=float), rate.shape)
+    paid = np.atleast_2d(np.asarray(paid, dtype=float))
+    rate[(value <= 0) & (paid.sum(axis=1) > 0)] = -1.0
+    return rate
+
+
+def irr_by_year(paid, value):
+    """單一情境：每個年度都視為在該年末結清 (取得 value[t])，回傳逐年 IRR"""
+    paid = np.asarray(paid, dtype=float)
+    n = len(paid)
+    rate = settled_irr(np.broadcast_to(paid, (n, n)), value, np.arange(n))
+    rate[np.cumsum(paid) <= 0] = np.nan
+    return rate
+
+
+def roi(cumulative_paid, value):
+    """累積報酬率 = 價值 / 累積繳費 - 1 (尚未繳費為 NaN)"""
+    cumulative_paid = np.asarray(cumulative_paid, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(cumulative_paid > 0, np.asarray(value, dtype=float) / cumulative_paid - 1, np.nan)
+
+
+def break_even_year(cumulative_paid, value):
+    """
+    價值第一次不低於累積繳費的保單年度 (1 起算)，未達成為 0
+    輸入為 (情境, 年數) 矩陣時逐列計算
+    """
+    cumulative_paid = np.asarray(cumulative_paid, dtype=float)
+    hit = (cumulative_paid > 0) & (np.asarray(value, dtype=float) >= cumulative_paid)
+    if hit.shape[-1] == 0:
+        return np.zeros(hit.shape[:-1], dtype=np.int64)
+    first = np.argmax(hit, axis=-1)
+    return np.where(hit.any(axis=-1), first + 1, 0)
+
+
+def stack_rows(flat, lengths):
+    """串接的各情境逐年資料 -> (情境, 最長年數) 矩陣 (不足補 0) 與有效格遮罩"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    width = int(lengths.max()) if lengths.size else 0
+    valid = np.arange(width)[None, :] < lengths[:, None]
+    matrix = np.zeros(valid.shape)
+    matrix[valid] = flat
+    return matrix, valid
+
+
+def batch_metrics(paid, value, lengths):
+    """
+    長表用：串接的各情境逐年繳費與價值 (lengths 為各情境年數) -> 同長度的分析欄位
+    cumulative_paid / roi 為逐年數值；irr (最後一年末結清) 與 break_even_year 為情境層級，重複填入該情境各列
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    paid_rows, valid = stack_rows(np.asarray(paid, dtype=float), lengths)
+    value_rows, _ = stack_rows(np.asarray(value, dtype=float), lengths)
+    cumulative = np.cumsum(paid_rows, axis=1)
+    end = lengths - 1
+    final = value_rows[np.arange(len(lengths)), np.maximum(end, 0)] if valid.size else np.zeros(len(lengths))
+    return {
+        "cumulative_paid": cumulative[valid],
+        "roi": roi(cumulative[valid], value_rows[valid]),
+        "irr": np.repeat(settled_irr(paid_rows, final, end), lengths),
+        "break_even_year": np.repeat(break_even_year(cumulative, value_rows), lengths),
+    }
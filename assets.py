@@ -0,0 +1,107 @@
+"""
+頁面靜態資源 (圖片、CSS)，行程內只準備一次，各使用者與每次重跑共用
+- 圖片：只使用 assets/ 內隨程式打包的檔案，執行期不對外連線；圖片在建置時以 python assets.py 下載，
+  下載失敗時建置失敗 (結束碼 1)；執行期缺檔時頁面顯示警告，不改由原網址載入
+- CSS：assets/*.css 讀檔、壓縮空白後快取為一段 <style>；Streamlit 每次重跑會清除未重新輸出的元素，
+  樣式仍需每次輸出，但只是送出快取好的字串，不再重建
+
+    python assets.py           # 下載遠端圖片到 assets/ (建置容器映像時執行，失敗則結束碼為 1)
+    python assets.py --check   # 只檢查圖片是否都已打包 (不連線)，缺檔時結束碼為 1
+"""
+import functools
+import os
+import re
+import sys
+import tempfile
+import urllib.request
+
+from metrics import count
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+DOWNLOAD_TIMEOUT = 30  # 秒 (只在建置時下載)
+
+# 名稱 -> (檔名, 原始網址；只供 python assets.py 下載)
+IMAGES = {
+    "pai_offset": ("pai_offset.png", "https://i.postimg.cc/9Mwkq4c1/Gemini-Generated-Image-57o51457o51457o5.png"),
+    "pai_compound": ("pai_compound.png", "https://i.postimg.cc/SxKDMXr6/Gemini-Generated-Image-p41a4fp41a4fp41a.png"),
+}
+
+
+def _download(url, path):
+    """下載到暫存檔再改名，多個行程同時下載也不會讀到寫一半的檔案"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        data = response.read()
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+@functools.lru_cache(maxsize=None)
+def image(name):
+    """打包圖片的本機路徑，可直接傳給 st.image；缺檔時拋出 FileNotFoundError"""
+    filename, _ = IMAGES[name]
+    path = os.path.join(ASSETS_DIR, filename)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"缺少圖片 assets/{filename}，請於建置時執行 python assets.py")
+    return path
+
+
+def render_image(container, name):
+    """頁面使用：輸出打包的圖片；缺檔時顯示警告 (不改由網址載入)"""
+    try:
+        path = image(name)
+    except FileNotFoundError as e:
+        count("assets.missing")
+        container.warning(f"⚠️ {e}")
+        return
+    container.image(path, use_container_width=True)
+
+
+@functools.lru_cache(maxsize=None)
+def stylesheet(*names):
+    """assets/ 下的 CSS 檔依序合併、壓縮空白，包成 <style> 字串"""
+    parts = []
+    for name in names:
+        with open(os.path.join(ASSETS_DIR, name), encoding="utf-8") as f:
+            parts.append(f.read())
+    css = re.sub(r"\s+", " ", "\n".join(parts))
+    css = re.sub(r"\s*([{};:,])\s*", r"\1", css).strip()
+    return f"<style>{css}</style>"
+
+
+def inject_css(*names):
+    """頁面使用：輸出 stylesheet(*names)"""
+    import streamlit as st
+
+    st.markdown(stylesheet(*names), unsafe_allow_html=True)
+
+
+def missing_images():
+    """尚未打包的圖片檔名"""
+    return [filename for filename, _ in IMAGES.values() if not os.path.exists(os.path.join(ASSETS_DIR, filename))]
+
+
+def fetch_images():
+    """下載所有圖片到 assets/ (已存在的略過)"""
+    for filename, url in IMAGES.values():
+        path = os.path.join(ASSETS_DIR, filename)
+        if os.path.exists(path):
+            print(f"已存在 {path}")
+            continue
+        _download(url, path)
+        print(f"已下載 {path}")
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv[1:]:
+        missing = missing_images()
+        if missing:
+            sys.exit("缺少圖片：" + ", ".join(missing) + " (請執行 python assets.py)")
+        print("圖片皆已打包")
+        sys.exit(0)
+    try:
+        fetch_images()
+    except OSError as e:
+        sys.exit(f"下載失敗：{e}")
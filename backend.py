@@ -0,0 +1,275 @@
+"""
+背景試算：耗時的試算 (蒙地卡羅、大批次) 送到所有使用者共用的行程池執行，
+頁面的 script thread 只負責送出與輪詢，不會被長時間佔住，也不受 GIL 影響
+- 相同輸入同時送出時共用同一個工作 (request coalescing)，完成的結果保留在 LRU 快取
+- 工作可回報進度 (0~1)；使用者改變輸入時取消舊工作，執行中的工作在下一次回報進度時中止
+
+工作行程數由環境變數 PAI_WORKERS 設定 (預設為 CPU 數；0 表示不開行程池，直接在呼叫端執行)
+"""
+import contextlib
+import multiprocessing as mp
+import os
+import sys
+import threading
+import types
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import CACHES, LRUCache, freeze
+from metrics import count
+
+WORKERS = int(os.environ.get("PAI_WORKERS", os.cpu_count() or 1))
+MAX_SLOTS = 256         # 同時追蹤進度的工作數上限 (超過時仍可執行，只是沒有進度)
+
+# 工作行程內的狀態 (由 initializer 設定)
+_progress = None        # 共享記憶體：各 slot 的進度
+_cancel = None          # 共享記憶體：各 slot 的取消旗標
+_slot = None            # 目前執行中工作的 slot
+
+
+def _freeze(value):
+    return freeze(value) if isinstance(value, dict) else value
+
+
+class Cancelled(Exception):
+    """工作被取消"""
+
+
+def _init_worker(progress, cancel):
+    global _progress, _cancel
+    _progress, _cancel = progress, cancel
+
+
+def _report(done, total):
+    """工作內回報進度 (傳給試算函式的 progress 參數)；已被取消時拋出 Cancelled 中止試算"""
+    if _slot is None:
+        return
+    _progress[_slot] = done / total if total else 1.0
+    if _cancel[_slot]:
+        raise Cancelled()
+
+
+@contextlib.contextmanager
+def _page_main_hidden():
+    """
+    spawn 的工作行程啟動時會重新執行父行程的 __main__，而 Streamlit 執行頁面時 __main__ 就是頁面本身；
+    送出工作 (行程池在此時才啟動工作行程) 期間暫時換成空模組，工作行程只載入試算模組
+    """
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _run(slot, func, args, kwargs, with_progress):
+    global _slot
+    _slot = slot
+    try:
+        if with_progress:
+            kwargs = dict(kwargs, progress=_report)
+        return func(*args, **kwargs)
+    finally:
+        _slot = None
+
+
+class Job:
+    """已送出的工作：done() / progress / result() / cancel()"""
+    def __init__(self, backend, key, future, slot=None):
+        self.backend = backend
+        self.key = key
+        self.future = future
+        self.slot = slot
+        self.subscribers = 1
+
+    def done(self):
+        return self.future.done()
+
+    @property
+    def progress(self):
+        if self.future.done():
+            return 1.0
+        if self.slot is None or self.backend.progress is None:
+            return 0.0
+        return float(self.backend.progress[self.slot])
+
+    def result(self, timeout=None):
+        """等待並取回結果；被取消的工作拋出 Cancelled"""
+        try:
+            return self.future.result(timeout)
+        except CancelledError:
+            raise Cancelled() from None
+
+    def cancel(self):
+        self.backend.release(self)
+
+
+class Backend:
+    def __init__(self, workers=WORKERS, cache_size=64, ttl=3600):
+        self.workers = workers
+        self.results = LRUCache(cache_size, ttl)
+        CACHES["backend.results"] = self.results
+        self.progress = None
+        self.cancel_flags = None
+        self._pool = None
+        self._inflight = {}     # key -> Job
+        self._free_slots = list(range(MAX_SLOTS))
+        self._lock = threading.RLock()  # future.cancel() 會在同一執行緒內呼叫 _on_done
+
+    def _executor(self):
+        if self._pool is None:
+            # 以 spawn 建立工作行程：Streamlit 行程內有多個執行緒，fork 不安全
+            ctx = mp.get_context("spawn")
+            self.progress = ctx.Array("d", MAX_SLOTS, lock=False)
+            self.cancel_flags = ctx.Array("b", MAX_SLOTS, lock=False)
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_init_worker,
+                                             initargs=(self.progress, self.cancel_flags))
+        return self._pool
+
+    def submit(self, func, *args, with_progress=False, **kwargs):
+        """
+        送出 func(*args, **kwargs) (func 須為模組層級函式)；with_progress 時另傳入 progress=回報函式
+        相同輸入的工作執行中時直接共用，已完成的結果由快取取出
+        """
+        key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+        hit, value = self.results.get(key)
+        if hit:
+            return self._finished_job(key, value)
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                job.subscribers += 1
+                count("backend.coalesced")
+                return job
+            count("backend.submitted")
+            if self.workers <= 0:
+                job = None
+            else:
+                slot = self._free_slots.pop() if self._free_slots else None
+                pool = self._executor()
+                if slot is not None:
+                    self.progress[slot] = 0.0
+                    self.cancel_flags[slot] = 0
+                with _page_main_hidden():
+                    try:
+                        future = pool.submit(_run, slot, func, args, kwargs, with_progress)
+                    except BrokenProcessPool:
+                        # 工作行程異常結束 (例如記憶體不足被終止)：重建行程池
+                        count("backend.pool_restarts")
+                        self._pool = None
+                        future = self._executor().submit(_run, slot, func, args, kwargs, with_progress)
+                job = Job(self, key, future, slot)
+                self._inflight[key] = job
+        if job is None:
+            # 不開行程池：在呼叫端直接執行 (失敗時與行程池相同，由 Job.result() 拋出)
+            try:
+                value = _freeze(func(*args, **kwargs))
+            except Exception as e:
+                count("backend.failed")
+                future = Future()
+                future.set_exception(e)
+                return Job(self, key, future)
+            self.results.put(key, value)
+            return self._finished_job(key, value)
+        job.future.add_done_callback(lambda future, job=job: self._on_done(job, future))
+        return job
+
+    def _finished_job(self, key, value):
+        future = Future()
+        future.set_result(value)
+        return Job(self, key, future)
+
+    def _on_done(self, job, future):
+        with self._lock:
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            if job.slot is not None:
+                self._free_slots.append(job.slot)
+                job.slot = None
+        if not future.cancelled() and future.exception() is None:
+            self.results.put(job.key, _freeze(future.result()))
+        elif future.cancelled() or isinstance(future.exception(), Cancelled):
+            count("backend.cancelled")
+        else:
+            count("backend.failed")
+
+    def release(self, job):
+        """不再需要這個工作；沒有其他人等待時取消 (尚未開始的直接移出佇列，執行中的在下次回報進度時中止)"""
+        with self._lock:
+            job.subscribers -= 1
+            if job.subscribers > 0 or job.future.done():
+                return
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]  # 之後相同輸入的請求另開新工作
+            if not job.future.cancel() and job.slot is not None:
+                self.cancel_flags[job.slot] = 1
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "inflight": len(self._inflight), "results": self.results.stats()}
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+BACKEND = Backend()
+
+
+def session_job(state, name, func, *args, with_progress=False, **kwargs):
+    """
+    頁面使用：state 為 st.session_state，name 區分同一頁的不同工作
+    輸入與上次相同時沿用原工作；輸入改變時取消舊工作並送出新工作
+    """
+    job = BACKEND.submit(func, *args, with_progress=with_progress, **kwargs)
+    previous = state.get(f"_job_{name}")
+    if previous is job:
+        BACKEND.release(job)  # 沿用同一工作：抵銷這次 submit 的登記
+    elif previous is not None:
+        BACKEND.release(previous)
+    state[f"_job_{name}"] = job
+    return job
+
+
+def wait_in_page(job, text="計算中…", interval=0.5):
+    """
+    頁面輪詢：工作已完成回傳 True；未完成時顯示進度條並回傳 False，
+    之後只重跑進度條這一段 (st.fragment)，完成時整頁重跑一次以顯示結果
+    """
+    import streamlit as st
+
+    if job.done():
+        return True
+
+    @st.fragment(run_every=interval)
+    def _poll():
+        if job.done():
+            st.rerun()
+        st.progress(job.progress, text=f"{text} {job.progress:.0%}")
+
+    _poll()
+    return False
+
+
+def session_result(state, name, job, label="試算"):
+    """
+    頁面使用：取回已完成工作的結果；工作失敗 (或被取消) 時顯示錯誤、移除 session 中的工作並回傳 None，
+    失敗的結果不會快取，下次重跑會重新送出
+    """
+    import streamlit as st
+
+    try:
+        return job.result()
+    except Exception as e:
+        drop_session_job(state, name)
+        st.error(f"❌ {label}失敗：{'已取消' if isinstance(e, Cancelled) else e}")
+        return None
+
+
+def drop_session_job(state, name):
+    """頁面不再顯示該工作時 (例如關閉功能) 釋放它"""
+    previous = state.pop(f"_job_{name}", None)
+    if previous is not None:
+        BACKEND.release(previous)
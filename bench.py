@@ -0,0 +1,545 @@
+"""
+效能基準與數值守門 (不需 Streamlit)
+
+    python bench.py                   # 執行基準，與 benchmarks/baseline.json 比較並核對 golden / reference 數值
+    python bench.py --quick           # 略過 100k 情境與大型費率檔
+    python bench.py --check           # 不計時，只核對 golden / reference 數值與模型性質 (CI 用)
+    python bench.py --save-baseline   # 以本次結果更新基準 (換機器或確認加速後執行)
+    python bench.py --save-golden     # 以本次結果更新 golden 數值 (只有確定數字應該改變時才執行)
+    python bench.py --save-reference  # 由原始版本 (BASELINE_COMMIT) 重新產生 reference 數值 (需 git 歷史、Streamlit 與 node)
+    python bench.py --imports strategy   # 冷啟動：匯入該模組時各子模組的累計載入時間 (python -X importtime)
+
+任何項目比基準慢超過 --threshold (預設 25%)、golden / reference 數值不符或模型性質檢查未通過時，結束碼為 1
+基準時間與機器有關，比較前請確認 baseline.json 是在同一台機器上產生
+golden.json 是目前引擎的完整結果 (抓任何改變)；reference.json 是加速前原始頁面迴圈、calculate_projection、
+load_policy_data 與 bigmoney JS 算出 (頁面印出) 的數字，--save-golden 不會覆寫，只能由原始版本重新產生
+PDATA.csv 以固定亂數種子合成 (小/中/大三種大小)，不需要真實費率檔
+bigmoney (美富紅運) 的 Python 試算 (bigmoney_engine) 與頁面 JS (generateProjectionTable / calculatePlan) 都納入：
+JS 以 node 執行 (benchmarks/bigmoney_harness.js)，找不到 node 時略過 JS 項目
+不使用 pytest / pytest-benchmark：本專案沒有 pytest 測試套件，requirements.txt 也不含 pytest；
+bench.py 只依賴 numpy，以結束碼回報，CI 直接執行 python bench.py --check 即可
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+GOLDEN_PATH = os.path.join(BENCH_DIR, "golden.json")
+REFERENCE_PATH = os.path.join(BENCH_DIR, "reference.json")
+BIGMONEY_HARNESS = os.path.join(BENCH_DIR, "bigmoney_harness.js")
+BASELINE_COMMIT = "3a4edd0"  # 加速前的原始版本 (reference 數值的來源)
+THRESHOLD = 0.25        # 允許的變慢比例
+GOLDEN_RTOL = 1e-9      # golden 數值的相對誤差 (容許浮點運算順序不同)
+MIN_TIME = 0.2          # 每個項目至少量測的總秒數
+MAX_REPEAT = 20
+RETRIES = 2             # 超過門檻的項目重新量測的次數 (取最短)，避免偶發的系統雜訊誤判
+
+SCENARIO_SIZES = (1, 1000, 100000)
+PDATA_SIZES = {"small": 2, "medium": 20, "large": 100}  # 性別代碼數 (每個代碼 71 個投保年齡)
+STARTUP_MODULES = ("streamlit", "strategy", "ul_engine", "sweep", "compare", "optimizer", "cli")  # 冷啟動量測的模組
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BIGMONEY_PLAN = (36, 1e7, 727003, 0.08, 0.02)  # 美富紅運固定情境：年齡、總資金、年繳保費、配息率、手續費率
+
+# 原始策略頁面：檔名、每年算完後的那一行、當年 [年齡, 借款, 總淨資產, 身故金] 的運算式 (舊版 PAI 沒有身故金)
+BASELINE_PAGES = {
+    "PAI": ("pai_app.py", "    raw_data_rows.append(row_raw)\n",
+            "[age, current_loan, total_net_asset, total_death_benefit]"),
+    "IAT2": ("pai_app2.py", "    data_rows.append(row)\n", "[age, current_loan, total_nw, total_db]"),
+    "PAI_LEGACY": ("927money", "    data_rows.append(ordered_row)\n", "[age, current_loan, row['總淨資產'], None]"),
+}
+STRATEGY_FIELDS = ("loan", "net_worth", "death_benefit")
+
+
+# --- 合成 PDATA.csv ---
+def make_synthetic_pdata(path, n_sexes=2, ages=range(0, 71), width=240, seed=0):
+    """產生與 PDATA.csv 相同版面的費率檔：保費區 (欄 5/7/10)，DIE/PV0/PV 區 (欄 129 標記、131/132/134+)"""
+    rnd = random.Random(seed)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([f"h{i}" for i in range(width)])
+        for sex in range(1, n_sexes + 1):
+            for age in ages:
+                row = [""] * width
+                row[5], row[7], row[10] = sex, age, f"{rnd.uniform(100, 900):.2f}"
+                writer.writerow(row)
+        for tag in ("DIE", "PV0", "PV"):
+            marker = [""] * width
+            marker[129] = tag
+            writer.writerow(marker)
+            writer.writerow([""] * 129 + ["x"] * (width - 129))
+            for sex in range(1, n_sexes + 1):
+                for age in ages:
+                    row = [""] * width
+                    row[131], row[132] = sex, age
+                    value = 0.0
+                    for j in range(min(width - 134, 111 - age)):
+                        value += rnd.uniform(0, 60)
+                        row[134 + j] = f"{value * 1000:,.0f}"
+                    writer.writerow(row)
+    return path
+
+
+# --- 情境產生 ---
+def ul_scenarios(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.integers(0, 71, n),
+        np.where(rng.random(n) < 0.5, "男性", "女性"),
+        rng.integers(5, 31, n) * 10000,
+        rng.integers(1, 31, n) * 1000000.0,
+        rng.integers(6, 31, n),
+        rng.uniform(0.02, 0.08, n),
+    )
+
+
+def cash_flow_scenarios(n, years=60, seed=0):
+    """IRR 用：每年繳費 term 年後於第 years 年末以累積繳費的 0.3~8 倍結清"""
+    rng = np.random.default_rng(seed)
+    term = rng.integers(1, 31, n)
+    premium = rng.integers(1, 31, n) * 10000.0
+    paid = np.where(np.arange(years) < term[:, None], premium[:, None], 0.0)
+    return paid, paid.sum(axis=1) * rng.uniform(0.3, 8, n)
+
+
+def policy_scenarios(n, n_sexes, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 71, n), rng.integers(1, n_sexes + 1, n), rng.integers(1, 100, n) * 100000.0
+
+
+# --- 冷啟動 (新行程匯入模組) ---
+def import_in_new_process(module, importtime=False):
+    """以新的 Python 行程匯入 module (含直譯器啟動)；importtime 時回傳 -X importtime 的輸出"""
+    cmd = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", f"import {module}"]
+    return subprocess.run(cmd, cwd=REPO_DIR, check=True, capture_output=True, text=True).stderr
+
+
+def import_breakdown(module, top=20):
+    """匯入 module 時累計時間最長的子模組 [(累計毫秒, 自身毫秒, 模組名)]"""
+    rows = []
+    for line in import_in_new_process(module, importtime=True).splitlines():
+        parts = line.removeprefix("import time:").split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        rows.append((int(parts[1]) / 1000, int(parts[0]) / 1000, parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+# --- 量測 ---
+def measure(func):
+    """重複執行直到累計 MIN_TIME 秒 (最多 MAX_REPEAT 次)，回傳單次最短秒數"""
+    if getattr(func, "self_timed", False):  # 自行量測 (node 內計時，不含行程啟動)
+        return func()
+    best, total, runs = float("inf"), 0.0, 0
+    while runs < MAX_REPEAT and (runs == 0 or total < MIN_TIME):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best, total, runs = min(best, elapsed), total + elapsed, runs + 1
+    return best
+
+
+def collect_kernels(workdir, quick=False):
+    """回傳 [(名稱, 無參數函式)]；名稱即 baseline.json 的鍵"""
+    from products import PRODUCTS
+    from strategy import run_strategy, summary_at
+    from sweep import SWEEP_AGES, SWEEP_MONTHLY_DEPOSITS, strategy_grid, ul_grid
+    from ul_engine import project_batch, projection_frame
+    import utils
+
+    kernels = []
+    sizes = [n for n in SCENARIO_SIZES if not (quick and n > 1000)]
+
+    # 冷啟動：新行程匯入各模組的時間 (含直譯器啟動，頁面與工作行程第一次執行前都要付出)
+    for module in STARTUP_MODULES:
+        kernels.append((f"startup.import[{module}]", lambda m=module: import_in_new_process(m)))
+
+    # 927UNN 萬能壽險 (calculate_projection 即單筆 project_batch + projection_frame)
+    kernels.append(("ul.calculate_projection", lambda: projection_frame(project_batch(30, "男性", 120000, 12e6, 20, 0.08))))
+    for n in sizes:
+        args = ul_scenarios(n)
+        kernels.append((f"ul.project_batch[{n}]", lambda args=args: project_batch(*args)))
+
+    # PAI / IAT2 / 舊版 PAI 策略 (逐情境試算)
+    for key in PRODUCTS.names("strategy"):
+        product = PRODUCTS[key]
+        for mode in ("offset", "compound"):
+            kernels.append((f"strategy.{key}.{mode}[1]", lambda p=product, m=mode: run_strategy(p, 30, 120000, m)))
+        starts = np.random.default_rng(0).integers(0, 61, 1000)
+        kernels.append((f"strategy.{key}.offset[1000]",
+                        lambda p=product, s=starts: [run_strategy(p, int(a), 120000, "offset") for a in s]))
+        kernels.append((f"strategy.{key}.summary_at65[1000]",
+                        lambda p=product, s=starts: [summary_at(p, int(a), 120000, 65, "compound") for a in s]))
+
+    # 參數掃描 (0~80 歲 × 50 檔金額，整張網格一次試算)
+    grid = f"{len(SWEEP_AGES)}x{len(SWEEP_MONTHLY_DEPOSITS)}"
+    annual = [m * 12 for m in SWEEP_MONTHLY_DEPOSITS]
+    kernels.append((f"sweep.PAI[{grid}]", lambda: strategy_grid(PRODUCTS["PAI"], SWEEP_AGES, annual)))
+    kernels.append((f"sweep.ul[{grid}]", lambda: ul_grid(SWEEP_AGES, annual, "男性", 12e6, 20, 0.05)))
+
+    # 報酬分析 (整批情境的 IRR，60 年現金流)
+    from analytics import settled_irr
+    for n in sizes:
+        paid, value = cash_flow_scenarios(n)
+        kernels.append((f"analytics.settled_irr[{n}]", lambda p=paid, v=value: settled_irr(p, v)))
+
+    # 借款策略最佳化 (候選策略一次試算、逐年最佳排程)
+    from optimizer import optimal_schedule, search_policies
+    kernels.append(("optimizer.search.PAI", lambda: search_policies(PRODUCTS["PAI"], 30, 120000, "offset")))
+    kernels.append(("optimizer.schedule.PAI", lambda: optimal_schedule(PRODUCTS["PAI"], 30, 120000, "offset")))
+
+    # 美富紅運 (bigmoney)
+    from bigmoney_engine import run_plan
+    kernels.append(("bigmoney.run_plan", lambda: run_plan(PRODUCTS["BIGMONEY"], *BIGMONEY_PLAN)))
+    node = shutil.which("node")
+    if node:
+        def js_plan():
+            return run_bigmoney_js(os.path.join(REPO_DIR, "bigmoney"), "time", node)["seconds"]
+        js_plan.self_timed = True
+        kernels.append(("bigmoney.js.calculatePlan", js_plan))
+
+    # 磁碟結果庫：已存在的結果直接讀出 (與上面重新試算的時間對照)
+    from store import ResultStore
+    store = ResultStore(os.path.join(workdir, "results.sqlite3"))
+    store.put("strategy.PAI", "bench", (30, 120000, "offset"), run_strategy(PRODUCTS["PAI"], 30, 120000, "offset"))
+    store.put("ul", "bench", (30, 120000), project_batch(30, "男性", 120000, 12e6, 20, 0.08))
+    kernels.append(("store.get.strategy", lambda: store.get("strategy.PAI", "bench", (30, 120000, "offset"))))
+    kernels.append(("store.get.ul", lambda: store.get("ul", "bench", (30, 120000))))
+
+    # PDATA.csv 解析、編譯快取與保單試算
+    for label, n_sexes in PDATA_SIZES.items():
+        if quick and label == "large":
+            continue
+        csv_path = make_synthetic_pdata(os.path.join(workdir, f"pdata_{label}.csv"), n_sexes=n_sexes)
+        cache_path = os.path.join(workdir, f"pdata_{label}.ratecache")
+        kernels.append((f"pdata.parse[{label}]", lambda c=csv_path: utils.load_policy_data(c, use_cache=False)))
+        kernels.append((f"pdata.compile[{label}]", lambda c=csv_path, k=cache_path: utils.compile_policy_data(c, k)))
+        utils.compile_policy_data(csv_path, cache_path)
+        kernels.append((f"pdata.load_compiled[{label}]", lambda c=csv_path, k=cache_path: utils.load_compiled_tables(c, k)))
+        # 字典格式 (舊呼叫端)：同一版本只轉換一次，之後只檢查快取標頭
+        kernels.append((f"pdata.load_policy_data[{label}]", lambda c=csv_path: utils.load_policy_data(c)))
+        if label == "small":
+            data = utils.load_policy_data(csv_path, use_cache=False)
+            tables = utils.load_compiled_tables(csv_path, cache_path)
+            kernels.append(("pdata.calculate_policy", lambda d=data: utils.calculate_policy(30, 1, 1000000, d)))
+            for n in sizes:
+                ages, genders, amounts = policy_scenarios(n, n_sexes)
+                kernels.append((f"pdata.calculate_policy_batch[{n}]",
+                                lambda a=ages, g=genders, m=amounts, t=tables: utils.calculate_policy_batch(a, g, m, tables=t)))
+    return kernels
+
+
+# --- golden 數值 ---
+def golden_values(workdir):
+    """固定情境的試算結果 (提案書上印出的數字)，加速前後必須一致"""
+    from bigmoney_engine import run_plan
+    from montecarlo import simulate_pai
+    from products import PRODUCTS
+    from strategy import run_strategy
+    from ul_engine import project_batch, solve_for_target
+    import utils
+
+    golden = {}
+    for age, gender in ((0, "女性"), (30, "男性"), (65, "女性")):
+        batch = project_batch(age, gender, 120000, 12e6, 20, 0.05)
+        n = int(batch["n_years"][0])
+        golden[f"ul.{age}.{gender}.account_value"] = batch["account_value"][0, :n].tolist()
+        golden[f"ul.{age}.{gender}.death_benefit"] = batch["death_benefit"][0, :n].tolist()
+    scenario = {"age": 30, "gender": "男性", "target_premium": 120000, "basic_sum_assured": 12e6,
+                "payment_term": 20, "interest_rate": 0.05}
+    golden["ul.solve.target_premium"] = [float(solve_for_target("target_premium", scenario, target_age=100)[0])]
+
+    for key in PRODUCTS.names("strategy"):
+        for mode in ("offset", "compound"):
+            for start_age in (25, 40):
+                res = run_strategy(PRODUCTS[key], start_age, 120000, mode)
+                for field in ("loan", "net_worth", "death_benefit"):
+                    golden[f"strategy.{key}.{mode}.{start_age}.{field}"] = res[field].tolist()
+
+    plan = run_plan(PRODUCTS["BIGMONEY"], *BIGMONEY_PLAN)
+    for field in ("cv", "policy_reserve", "total_asset"):
+        golden[f"bigmoney.{field}"] = plan[field].tolist()
+
+    mc = simulate_pai(25, 10000, "offset", n_paths=2000, seed=7)
+    golden["montecarlo.pai.net_worth_65"] = [float(mc["summary"]["net_worth"][p]) for p in sorted(mc["summary"]["net_worth"])]
+
+    csv_path = make_synthetic_pdata(os.path.join(workdir, "pdata_golden.csv"))
+    premium, frame = utils.calculate_policy(30, 1, 1000000, utils.load_policy_data(csv_path, use_cache=False))
+    golden["pdata.calculate_policy.premium"] = [float(premium)]
+    golden["pdata.calculate_policy.cash_value"] = frame["解約金(保價)"].tolist()
+    return golden
+
+
+# --- reference 數值 (原始版本) ---
+def run_bigmoney_js(page, action, node):
+    """以 node 執行 bigmoney 頁面的 JS (BIGMONEY_PLAN 情境)：table 回傳逐年數字，time 回傳單次最短秒數"""
+    age, principal, premium, payout_rate, fee_rate = BIGMONEY_PLAN
+    cmd = [node, BIGMONEY_HARNESS, page, action, str(age), f"{principal:.0f}", str(premium),
+           f"{payout_rate * 100:g}", f"{fee_rate * 100:g}"]
+    return json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+
+
+def reference_values(workdir, node=None):
+    """目前程式對應 reference.json 的數字 (精度與原始版本相同：萬能壽險取整數、bigmoney 四捨五入到元)"""
+    from bigmoney_engine import run_plan
+    from products import PRODUCTS
+    from strategy import run_strategy
+    from ul_engine import project_batch
+    import utils
+
+    values = {}
+    for key in BASELINE_PAGES:
+        for mode in ("offset", "compound"):
+            for start_age in (25, 40):
+                res = run_strategy(PRODUCTS[key], start_age, 120000, mode)
+                for field in STRATEGY_FIELDS:
+                    values[f"strategy.{key}.{mode}.{start_age}.{field}"] = res[field].tolist()
+    for age, gender in ((0, "女性"), (30, "男性"), (65, "女性")):
+        batch = project_batch(age, gender, 120000, 12e6, 20, 0.05)
+        n = int(batch["n_years"][0])
+        for field in ("account_value", "death_benefit"):
+            values[f"ul.{age}.{gender}.{field}"] = np.trunc(batch[field][0, :n]).tolist()
+
+    csv_path = make_synthetic_pdata(os.path.join(workdir, "pdata_reference.csv"))
+    premium, frame = utils.calculate_policy(30, 1, 1000000, utils.load_policy_data(csv_path, use_cache=False))
+    values["pdata.calculate_policy.premium"] = [float(premium)]
+    for column in frame.columns:
+        values[f"pdata.calculate_policy.{column}"] = frame[column].astype(float).tolist()
+
+    plan = run_plan(PRODUCTS["BIGMONEY"], *BIGMONEY_PLAN)
+    js = run_bigmoney_js(os.path.join(REPO_DIR, "bigmoney"), "table", node) if node else {}
+    for field in ("cv", "policy_reserve", "total_asset"):
+        values[f"bigmoney.py.{field}"] = np.floor(plan[field] + 0.5).tolist()  # 與 JS Math.round 相同
+        if js:
+            values[f"bigmoney.js.{field}"] = js[field]
+    return values
+
+
+def baseline_source(path):
+    """原始版本 (BASELINE_COMMIT) 的檔案內容"""
+    cmd = ["git", "-C", REPO_DIR, "show", f"{BASELINE_COMMIT}:{path}"]
+    return subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+
+
+def run_baseline_page(source, workdir, footer, widgets=None):
+    """以 Streamlit AppTest 執行原始頁面 (略過密碼)，footer 把要記錄的數字寫到 JSON 檔，回傳其內容"""
+    from streamlit.testing.v1 import AppTest
+
+    out_path = os.path.join(workdir, "baseline_page.json")
+    script = "import json as _bench_json\n_bench_rows = []\n" + source + footer.format(out=repr(out_path))
+    at = AppTest.from_string(script, default_timeout=60)
+    at.session_state["password_correct"] = True
+    at.run()
+    if widgets:
+        widgets(at)
+        at.run()
+    if at.exception:
+        raise RuntimeError(f"原始頁面執行失敗：{at.exception[0].message}")
+    with open(out_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def baseline_reference(workdir, node):
+    """以原始版本的程式算出 reference 數值 (頁面迴圈、calculate_projection、load_policy_data、bigmoney JS)"""
+    if not node:
+        raise SystemExit("產生 reference 數值需要 node (執行 bigmoney 頁面的 JS)")
+    reference = {}
+    dump_rows = "\n_bench_json.dump(_bench_rows, open({out}, 'w'))\n"
+    for key, (path, anchor, row) in BASELINE_PAGES.items():
+        source = baseline_source(path)
+        if source.count(anchor) != 1:
+            raise RuntimeError(f"{path} 找不到記錄點：{anchor!r}")
+        indent = anchor[:len(anchor) - len(anchor.lstrip())]
+        source = source.replace(anchor, f"{anchor}{indent}_bench_rows.append({row})\n")
+        for mode_index, mode in enumerate(("offset", "compound")):
+            for start_age in (25, 40):
+                def widgets(at, age=start_age, i=mode_index):
+                    at.number_input[0].set_value(age)
+                    at.number_input[1].set_value(10000)
+                    at.radio[0].set_value(at.radio[0].options[i])
+                rows = run_baseline_page(source, workdir, dump_rows, widgets)
+                for i, field in enumerate(STRATEGY_FIELDS, start=1):
+                    if rows[0][i] is not None:
+                        reference[f"strategy.{key}.{mode}.{start_age}.{field}"] = [float(r[i]) for r in rows]
+
+    ul_footer = (
+        "\n_bench_json.dump({{f'{{a}}.{{g}}': calculate_projection(df_rates, a, g, 120000, 12e6, 20, 0.05)"
+        "[['帳戶價值', '身故保險金']].astype(float).to_dict('list')"
+        " for a, g in ((0, '女性'), (30, '男性'), (65, '女性'))}}, open({out}, 'w'))\n"
+    )
+    for scenario, columns in run_baseline_page(baseline_source("927UNN.py"), workdir, ul_footer).items():
+        reference[f"ul.{scenario}.account_value"] = columns["帳戶價值"]
+        reference[f"ul.{scenario}.death_benefit"] = columns["身故保險金"]
+
+    utils_module = types.ModuleType("baseline_utils")
+    exec(compile(baseline_source("utils.py"), "utils.py", "exec"), utils_module.__dict__)
+    csv_path = make_synthetic_pdata(os.path.join(workdir, "pdata_reference.csv"))
+    premium, frame = utils_module.calculate_policy(30, 1, 1000000, utils_module.load_policy_data(csv_path))
+    reference["pdata.calculate_policy.premium"] = [float(premium)]
+    for column in frame.columns:
+        reference[f"pdata.calculate_policy.{column}"] = frame[column].astype(float).tolist()
+
+    page = os.path.join(workdir, "bigmoney_baseline.html")
+    with open(page, "w", encoding="utf-8") as f:
+        f.write(baseline_source("bigmoney"))
+    for field, values in run_bigmoney_js(page, "table", node).items():
+        reference[f"bigmoney.js.{field}"] = values
+        reference[f"bigmoney.py.{field}"] = values
+    return reference
+
+
+def model_checks():
+    """
+    不依賴固定數字的模型性質 (golden 數值只能抓到結果改變，抓不到模型本身的錯誤)；回傳未通過的項目
+    - 蒙地卡羅波動為 0 時與 strategy 引擎相同
+    - 波動越大，65 歲淨資產的 P5–P95 區間越寬；有波動時身故金隨路徑不同
+    - 虧損機率：波動為 0 時與 strategy 引擎的報酬率正負一致，高波動時大於 0
+    """
+    from montecarlo import PERCENTILES, simulate_pai
+    from products import PRODUCTS
+    from strategy import returns_at, run_strategy, summary_at
+
+    failures = []
+    for mode in ("offset", "compound"):
+        expected = summary_at(PRODUCTS["PAI"], 25, 120000, 65, mode)["total"]
+        got = simulate_pai(25, 10000, mode, n_paths=100, seed=7, vol=0.0)["summary"]["net_worth"]
+        if not np.allclose([got[p] for p in PERCENTILES], expected, rtol=GOLDEN_RTOL * 1e3, atol=0):
+            failures.append(f"montecarlo.{mode}.zero_vol")
+        for start_age in (25, 55):
+            loses = returns_at(run_strategy(PRODUCTS["PAI"], start_age, 120000, mode), 65)["roi"] < 0
+            p_loss = simulate_pai(start_age, 10000, mode, n_paths=100, seed=7, vol=0.0)["summary"]["p_loss"]
+            if p_loss != float(loses):
+                failures.append(f"montecarlo.{mode}.{start_age}.zero_vol_p_loss")
+
+    spreads = []
+    for vol in (0.0, 0.15, 0.3):
+        summary = simulate_pai(25, 10000, "offset", n_paths=2000, seed=7, vol=vol)["summary"]
+        spreads.append(summary["net_worth"][95] - summary["net_worth"][5])
+        if vol and not summary["death_benefit"][95] > summary["death_benefit"][5]:
+            failures.append(f"montecarlo.death_benefit_spread[{vol}]")
+    if not spreads[0] < spreads[1] < spreads[2]:
+        failures.append("montecarlo.net_worth_spread")
+    if not simulate_pai(40, 10000, "offset", n_paths=2000, seed=7, vol=0.3)["summary"]["p_loss"] > 0:
+        failures.append("montecarlo.p_loss_high_vol")
+    return failures
+
+
+def check_golden(current, expected):
+    failures = []
+    for key, values in expected.items():
+        got = current.get(key)
+        if got is None or len(got) != len(values) or not np.allclose(got, values, rtol=GOLDEN_RTOL, atol=0, equal_nan=True):
+            failures.append(key)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="試算效能基準與 golden 數值檢查")
+    parser.add_argument("--quick", action="store_true", help="略過 100k 情境與大型費率檔")
+    parser.add_argument("--only", help="只執行名稱包含此字串的項目")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="允許的變慢比例")
+    parser.add_argument("--save-baseline", action="store_true", help="以本次結果更新基準")
+    parser.add_argument("--check", action="store_true", help="不計時，只核對 golden / reference 數值與模型性質")
+    parser.add_argument("--save-golden", action="store_true", help="以本次結果更新 golden 數值")
+    parser.add_argument("--save-reference", action="store_true", help="由原始版本重新產生 reference 數值")
+    parser.add_argument("--json", help="另存本次結果")
+    parser.add_argument("--imports", metavar="MODULE", help="只列出匯入 MODULE 的時間分解後結束")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        for cumulative, own, name in import_breakdown(args.imports):
+            print(f"{name:<48} 累計 {cumulative:>9.1f} ms   自身 {own:>8.1f} ms")
+        return 0
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failed = False
+    results = {}
+    node = shutil.which("node")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, func in [] if args.check else collect_kernels(workdir, quick=args.quick):
+            if args.only and args.only not in name:
+                continue
+            seconds = measure(func)
+            for _ in range(RETRIES if name in baseline else 0):
+                if seconds <= baseline[name] * (1 + args.threshold):
+                    break
+                seconds = min(seconds, measure(func))
+            results[name] = seconds
+            line = f"{name:<42} {seconds * 1000:>10.3f} ms"
+            if name in baseline:
+                ratio = seconds / baseline[name]
+                line += f"   基準 {baseline[name] * 1000:>10.3f} ms  x{ratio:.2f}"
+                if ratio > 1 + args.threshold:
+                    line += "  ❌ 變慢"
+                    failed = True
+            print(line)
+
+        golden = golden_values(workdir)
+        reference = reference_values(workdir, node)
+        if args.save_reference:
+            os.makedirs(BENCH_DIR, exist_ok=True)
+            with open(REFERENCE_PATH, "w", encoding="utf-8") as f:
+                json.dump(baseline_reference(workdir, node), f, ensure_ascii=False)
+            print(f"reference 數值已由 {BASELINE_COMMIT} 重新產生：{REFERENCE_PATH}")
+
+    if args.save_golden:
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+            json.dump(golden, f, ensure_ascii=False)
+        print(f"golden 數值已更新：{GOLDEN_PATH}")
+    elif os.path.exists(GOLDEN_PATH):
+        with open(GOLDEN_PATH, encoding="utf-8") as f:
+            mismatched = check_golden(golden, json.load(f))
+        if mismatched:
+            failed = True
+            print("❌ golden 數值不符：" + ", ".join(mismatched))
+        else:
+            print("✅ golden 數值一致")
+
+    if os.path.exists(REFERENCE_PATH):
+        with open(REFERENCE_PATH, encoding="utf-8") as f:
+            expected = json.load(f)
+        if not node:
+            print("⚠️ 找不到 node，略過 bigmoney JS 的 reference 核對")
+            expected = {k: v for k, v in expected.items() if not k.startswith("bigmoney.js.")}
+        mismatched = check_golden(reference, expected)
+        if mismatched:
+            failed = True
+            print("❌ 與原始版本 (reference) 不符：" + ", ".join(mismatched))
+        else:
+            print(f"✅ 與原始版本 (reference) 一致 ({len(expected)} 項)")
+
+    broken = model_checks()
+    if broken:
+        failed = True
+        print("❌ 模型性質檢查未通過：" + ", ".join(broken))
+    else:
+        print("✅ 模型性質檢查通過")
+
+    if args.save_baseline:
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({**baseline, **results}, f, indent=1, sort_keys=True)
+        print(f"基準已更新：{BASELINE_PATH}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    return 1 if failed and not args.save_baseline else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+// bench.py 用：以 node 執行 bigmoney 頁面內的 <script> (不需瀏覽器)
+//   node bigmoney_harness.js <頁面> table <年齡> <總資金> <年繳保費> <配息率%> <手續費%>   # 輸出試算表逐年數字 (JSON)
+//   node bigmoney_harness.js <頁面> time  <年齡> <總資金> <年繳保費> <配息率%> <手續費%>   # 輸出單次最短秒數 (JSON)
+// DOM 只模擬頁面用到的部分：getElementById 回傳可讀寫 value / innerHTML / style 的物件
+"use strict";
+const fs = require("fs");
+const vm = require("vm");
+
+const [page, action, age, principal, premium, payoutRate, feeRate] = process.argv.slice(2);
+const html = fs.readFileSync(page, "utf8");
+
+const inputs = { clientAge: age, principal: principal, manualPremium: premium, payoutRate: payoutRate, feeRate: feeRate };
+const elements = {};
+const scripts = [];
+for (const match of html.matchAll(/<script([^>]*)>([\s\S]*?)<\/script>/g)) {
+    const id = /id="([^"]+)"/.exec(match[1]);
+    if (/application\/json/.test(match[1]) && id) element(id[1]).textContent = match[2];
+    else scripts.push(match[2]);
+}
+
+function element(id) {
+    if (!elements[id]) {
+        elements[id] = {
+            id, value: inputs[id] === undefined ? "" : inputs[id], checked: false,
+            innerHTML: "", innerText: "", textContent: "", src: "", style: {},
+            classList: { add() {}, remove() {}, toggle() {}, contains() { return false; } },
+            addEventListener() {}, focus() {},
+        };
+    }
+    return elements[id];
+}
+
+const document = {
+    getElementById: element,
+    querySelector: (selector) => element(selector),
+    querySelectorAll: () => [],
+    addEventListener() {},
+};
+const context = vm.createContext({ document, console, setTimeout, clearTimeout });
+for (const code of scripts) vm.runInContext(code, context);
+
+// 逐次試算前清掉頁面「輸入相同不重畫」的記錄，確保每次都重新計算
+const run = () => vm.runInContext("if (typeof lastPlanKey !== 'undefined') lastPlanKey = null; calculatePlan();", context);
+
+function tableRows() {
+    const body = element("projectionBody").innerHTML;
+    return body.split("<tr>").slice(1).map((row) => {
+        const cells = [...row.matchAll(/<td[^>]*>([\s\S]*?)<\/td>/g)].map((cell) => cell[1].replace(/<[^>]+>/g, ""));
+        return cells.map((text) => Number((/-?[\d,]+(\.\d+)?/.exec(text) || ["NaN"])[0].replace(/,/g, "")));
+    });
+}
+
+if (action === "table") {
+    run();
+    const rows = tableRows();
+    const column = (i) => rows.map((row) => row[i]);
+    console.log(JSON.stringify({ cv: column(2), policy_reserve: column(6), total_asset: column(7) }));
+} else if (action === "time") {
+    let best = Infinity, total = 0, runs = 0;
+    while (runs < 200 && (runs < 5 || total < 0.2)) {
+        const start = process.hrtime.bigint();
+        run();
+        const elapsed = Number(process.hrtime.bigint() - start) / 1e9;
+        best = Math.min(best, elapsed); total += elapsed; runs += 1;
+    }
+    console.log(JSON.stringify({ seconds: best }));
+} else {
+    console.error("action 必須是 table 或 time");
+    process.exit(2);
+}
@@ -0,0 +1,152 @@
+"""
+美富紅運 (bigmoney 頁面) 試算引擎：總資金拆成分紅保單年繳保費，其餘扣手續費後轉入投資帳戶領配息
+逐年數值對保費、投資本金都是線性，與金額無關的部分先算成逐年係數表 (projection grid)：
+  解約金 = 年繳保費 × 累積繳費年數 × 解約金比例；保單備用金 = 解約金 × 借款成數
+係數表以精簡 JSON 嵌入 bigmoney 頁面，頁面輸入時只做查表相乘
+
+    python bigmoney_engine.py --embed bigmoney     # 更新頁面內嵌的係數表 (費率檔或商品參數改變後執行)
+    python bigmoney_engine.py --check bigmoney     # 內嵌係數表與登錄表不一致時結束碼為 1
+    python bigmoney_engine.py --json grid.json     # 另存為獨立 JSON (頁面改以 fetch 取得時使用)
+"""
+import argparse
+import json
+import re
+import sys
+
+import numpy as np
+
+from metrics import timed
+from products import PRODUCTS
+from strategy import loan_limit_rates, table_values
+
+PRODUCT_KEY = "BIGMONEY"
+GRID_ELEMENT_ID = "projectionGrid"
+_EMBED_RE = re.compile(r'(<script type="application/json" id="%s">)(.*?)(</script>)' % GRID_ELEMENT_ID, re.S)
+
+
+def suggested_fee_rate(product, principal_twd):
+    """依總資金 (台幣) 建議手續費率"""
+    for threshold, rate in product["fee_ladder"]:
+        if principal_twd >= threshold:
+            return rate
+    return product["fee_ladder"][-1][1]
+
+
+def balanced_premium(principal, payout_rate, fee_rate):
+    """自動平衡：年繳保費恰好等於投資帳戶的年配息"""
+    net_rate = (1 - fee_rate) * payout_rate
+    return (principal * net_rate) / (1 + net_rate)
+
+
+def projection_grid(product):
+    """與金額無關的逐年係數 (第 1 年起)：累積繳費年數、解約金比例、借款成數"""
+    years = np.arange(1, product["projection_years"] + 1)
+    return {
+        "policy_year": years,
+        "paid_years": np.minimum(years, product["premium_term"]),
+        "cv_ratio": table_values(product["cv_table"], years, 1),
+        "loan_ratio": loan_limit_rates(product["loan_ladder"], years),
+    }
+
+
+def grid_payload(product):
+    """頁面使用的係數表 (dict，可直接轉 JSON)；手續費級距以百分比表示，與頁面輸入欄一致"""
+    grid = projection_grid(product)
+    return {
+        "product": product["name"],
+        "premium_term": product["premium_term"],
+        "reserve_rate": product["reserve_rate"],
+        "exchange_rate": product["exchange_rate"],
+        "fee_ladder": [[threshold, round(rate * 100, 6)] for threshold, rate in product["fee_ladder"]],
+        "paid_years": grid["paid_years"].tolist(),
+        "cv_ratio": grid["cv_ratio"].tolist(),
+        "loan_ratio": grid["loan_ratio"].tolist(),
+    }
+
+
+def grid_json(product_key=PRODUCT_KEY):
+    return json.dumps(grid_payload(PRODUCTS[product_key]), ensure_ascii=False, separators=(",", ":"))
+
+
+@timed("bigmoney.run_plan")
+def run_plan(product, start_age, principal, annual_premium, payout_rate, fee_rate):
+    """
+    逐年試算 (與頁面數字一致)
+    回傳 dict：investment_base (扣手續費後投資本金)、annual_payout (年配息)，以及逐年陣列
+    cv / payout / investment / investment_reserve / policy_reserve / total_asset / roi
+    """
+    grid = projection_grid(product)
+    years = grid["policy_year"]
+    term = product["premium_term"]
+    investment_pre_fee = principal - annual_premium
+    investment_base = investment_pre_fee - investment_pre_fee * fee_rate
+    annual_payout = investment_base * payout_rate
+
+    cv = (annual_premium * grid["paid_years"]) * grid["cv_ratio"]
+    cash_flow = np.cumsum(np.where(years > term, annual_payout, 0.0))
+    total_asset = np.where(years > term, cv + investment_base + cash_flow, cv + investment_base)
+    return {
+        "policy_year": years,
+        "age": start_age + years,
+        "investment_base": investment_base,
+        "annual_payout": annual_payout,
+        "cv": cv,
+        "payout": np.full(len(years), annual_payout),
+        "investment": np.full(len(years), investment_base),
+        "investment_reserve": np.full(len(years), investment_base * product["reserve_rate"]),
+        "policy_reserve": cv * grid["loan_ratio"],
+        "total_asset": total_asset,
+        "roi": total_asset / principal if principal > 0 else np.zeros(len(years)),
+    }
+
+
+# --- 頁面內嵌係數表 ---
+def embedded_json(html):
+    match = _EMBED_RE.search(html)
+    return None if match is None else match.group(2)
+
+
+def embed(path, product_key=PRODUCT_KEY):
+    """以目前登錄表的係數更新頁面內嵌的 JSON；回傳是否有變動"""
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    if embedded_json(html) is None:
+        raise ValueError(f"{path} 中找不到 id={GRID_ELEMENT_ID} 的係數表區塊")
+    payload = grid_json(product_key)
+    updated = _EMBED_RE.sub(lambda m: m.group(1) + payload + m.group(3), html, count=1)
+    if updated == html:
+        return False
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(updated)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="美富紅運逐年係數表 (JSON)")
+    parser.add_argument("--product", default=PRODUCT_KEY)
+    parser.add_argument("--embed", metavar="HTML", help="更新頁面內嵌的係數表")
+    parser.add_argument("--check", metavar="HTML", help="檢查頁面內嵌的係數表是否為最新")
+    parser.add_argument("--json", metavar="PATH", help="另存為 JSON 檔 (- 為 stdout)")
+    args = parser.parse_args(argv)
+
+    if args.embed:
+        print("已更新" if embed(args.embed, args.product) else "已是最新", args.embed)
+    if args.check:
+        with open(args.check, encoding="utf-8") as f:
+            current = embedded_json(f.read())
+        if current is None or json.loads(current) != json.loads(grid_json(args.product)):
+            print(f"❌ {args.check} 內嵌的係數表與登錄表不一致，請執行 --embed", file=sys.stderr)
+            return 1
+        print(f"✅ {args.check} 係數表為最新")
+    if args.json:
+        payload = grid_json(args.product)
+        if args.json == "-":
+            print(payload)
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                f.write(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
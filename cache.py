@@ -0,0 +1,113 @@
+"""
+試算結果快取：有容量上限 (LRU) 與存活時間 (TTL) 的記憶化，並統計命中/未命中次數
+快取存在模組層級，同一個 Streamlit 行程中的所有使用者、所有 rerun 共用
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# 所有經 memoize 建立的快取，供狀態面板彙總
+CACHES = {}
+
+
+class LRUCache:
+    def __init__(self, maxsize=256, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (寫入時間, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """回傳 (是否命中, 值)；過期項目視為未命中並移除"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl is not None and now - item[0] > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+def memoize(maxsize=256, ttl=600):
+    """
+    以參數為鍵快取函式結果 (參數須可雜湊)
+    被包裝的函式多了 .cache 屬性 (LRUCache)，可查詢 stats() 或 clear()
+    """
+    def decorator(func):
+        cache = LRUCache(maxsize, ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            cache.put(key, value)
+            return value
+
+        wrapper.cache = cache
+        CACHES[f"{func.__module__}.{func.__qualname__}"] = cache
+        return wrapper
+    return decorator
+
+
+def freeze(result):
+    """將結果 dict 中的 NumPy 陣列設為唯讀，避免呼叫端改動快取內容"""
+    for value in result.values():
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+    return result
+
+
+def normalize_amount(value):
+    """金額正規化：整數金額維持 int，讓 10000 與 10000.0 對應同一個快取鍵；其餘保留原值 (不四捨五入，快取結果與直接試算相同)"""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def cache_stats():
+    """各快取的統計，另含 total 彙總"""
+    stats = {name: cache.stats() for name, cache in CACHES.items()}
+    stats["total"] = {
+        "hits": sum(s["hits"] for s in stats.values()),
+        "misses": sum(s["misses"] for s in stats.values()),
+    }
+    return stats
@@ -0,0 +1,264 @@
+"""
+命令列批次試算 (不載入 Streamlit)
+讀入客戶情境 (CSV / JSONL，一列一個情境)，以多行程分批試算，逐批寫出逐年結果 (CSV / JSONL / Parquet / Arrow)
+
+    python cli.py ul scenarios.csv -o out.csv
+    python cli.py PAI scenarios.jsonl -o out.parquet --jobs 8
+
+情境欄位
+    ul (927UNN)               : age, gender, target_premium, basic_sum_assured, payment_term, interest_rate (小數，如 0.08)
+    PAI / IAT2 / PAI_LEGACY   : start_age, monthly_deposit 或 annual_deposit, mode (offset / compound，預設 offset)
+可另帶 id 欄作為情境編號，否則以列序編號
+策略商品加 --at-age 65 時每個情境只輸出該年齡的一列結算 (以區段公式計算，不跑完整逐年迴圈)
+
+另附報酬分析欄位 (繳費視為年初支付、價值為年末數值)：
+    cumulative_paid / roi   : 逐年累積實繳與累積報酬率 (價值 / 累積實繳 - 1)
+    irr / break_even_year   : 情境層級，於試算期末結清的 IRR 與損益兩平的保單年度 (0 = 未達成)
+    --at-age 時為該年齡的 cumulative_paid / roi / irr (於該年齡結清)
+策略商品的實繳為自付金額 (以息養險扣除配息折抵)、價值為總淨資產；ul 為實繳保費與帳戶價值
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from products import PRODUCTS
+
+CHUNK_SIZE = 256        # 每個工作單位的情境數
+STRATEGY_MODES = ("offset", "compound")
+SUMMARY_COLUMNS = ["cv", "loan", "fund", "cash_out", "accum_wealth", "total", "death_benefit"]  # --at-age 的結算欄位
+
+SCENARIO_FIELDS = {
+    "ul": {"age": int, "gender": str, "target_premium": float, "basic_sum_assured": float,
+           "payment_term": int, "interest_rate": float},
+    "strategy": {"start_age": int, "annual_deposit": float, "mode": str},
+}
+
+
+def calculator_kind(calculator):
+    return "ul" if calculator == "ul" else "strategy"
+
+
+# --- 讀入情境 ---
+def read_scenarios(path):
+    """逐列產生情境 dict (CSV 或 JSONL，依副檔名判斷)"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def normalize_scenario(calculator, raw, index):
+    """欄位轉型並補預設值；回傳 (情境編號, 參數 dict)"""
+    raw = {k.strip(): v for k, v in raw.items() if k is not None}
+    if calculator_kind(calculator) == "strategy":
+        raw.setdefault("mode", "offset")
+        if raw.get("annual_deposit") in (None, ""):
+            if raw.get("monthly_deposit") in (None, ""):
+                raise ValueError(f"第 {index + 1} 筆情境缺少 monthly_deposit 或 annual_deposit")
+            raw["annual_deposit"] = float(raw["monthly_deposit"]) * 12
+        if raw["mode"] not in STRATEGY_MODES:
+            raise ValueError(f"第 {index + 1} 筆情境 mode 須為 {STRATEGY_MODES}: {raw['mode']!r}")
+
+    params = {}
+    for key, cast in SCENARIO_FIELDS[calculator_kind(calculator)].items():
+        if raw.get(key) in (None, ""):
+            raise ValueError(f"第 {index + 1} 筆情境缺少欄位 {key}")
+        params[key] = cast(float(raw[key])) if cast is int else cast(raw[key])
+    scenario_id = raw.get("id") or str(index + 1)
+    return str(scenario_id), params
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# --- 試算 (在工作行程中執行) ---
+def run_chunk(calculator, chunk, at_age=None):
+    """試算一批情境，回傳逐年結果長表 (每個情境多列，前面附上情境編號與參數)；at_age 時每個情境一列"""
+    from analytics import batch_metrics, roi, settled_irr, stack_rows
+
+    if at_age is not None:
+        from strategy import summary_at
+
+        product = PRODUCTS[calculator]
+        rows = [summary_at(product, p["start_age"], p["annual_deposit"], at_age, p["mode"]) for _, p in chunk]
+        frame = pd.DataFrame([row or {} for row in rows], columns=SUMMARY_COLUMNS, dtype=np.float64)
+        frame.insert(0, "age", at_age)
+        # 報酬分析：各情境的逐年實繳疊成矩陣一次求解 (不在試算期間內的情境為空值)
+        years = np.array([len(row["paid"]) if row else 0 for row in rows])
+        paid, _ = stack_rows(np.concatenate([row["paid"] for row in rows if row] or [np.zeros(0)]), years)
+        cumulative = paid.sum(axis=1)
+        total = frame["total"].to_numpy()
+        returns = {"cumulative_paid": np.where(years > 0, cumulative, np.nan), "roi": roi(cumulative, total),
+                   "irr": settled_irr(paid, total, years - 1)}
+        lengths = 1
+    elif calculator == "ul":
+        from ul_engine import SCENARIO_KEYS, batch_long_frame, project_batch
+
+        batch = project_batch(*[np.array([p[k] for _, p in chunk]) for k in SCENARIO_KEYS])
+        frame = batch_long_frame(batch).drop(columns="scenario")
+        lengths = batch["n_years"]
+        returns = batch_metrics(frame["實繳保費"], frame["帳戶價值"], lengths)
+    else:
+        from strategy import RESULT_COLUMNS, paid_by_year, result_frame, run_strategy
+
+        product = PRODUCTS[calculator]
+        results = [run_strategy(product, p["start_age"], p["annual_deposit"], p["mode"]) for _, p in chunk]
+        # 逐欄串接後一次建表，避免每個情境各建一個 DataFrame
+        frame = result_frame({col: np.concatenate([r[col] for r in results]) for col in RESULT_COLUMNS})
+        lengths = [len(r["age"]) for r in results]
+        paid = np.concatenate([paid_by_year(r) for r in results])
+        returns = batch_metrics(paid, frame["net_worth"], lengths)
+
+    head = {"scenario": np.repeat([scenario_id for scenario_id, _ in chunk], lengths)}
+    for key in chunk[0][1]:
+        head[key] = np.repeat([p[key] for _, p in chunk], lengths)
+    return pd.concat([pd.DataFrame(head), frame, pd.DataFrame(returns)], axis=1)
+
+
+def iter_results(calculator, chunks, jobs, at_age=None):
+    """
+    依輸入順序逐批產生結果
+    同時送出的批次數有上限 (jobs * 2)，輸入再大記憶體用量也固定
+    """
+    if jobs <= 1:
+        for chunk in chunks:
+            yield len(chunk), run_chunk(calculator, chunk, at_age)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(run_chunk, calculator, chunk, at_age)))
+            if len(pending) >= jobs * 2:
+                n, future = pending.pop(0)
+                yield n, future.result()
+        for n, future in pending:
+            yield n, future.result()
+
+
+# --- 寫出結果 ---
+class CsvSink:
+    def __init__(self, path):
+        self.f = open(path, "w", encoding="utf-8-sig", newline="") if path != "-" else sys.stdout
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.f, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class JsonlSink:
+    def __init__(self, path):
+        self.f = open(path, "w", encoding="utf-8") if path != "-" else sys.stdout
+
+    def write(self, frame):
+        frame.to_json(self.f, orient="records", lines=True, force_ascii=False)
+        if len(frame):
+            self.f.write("\n")
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+def arrow_sink(path, fmt, metadata):
+    """Parquet (每批一個 row group) / Arrow IPC；需安裝 pyarrow"""
+    from export import ArrowSink
+
+    if path == "-":
+        raise SystemExit("Parquet / Arrow 輸出需指定檔名 (-o)")
+    try:
+        return ArrowSink(path, metadata, fmt)
+    except ImportError as e:
+        raise SystemExit(str(e))
+
+
+SINKS = {".csv": CsvSink, ".jsonl": JsonlSink, ".parquet": arrow_sink, ".arrow": arrow_sink}
+
+
+def open_sink(path, fmt=None, metadata=None):
+    fmt = fmt or (os.path.splitext(path)[1].lower() if path != "-" else ".csv")
+    fmt = fmt if fmt.startswith(".") else "." + fmt
+    if fmt not in SINKS:
+        raise SystemExit(f"不支援的輸出格式 {fmt}，可用：{', '.join(SINKS)}")
+    if SINKS[fmt] is arrow_sink:
+        return arrow_sink(path, fmt, metadata)
+    return SINKS[fmt](path)
+
+
+def export_assumptions(calculator, args):
+    """寫入 Parquet / Arrow metadata 的試算假設 (各情境的參數在資料欄位中)"""
+    from export import export_metadata
+
+    if calculator == "ul":
+        from ul_engine import ADMIN_FEE, COI_LOADING, EXPENSE_RATES
+
+        assumptions = {"expense_rates": EXPENSE_RATES, "admin_fee": ADMIN_FEE, "coi_loading": COI_LOADING}
+        product = "UL"
+    else:
+        from strategy import FEE_RATE, INCOME_RATE
+
+        assumptions = {"fee_rate": FEE_RATE, "income_rate": INCOME_RATE,
+                       "loan_policy": PRODUCTS[calculator]["loan_policy"], "at_age": args.at_age}
+        product = calculator
+    return export_metadata(product, assumptions, engine="cli", scenarios=os.path.basename(args.scenarios))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批次試算 (不啟動 Streamlit)")
+    parser.add_argument("calculator", choices=["ul", *PRODUCTS.names("strategy")], help="ul = 927UNN 萬能壽險；其餘為策略商品")
+    parser.add_argument("scenarios", help="情境檔 (.csv / .jsonl)")
+    parser.add_argument("-o", "--output", default="-", help="輸出檔 (.csv / .jsonl / .parquet / .arrow)，預設輸出 CSV 至 stdout")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet", "arrow"], help="指定輸出格式 (預設依副檔名)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="工作行程數 (1 = 不開行程池)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="每個工作單位的情境數")
+    parser.add_argument("--at-age", type=int, help="策略商品：每個情境只輸出該年齡的結算 (不在試算期間內為空值)")
+    parser.add_argument("--metrics", help="寫出效能指標 (.prom / .json)；試算階段的計時只在 --jobs 1 時記錄")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    if args.at_age is not None and calculator_kind(args.calculator) != "strategy":
+        parser.error("--at-age 只適用於策略商品")
+
+    start = time.perf_counter()
+    scenarios = (normalize_scenario(args.calculator, raw, i) for i, raw in enumerate(read_scenarios(args.scenarios)))
+    sink = open_sink(args.output, args.format, export_assumptions(args.calculator, args))
+    n_scenarios = n_rows = 0
+    try:
+        for n, frame in iter_results(args.calculator, chunked(scenarios, args.chunk_size), args.jobs, args.at_age):
+            with metrics.timer("cli.write"):
+                sink.write(frame)
+            metrics.count("cli.scenarios", n)
+            n_scenarios += n
+            n_rows += len(frame)
+    finally:
+        sink.close()
+    print(f"完成 {n_scenarios} 筆情境 / {n_rows} 列，耗時 {time.perf_counter() - start:.2f} 秒", file=sys.stderr)
+    if args.metrics:
+        metrics.dump(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+商品比較：同一位客戶 (投保年齡、性別、每年預算) 一次試算所有登錄的商品，依年齡對齊成一張表，
+共同指標為總淨資產、身故金、IRR 與損益兩平年度
+各商品的試算送到背景行程池同時執行 (相同輸入共用結果，只改 927UNN 條件時其他商品直接取快取)，全部完成後一次回傳
+
+年齡為各保單年度結束時的年齡 (與 strategy 引擎相同；927UNN 頁面顯示的是年度開始時的年齡)
+各商品的換算方式：
+- 策略商品 (PAI / IAT2 / 舊版 PAI)：每年存入預算；實繳為扣除配息折抵後的自付金額 (階梯槓桿模式為全額)
+- 萬能壽險 (UL)：預算為目標保費，保額、繳費年期、宣告利率取 profile 設定；淨資產為帳戶價值
+- 美富紅運：總資金 = 預算 × 繳費年期，第一年初一次投入，年繳保費取自動平衡值；淨資產為總資產，身故金未試算 (NaN)
+"""
+import numpy as np
+
+from analytics import break_even_year, irr_by_year
+from backend import BACKEND
+from metrics import timed
+from products import PRODUCTS
+
+SUMMARY_AGE = 65
+DEFAULT_PROFILE = {
+    "start_age": 30, "gender": "男性", "annual_budget": 120000, "mode": "offset",
+    "ul_sum_assured": 12000000, "ul_payment_term": 20, "ul_interest_rate": 0.08, "payout_rate": 0.08,
+}
+COLUMNS = ["product", "policy_year", "age", "paid", "cumulative_paid", "net_worth", "death_benefit", "irr"]
+SUMMARY_COLUMNS = ["product", "name", "cumulative_paid", "net_worth", "death_benefit", "irr",
+                   "break_even_year", "break_even_age"]
+COLUMN_LABELS = {
+    "product": "商品", "name": "商品", "policy_year": "保單年度", "age": "年齡", "paid": "當年實繳",
+    "cumulative_paid": "累積實繳", "net_worth": "總淨資產", "death_benefit": "身故金", "irr": "IRR",
+    "break_even_year": "損益兩平年度", "break_even_age": "損益兩平年齡",
+}
+
+
+def make_profile(**overrides):
+    unknown = set(overrides) - set(DEFAULT_PROFILE)
+    if unknown:
+        raise ValueError(f"未知的客戶條件: {', '.join(sorted(unknown))}")
+    return {**DEFAULT_PROFILE, **overrides}
+
+
+# --- 各類商品的試算 (模組層級函式，可送到背景行程池) ---
+def strategy_projection(product_key, start_age, annual_budget, mode):
+    from strategy import paid_by_year, run_strategy
+
+    res = run_strategy(PRODUCTS[product_key], start_age, annual_budget, mode)
+    return {"policy_year": res["policy_year"], "age": res["age"], "paid": paid_by_year(res),
+            "net_worth": res["net_worth"], "death_benefit": res["death_benefit"]}
+
+
+def ul_projection(start_age, gender, annual_budget, sum_assured, payment_term, interest_rate):
+    from ul_engine import project_batch
+
+    batch = project_batch(start_age, gender, annual_budget, sum_assured, payment_term, interest_rate)
+    n = int(batch["n_years"][0])
+    years = np.arange(1, n + 1)
+    return {"policy_year": years, "age": start_age + years, "paid": batch["premium"][0, :n].astype(float),
+            "net_worth": batch["account_value"][0, :n], "death_benefit": batch["death_benefit"][0, :n]}
+
+
+def dividend_projection(product_key, start_age, annual_budget, payout_rate):
+    from bigmoney_engine import balanced_premium, run_plan, suggested_fee_rate
+
+    product = PRODUCTS[product_key]
+    principal = annual_budget * product["premium_term"]
+    fee_rate = suggested_fee_rate(product, principal)
+    plan = run_plan(product, start_age, principal, balanced_premium(principal, payout_rate, fee_rate), payout_rate, fee_rate)
+    n = len(plan["policy_year"])
+    paid = np.zeros(n)
+    paid[:1] = principal
+    return {"policy_year": plan["policy_year"], "age": plan["age"], "paid": paid,
+            "net_worth": plan["total_asset"], "death_benefit": np.full(n, np.nan)}
+
+
+def projection_job(product_key, profile):
+    """商品對應的試算函式與參數 (只取該類商品用到的條件，其他條件改變時仍命中快取)"""
+    kind = PRODUCTS.manifest[product_key]["kind"]
+    p = profile
+    if kind == "strategy":
+        return strategy_projection, (product_key, p["start_age"], p["annual_budget"], p["mode"])
+    if kind == "ul":
+        return ul_projection, (p["start_age"], p["gender"], p["annual_budget"], p["ul_sum_assured"],
+                               p["ul_payment_term"], p["ul_interest_rate"])
+    if kind == "dividend":
+        return dividend_projection, (product_key, p["start_age"], p["annual_budget"], p["payout_rate"])
+    raise ValueError(f"{product_key}: 不支援比較的商品類型 {kind}")
+
+
+def product_frame(product_key, projection):
+    """單一商品的逐年表 (欄位見 COLUMNS)，附上累積實繳與各年末結清的 IRR"""
+    import pandas as pd
+
+    paid = np.asarray(projection["paid"], dtype=float)
+    net_worth = np.asarray(projection["net_worth"], dtype=float)
+    return pd.DataFrame({
+        "product": product_key,
+        "policy_year": np.asarray(projection["policy_year"], dtype=np.int64),
+        "age": np.asarray(projection["age"], dtype=np.int64),
+        "paid": paid,
+        "cumulative_paid": np.cumsum(paid),
+        "net_worth": net_worth,
+        "death_benefit": np.asarray(projection["death_benefit"], dtype=float),
+        "irr": irr_by_year(paid, net_worth),
+    })
+
+
+def summarize(table, summary_age=SUMMARY_AGE):
+    """每個商品一列：summary_age 當年的累積實繳、總淨資產、身故金、IRR，以及損益兩平年度/年齡"""
+    import pandas as pd
+
+    rows = []
+    for key, frame in table.groupby("product", observed=True, sort=False):
+        at = frame[frame["age"] == summary_age]
+        row = {"product": key, "name": PRODUCTS.manifest[key]["name"]}
+        for col in ("cumulative_paid", "net_worth", "death_benefit", "irr"):
+            row[col] = at[col].iloc[0] if len(at) else np.nan
+        year = int(break_even_year(frame["cumulative_paid"].to_numpy(), frame["net_worth"].to_numpy()))
+        row["break_even_year"] = year or None
+        row["break_even_age"] = frame["age"].iloc[year - 1] if year else None
+        rows.append(row)
+    summary = pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+    return summary.astype({"break_even_year": "Int64", "break_even_age": "Int64"})
+
+
+@timed("compare.run")
+def compare(profile=None, keys=None, summary_age=SUMMARY_AGE):
+    """
+    所有 (或指定的) 商品一次比較；各商品試算同時送出，全部完成後合併
+    回傳 dict：profile、table (依商品、年齡排列的逐年表)、summary (每商品一列)
+    """
+    import pandas as pd
+
+    profile = make_profile(**(profile or {}))
+    keys = list(keys or PRODUCTS)
+    jobs = []
+    for key in keys:
+        func, args = projection_job(key, profile)
+        jobs.append((key, BACKEND.submit(func, *args)))
+    table = pd.concat([product_frame(key, job.result()) for key, job in jobs], ignore_index=True)
+    table["product"] = pd.Categorical(table["product"], categories=keys)
+    return {"profile": profile, "table": table, "summary": summarize(table, summary_age)}
+
+
+def wide_frame(table, field):
+    """依年齡對齊的寬表 (列 = 年齡、欄 = 商品名稱)，圖表使用"""
+    names = {key: PRODUCTS.manifest[key]["name"] for key in table["product"].cat.categories}
+    wide = table.pivot(index="age", columns="product", values=field)
+    return wide.rename(columns=names)
@@ -0,0 +1,95 @@
+import streamlit as st
+from cache import cache_stats
+from metrics import publish, render_debug_panel, startup, timer
+from compare import COLUMN_LABELS, compare, wide_frame
+from display import format_money
+
+# --- 1. 頁面基礎設定 ---
+st.set_page_config(page_title="商品比較", page_icon="⚖️", layout="wide")
+startup("imports")  # 冷啟動量測：頁面模組載入完成
+
+# --- 1.5 密碼驗證模組 ---
+def check_password():
+    """Returns `True` if the user had a correct password."""
+    ACTUAL_PASSWORD = "TP927" # <--- 密碼設定
+
+    def password_entered():
+        if st.session_state["password"] == ACTUAL_PASSWORD:
+            st.session_state["password_correct"] = True
+            del st.session_state["password"]
+        else:
+            st.session_state["password_correct"] = False
+
+    if "password_correct" not in st.session_state:
+        st.text_input("🔒 請輸入訪問密碼", type="password", on_change=password_entered, key="password")
+        return False
+    elif not st.session_state["password_correct"]:
+        st.text_input("🔒 請輸入訪問密碼", type="password", on_change=password_entered, key="password")
+        st.error("❌ 密碼錯誤")
+        return False
+    else:
+        return True
+
+if not check_password():
+    st.stop()
+
+# --- 2. 客戶條件 (所有商品共用) ---
+with st.sidebar:
+    st.header("🧑‍💼 客戶條件")
+    start_age = st.number_input("投保年齡", value=30, min_value=0, max_value=80)
+    gender = st.selectbox("性別", ["男性", "女性"])
+    annual_budget = st.number_input("💵 每年預算", value=120000, step=12000, min_value=12000)
+    mode = st.radio("🔄 策略商品模式", ["🛡️ 以息養險 (折抵保費)", "🚀 階梯槓桿 (複利滾存)"])
+    with st.expander("U系列加強版 條件"):
+        ul_sum_assured = st.number_input("基本保額 (元)", value=12000000, step=100000)
+        ul_payment_term = st.slider("繳費年期", 6, 30, 20)
+        ul_interest_rate = st.number_input("假設宣告利率 (%)", value=8.0, step=0.1) / 100
+    with st.expander("美富紅運 條件"):
+        payout_rate = st.number_input("年配息率 (%)", value=8.0, step=0.1) / 100
+        st.caption("總資金 = 每年預算 × 繳費年期，第一年一次投入，年繳保費自動平衡")
+
+st.title("⚖️ 商品比較 (同一預算)")
+profile = {
+    "start_age": start_age, "gender": gender, "annual_budget": annual_budget,
+    "mode": "offset" if "以息養險" in mode else "compound",
+    "ul_sum_assured": ul_sum_assured, "ul_payment_term": ul_payment_term,
+    "ul_interest_rate": ul_interest_rate, "payout_rate": payout_rate,
+}
+
+# --- 3. 一次試算所有商品 (各商品同時送到背景行程池) ---
+with timer("page.compare"):
+    result = compare(profile)
+summary, table = result["summary"], result["table"]
+
+# --- 4. 65 歲結算比較 ---
+st.markdown("### 🎯 65 歲結算比較")
+shown = summary.drop(columns="product").rename(columns=COLUMN_LABELS)
+st.dataframe(shown.style.format({
+    "累積實繳": format_money, "總淨資產": format_money, "身故金": format_money, "IRR": "{:.2%}",
+}, na_rep="-"), use_container_width=True, hide_index=True)
+st.caption("IRR：繳費視為年初支付、於該年末以總淨資產結清的年化報酬率；損益兩平：總淨資產第一次不低於累積實繳")
+
+# --- 5. 依年齡對齊的走勢 ---
+col1, col2 = st.columns(2)
+col1.markdown("#### 總淨資產")
+col1.line_chart(wide_frame(table, "net_worth"))
+col2.markdown("#### IRR (各年末結清)")
+col2.line_chart(wide_frame(table, "irr"))
+
+# --- 6. 逐年明細 (所有商品一張表) ---
+with st.expander("📋 逐年明細"):
+    detail = table.assign(product=table["product"].cat.rename_categories(dict(zip(summary["product"], summary["name"]))))
+    st.dataframe(detail.rename(columns=COLUMN_LABELS).style.format({
+        "當年實繳": format_money, "累積實繳": format_money, "總淨資產": format_money, "身故金": format_money,
+        "IRR": "{:.2%}",
+    }, na_rep="-"), use_container_width=True, hide_index=True, height=500)
+    st.download_button("下載逐年明細 (CSV)", table.to_csv(index=False).encode("utf-8-sig"),
+                       file_name=f"compare_{start_age}.csv", mime="text/csv")
+
+cache_total = cache_stats()["total"]
+st.sidebar.caption(f"🧮 試算快取：命中 {cache_total['hits']} 次 / 未命中 {cache_total['misses']} 次")
+
+# --- 效能監測 (PAI_METRICS=1 時顯示於側邊欄) ---
+startup("first_render")
+render_debug_panel(st.sidebar)
+publish()
@@ -0,0 +1,81 @@
+"""
+表格顯示共用工具 (金額格式化、樣式矩陣)
+試算結果維持數值型別，金額字串只在顯示時由 Styler.format 產生；
+樣式以整欄布林遮罩一次產生，不逐格以 iloc 修改
+"""
+import numpy as np
+
+LOAN_ROW_STYLE = 'background-color: #fffbe6;'
+
+
+def format_money(val, is_receive_column=False):
+    if val == 0: return "-"
+    abs_val = abs(val)
+    money_str = f"${abs_val:,.0f}"
+    if is_receive_column and val < 0: return f"領 {money_str}"
+    elif val < 0: return f"-{money_str}"
+    return money_str
+
+
+def format_rate(val, digits=2):
+    if val is None or np.isnan(val): return "-"
+    return f"{val:.{digits}%}"
+
+
+def returns_html(returns):
+    """結算看板的報酬分析列 (returns 為 strategy.returns_at 的結果)"""
+    if not returns:
+        return ""
+    break_even = f"{returns['break_even_age']} 歲" if returns["break_even_age"] else "未達成"
+    return f"""
+        <div class="verify-row" style="color: #1677ff;"><span>📈 IRR (年化) / 累積報酬率</span> <span>{format_rate(returns['irr'])} / {format_rate(returns['roi'], 0)}</span></div>
+        <div class="verify-row" style="color: #1677ff;"><span>⚖️ 損益兩平 (總淨資產 ≥ 累積實繳)</span> <span>{break_even}</span></div>"""
+
+
+def money_formatter(divisor=1, is_receive_column=False):
+    """Styler.format 用的金額格式 (divisor=12 時顯示月繳金額)"""
+    return lambda val: format_money(val / divisor, is_receive_column)
+
+
+def format_loan_column(styler, column, limit_rate, rows=None):
+    """
+    借款欄在指定列 (預設全部) 後綴可借成數，例如 "-$1,234 (90%)"
+    依成數分組套用格式，Styler.format 呼叫次數只和成數種類有關
+    """
+    limit_rate = np.asarray(limit_rate)
+    rows = np.ones(len(limit_rate), dtype=bool) if rows is None else np.asarray(rows, dtype=bool)
+    index = styler.data.index
+    for rate in np.unique(limit_rate[rows]):
+        hit = index[rows & (limit_rate == rate)]
+        styler = styler.format(lambda val, r=rate: f"{format_money(val)} ({int(r*100)}%)", subset=(hit, [column]))
+    return styler
+
+
+def format_loan_age(styler, column, borrowed):
+    """借款年的年齡後加上 ⚡"""
+    hit = styler.data.index[np.asarray(borrowed, dtype=bool)]
+    return styler.format(lambda val: f"{val} ⚡", subset=(hit, [column]))
+
+
+def build_style_frame(df, row_mask=None, row_style=LOAN_ROW_STYLE, column_styles=None):
+    """
+    產生給 Styler.apply(axis=None) 使用的樣式 DataFrame
+    row_mask: 需整列上色的列 (例如借款年)，套用 row_style
+    column_styles: {欄名: [(遮罩, css), ...]}，遮罩為 True 代表整欄；css 依序接在整列樣式之後
+    """
+    import pandas as pd
+
+    n = len(df)
+    if row_mask is None:
+        base = np.full(n, "", dtype=object)
+    else:
+        base = np.where(np.asarray(row_mask, dtype=bool), row_style, "").astype(object)
+
+    column_styles = column_styles or {}
+    styles = {}
+    for col in df.columns:
+        col_style = base
+        for mask, css in column_styles.get(col, ()):
+            col_style = col_style + np.where(np.broadcast_to(mask, (n,)), css, "").astype(object)
+        styles[col] = col_style
+    return pd.DataFrame(styles, index=df.index, columns=df.columns)
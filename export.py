@@ -0,0 +1,201 @@
+"""
+試算結果匯出為 Arrow / Parquet：欄位維持數值型別 (不是格式化後的字串)，
+檔案 metadata 記錄商品、費率表版本與試算假設 (鍵 pai.export，JSON)
+批次結果以 ArrowSink 逐批寫出 (Parquet 每批一個 row group、Arrow 每批一個 record batch)，記憶體用量與總列數無關
+需安裝 pyarrow (選用套件)；未安裝時 available() 為 False，呼叫匯出函式會拋出 ImportError
+
+    from export import ArrowSink, export_metadata
+    with ArrowSink("book.parquet", export_metadata("PAI", assumptions={...})) as sink:
+        for frame in batches:
+            sink.write(frame)
+"""
+import datetime
+import importlib.util
+import io
+import json
+import os
+
+import numpy as np
+
+METADATA_KEY = b"pai.export"
+FORMAT_VERSION = 1
+FORMATS = (".parquet", ".arrow")
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("匯出 Arrow / Parquet 需要 pyarrow：pip install pyarrow") from None
+    return pyarrow
+
+
+def available():
+    """是否可匯出：只檢查 pyarrow 是否已安裝，不載入 (頁面顯示下載鈕時呼叫，實際匯出時才 import)"""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def export_metadata(product=None, assumptions=None, table_version=None, **extra):
+    """
+    匯出檔的 metadata：product 為商品登錄表的鍵 (費率表版本自動由 PRODUCTS.version 取得)
+    assumptions 為試算假設 (年齡、存入金額、配息率、手續費率等)，其餘關鍵字一併記錄
+    """
+    if product is not None and table_version is None:
+        from products import PRODUCTS
+
+        if product in PRODUCTS:
+            table_version = PRODUCTS.version(product)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "product": product,
+        "table_version": table_version,
+        "assumptions": assumptions or {},
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    }
+    meta.update(extra)
+    return meta
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"無法寫入 metadata: {type(value).__name__}")
+
+
+def to_arrow(data, metadata=None):
+    """
+    DataFrame 或 {欄名: 陣列} -> pyarrow.Table，附上 metadata
+    傳入 NumPy 陣列 dict 時，無缺值的數值欄直接引用原陣列記憶體 (zero-copy)
+    """
+    import pandas as pd
+
+    pa = _pyarrow()
+    if isinstance(data, pd.DataFrame):
+        table = pa.Table.from_pandas(data, preserve_index=False)
+    elif isinstance(data, pa.Table):
+        table = data
+    else:
+        table = pa.table({name: pa.array(np.asarray(values)) for name, values in data.items()})
+    if metadata is not None:
+        schema_meta = dict(table.schema.metadata or {})
+        schema_meta[METADATA_KEY] = json.dumps(metadata, ensure_ascii=False, default=_json_default).encode("utf-8")
+        table = table.replace_schema_metadata(schema_meta)
+    return table
+
+
+def _format_of(path, fmt=None):
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lower() if isinstance(path, str) else ".parquet"
+    fmt = fmt if fmt.startswith(".") else "." + fmt
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的匯出格式 {fmt}，可用：{', '.join(FORMATS)}")
+    return fmt
+
+
+class ArrowSink:
+    """
+    逐批寫出 Arrow / Parquet (path 可為檔名或可寫入的檔案物件)
+    第一批決定欄位與型別，之後每批須相同；metadata 寫在檔案 schema
+    """
+    def __init__(self, path, metadata=None, fmt=None, compression="zstd"):
+        self.pa = _pyarrow()
+        self.path = path
+        self.fmt = _format_of(path, fmt)
+        self.metadata = metadata
+        self.compression = compression
+        self.writer = None
+        self.schema = None
+        self.rows = 0
+
+    def write(self, data):
+        table = to_arrow(data, self.metadata)
+        if self.writer is None:
+            self.schema = table.schema
+            if self.fmt == ".parquet":
+                self.writer = self.pa.parquet.ParquetWriter(self.path, self.schema, compression=self.compression)
+            else:
+                self.writer = self.pa.ipc.new_file(self.path, self.schema)
+        elif not table.schema.equals(self.schema):
+            table = table.cast(self.schema)  # 例如某批整欄缺值被推斷為 null 型別
+        self.writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_table(path, data, metadata=None, fmt=None):
+    """單一表格寫成一個檔案"""
+    with ArrowSink(path, metadata, fmt) as sink:
+        sink.write(data)
+    return path
+
+
+def to_bytes(data, metadata=None, fmt=".parquet"):
+    """寫成記憶體中的檔案內容 (頁面下載按鈕使用)"""
+    buffer = io.BytesIO()
+    write_table(buffer, data, metadata, fmt)
+    return buffer.getvalue()
+
+
+def read_metadata(path):
+    """讀回匯出檔的 metadata (dict)；不是由本模組匯出的檔案回傳 None"""
+    pa = _pyarrow()
+    if _format_of(path) == ".parquet":
+        schema = pa.parquet.read_schema(path)
+    else:
+        with pa.memory_map(path) as source:
+            schema = pa.ipc.open_file(source).schema
+    raw = (schema.metadata or {}).get(METADATA_KEY)
+    return None if raw is None else json.loads(raw)
+
+
+# --- 各試算引擎的匯出表 ---
+def strategy_columns(result):
+    """run_strategy / cached_strategy 結果 -> 型別明確的欄位 dict (型別相符時直接引用原陣列)"""
+    from strategy import RESULT_COLUMNS
+
+    dtypes = {"policy_year": np.int64, "age": np.int64, "borrowed": bool}
+    return {col: np.asarray(result[col], dtype=dtypes.get(col, np.float64)) for col in RESULT_COLUMNS}
+
+
+def strategy_export(product_key, result, start_age, annual_deposit, fmt=".parquet"):
+    """策略商品 (PAI / IAT2 / 舊版 PAI) 單一情境的匯出檔內容"""
+    from products import PRODUCTS
+
+    product = PRODUCTS[product_key]
+    assumptions = {
+        "start_age": start_age, "annual_deposit": annual_deposit, "mode": result["mode"],
+        "fee_rate": result["fee_rate"], "income_rate": result["income_rate"], "loan_policy": product["loan_policy"],
+    }
+    return to_bytes(strategy_columns(result), export_metadata(product_key, assumptions, engine="strategy"), fmt)
+
+
+def projection_export(frame, scenario, fmt=".parquet"):
+    """927UNN calculate_projection 結果的匯出檔內容 (scenario 為試算條件)"""
+    from ul_engine import ADMIN_FEE, COI_LOADING, EXPENSE_RATES
+
+    assumptions = dict(scenario, expense_rates=EXPENSE_RATES, admin_fee=ADMIN_FEE, coi_loading=COI_LOADING)
+    return to_bytes(frame, export_metadata("UL", assumptions, engine="ul_engine"), fmt)
+
+
+def policy_export(premium, frame, age, gender, amount, csv_path="PDATA.csv", fmt=".parquet"):
+    """utils.calculate_policy 結果的匯出檔內容；費率表版本為 PDATA.csv 的 sha256"""
+    from utils import PREMIUM_TERM, UNIT_BASE, _file_sha256
+
+    assumptions = {"age": age, "gender": gender, "amount": amount, "premium": premium,
+                   "unit_base": UNIT_BASE, "premium_term": PREMIUM_TERM}
+    meta = export_metadata("PDATA", assumptions, table_version=_file_sha256(csv_path)[:12], engine="utils")
+    return to_bytes(frame, meta, fmt)
@@ -0,0 +1,197 @@
+"""
+效能監測：各階段計時 (context manager / decorator) 與事件計數，可匯出 JSON 或 Prometheus 文字格式
+預設關閉；關閉時 timer() 回傳共用的空 context、timed() 只多一次旗標判斷，可長期留在正式環境
+
+啟用: 環境變數 PAI_METRICS=1 (或呼叫 enable())
+匯出: 環境變數 PAI_METRICS_FILE=/path/metrics.prom (或 .json)，頁面每次執行結束時由 publish() 寫出
+      (Prometheus node_exporter textfile collector 可直接讀取 .prom 檔)
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+_enabled = os.environ.get("PAI_METRICS", "") not in ("", "0")
+_lock = threading.Lock()
+_stages = {}    # 階段 -> [次數, 總秒數, 最長秒數, 最近一次秒數]
+_counters = {}  # 事件 -> 累計次數
+_last_publish = 0.0
+
+METRICS_FILE = os.environ.get("PAI_METRICS_FILE")
+PUBLISH_INTERVAL = 5.0  # publish() 寫檔的最短間隔 (秒)
+_NOOP = contextlib.nullcontext()
+_LOADED_AT = time.perf_counter()
+_startup_marks = set()
+
+
+def enabled():
+    return _enabled
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+
+
+def record(stage, seconds):
+    with _lock:
+        s = _stages.get(stage)
+        if s is None:
+            _stages[stage] = [1, seconds, seconds, seconds]
+        else:
+            s[0] += 1
+            s[1] += seconds
+            s[2] = max(s[2], seconds)
+            s[3] = seconds
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start)
+
+
+def timer(stage):
+    """with timer("階段名稱"): ... 計時一段程式"""
+    return _Timer(stage) if _enabled else _NOOP
+
+
+def timed(stage=None):
+    """函式計時 decorator，階段名稱預設為 模組.函式"""
+    def decorator(func):
+        name = stage or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def process_uptime():
+    """行程啟動至今的秒數 (Linux 由 /proc 計算，含 Streamlit 伺服器啟動；其他平台以 metrics 載入時間近似)"""
+    try:
+        with open("/proc/self/stat") as f:
+            started = int(f.read().rsplit(")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0]) - started
+    except (OSError, ValueError, IndexError):
+        return time.perf_counter() - _LOADED_AT
+
+
+def startup(stage):
+    """冷啟動量測：行程內第一次到達 stage 時記錄 startup.<stage> = 行程啟動至今的秒數 (之後的重跑不再記錄)"""
+    if not _enabled or stage in _startup_marks:
+        return
+    _startup_marks.add(stage)
+    record(f"startup.{stage}", process_uptime())
+
+
+# --- 匯出 ---
+def snapshot():
+    """{"stages": {階段: {count, total, max, last}}, "counters": {...}, "caches": cache_stats()}"""
+    from cache import cache_stats
+
+    with _lock:
+        stages = {name: {"count": s[0], "total": s[1], "max": s[2], "last": s[3]} for name, s in _stages.items()}
+        counters = dict(_counters)
+    return {"enabled": _enabled, "stages": stages, "counters": counters, "caches": cache_stats()}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text(snap=None):
+    snap = snap or snapshot()
+    lines = [
+        "# HELP pai_stage_seconds 各階段執行時間",
+        "# TYPE pai_stage_seconds summary",
+    ]
+    for name, s in sorted(snap["stages"].items()):
+        lines.append(f'pai_stage_seconds_sum{{stage="{_label(name)}"}} {s["total"]:.9f}')
+        lines.append(f'pai_stage_seconds_count{{stage="{_label(name)}"}} {s["count"]}')
+    lines += ["# HELP pai_stage_seconds_max 各階段最長執行時間", "# TYPE pai_stage_seconds_max gauge"]
+    for name, s in sorted(snap["stages"].items()):
+        lines.append(f'pai_stage_seconds_max{{stage="{_label(name)}"}} {s["max"]:.9f}')
+    lines += ["# HELP pai_events_total 事件計數 (試算情境數等)", "# TYPE pai_events_total counter"]
+    for name, n in sorted(snap["counters"].items()):
+        lines.append(f'pai_events_total{{event="{_label(name)}"}} {n}')
+    lines += ["# HELP pai_cache_requests_total 試算快取命中/未命中次數", "# TYPE pai_cache_requests_total counter"]
+    for name, s in sorted(snap["caches"].items()):
+        if name == "total":
+            continue
+        lines.append(f'pai_cache_requests_total{{cache="{_label(name)}",result="hit"}} {s["hits"]}')
+        lines.append(f'pai_cache_requests_total{{cache="{_label(name)}",result="miss"}} {s["misses"]}')
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    """寫出指標檔 (.json 為 JSON，其餘為 Prometheus 文字格式)；以暫存檔原子替換，讀取端不會讀到半份檔案"""
+    snap = snapshot()
+    text = json.dumps(snap, ensure_ascii=False, indent=1) if path.endswith(".json") else prometheus_text(snap)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+
+def publish(path=None):
+    """頁面執行結束時呼叫：啟用且設定了 PAI_METRICS_FILE 時寫出指標檔 (最多每 PUBLISH_INTERVAL 秒一次)"""
+    global _last_publish
+    path = path or METRICS_FILE
+    if not _enabled or not path:
+        return
+    now = time.monotonic()
+    if now - _last_publish < PUBLISH_INTERVAL:
+        return
+    _last_publish = now
+    dump(path)
+
+
+def render_debug_panel(container):
+    """側邊欄除錯面板 (container 傳入 st.sidebar)；未啟用時不顯示"""
+    if not _enabled:
+        return
+    snap = snapshot()
+    panel = container.expander("🛠️ 效能監測")
+    rows = [
+        {"階段": name, "次數": s["count"], "平均 ms": s["total"] / s["count"] * 1000,
+         "最近 ms": s["last"] * 1000, "最長 ms": s["max"] * 1000}
+        for name, s in sorted(snap["stages"].items())
+    ]
+    panel.dataframe(rows, hide_index=True, use_container_width=True)
+    total = snap["caches"]["total"]
+    events = "、".join(f"{name} {n:,}" for name, n in sorted(snap["counters"].items()))
+    panel.caption(f"快取命中 {total['hits']} / 未命中 {total['misses']}" + (f"；{events}" if events else ""))
+    panel.download_button("下載 Prometheus 指標", prometheus_text(snap), file_name="metrics.prom")
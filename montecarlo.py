@@ -0,0 +1,151 @@
+"""
+借款投資策略的蒙地卡羅模擬 (預設為 PAI)
+借款規則即 strategy.borrow_step (與 strategy 引擎相同)，但每年報酬率改為隨機路徑 (對數常態或歷史報酬抽樣)
+所有路徑以陣列同時計算，逐年迴圈只跑年度數次
+"""
+import numpy as np
+
+from metrics import count, timed
+from products import PRODUCTS
+from strategy import FEE_RATE, INCOME_RATE, borrow_step, borrow_window, n_projection_years, product_arrays
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def lognormal_returns(n_paths, n_years, mean=0.07, vol=0.15, rng=None):
+    """年報酬率 r，(1 + r) 服從對數常態，算術平均為 mean、標準差為 vol"""
+    rng = rng if rng is not None else np.random.default_rng()
+    sigma2 = np.log(1 + (vol / (1 + mean)) ** 2)
+    mu = np.log(1 + mean) - sigma2 / 2
+    return np.exp(rng.normal(mu, np.sqrt(sigma2), size=(n_paths, n_years))) - 1
+
+
+def load_return_history(csv_path):
+    """
+    讀取本機歷史年報酬 CSV (取第一個數值欄位)
+    數值超過 ±1.5 視為百分比，自動除以 100
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    numeric = df.select_dtypes("number")
+    if numeric.empty:
+        raise ValueError(f"{csv_path} 中找不到數值欄位")
+    values = numeric.iloc[:, 0].dropna().to_numpy(dtype=float)
+    if np.abs(values).max() > 1.5:
+        values = values / 100
+    return values
+
+
+def bootstrap_returns(history, n_paths, n_years, rng=None):
+    """從歷史年報酬中重複抽樣"""
+    rng = rng if rng is not None else np.random.default_rng()
+    return rng.choice(np.asarray(history, dtype=float), size=(n_paths, n_years), replace=True)
+
+
+def simulate_pai(start_age, monthly_deposit, mode="offset", **kwargs):
+    """PAI 頁面的模擬入口 (月存金額)，參數同 simulate_strategy"""
+    return simulate_strategy(PRODUCTS["PAI"], start_age, monthly_deposit * 12, mode, **kwargs)
+
+
+@timed("montecarlo.simulate")
+def simulate_strategy(product, start_age, annual_deposit, mode="offset", n_paths=10000, returns="lognormal",
+                      mean=INCOME_RATE, vol=0.15, history_csv=None, loan_rate=0.0, seed=None,
+                      summary_age=65, policy=None, fee_rate=FEE_RATE, income_rate=INCOME_RATE, progress=None):
+    """
+    mode: "offset" 以息養險 / "compound" 階梯槓桿
+    returns: "lognormal"、"bootstrap" (需 history_csv)，或直接傳入 (路徑, 年度) 報酬陣列
+    基金以市值計：每年依年初市值的 income_rate 配息，市值隨報酬率 r 變動並扣除配息 (乘以 1 + r - income_rate)，
+    虧損年度由基金市值承擔，總淨資產與身故金隨路徑變動；報酬率固定為 income_rate 時與 run_strategy 相同
+    loan_rate: 保單借款利率，先由當年配息支付，不足部分滾入借款 (預設 0，與頁面試算相同)
+    progress: 每年算完呼叫 progress(已完成年數, 總年數) (背景試算回報進度、取消用)
+    回傳 dict:
+      ages: 各年度年齡
+      net_worth / death_benefit: (分位數, 年度) 的百分位帶，分位數見 PERCENTILES
+      summary: summary_age 時的淨資產/身故金分位數，以及淨資產低於累積實繳 (虧損) 的機率 p_loss；
+               借款受借款成數限制不會超過解約金，風險改以虧損機率表示；試算期間未涵蓋 summary_age 時皆為 NaN
+    """
+    policy = policy or product["loan_policy"]
+    count("montecarlo.paths", n_paths)
+    n_years = n_projection_years(product, start_age)
+
+    if isinstance(returns, str):
+        rng = np.random.default_rng(seed)
+        if returns == "lognormal":
+            r = lognormal_returns(n_paths, n_years, mean, vol, rng)
+        elif returns == "bootstrap":
+            if history_csv is None:
+                raise ValueError("bootstrap 模式需提供 history_csv")
+            r = bootstrap_returns(load_return_history(history_csv), n_paths, n_years, rng)
+        else:
+            raise ValueError(f"未知的報酬模型: {returns}")
+    else:
+        r = np.asarray(returns, dtype=float)
+        n_paths = r.shape[0]
+    # 轉為 (年度, 路徑) 連續排列，逐年取用與寫入皆為連續記憶體
+    r = np.ascontiguousarray(r.T)
+
+    # 與路徑無關的逐年數值 (解約金、身故金、借款成數、應繳保費)
+    base = product_arrays(product, start_age, annual_deposit)
+    years, ages, cv = base["policy_year"], base["age"], base["cv"]
+    death_base, limit_rate, nominal_premium = base["death_base"], base["limit_rate"], base["nominal_premium"]
+
+    loan = np.zeros(n_paths)
+    fund = np.zeros(n_paths)
+    accum_cash_out = np.zeros(n_paths)
+    accum_net_wealth = np.zeros(n_paths)
+    last_borrow_year = np.zeros(n_paths, dtype=np.int64)
+    accum_paid = np.zeros(n_paths)  # 累積自付金額 (同 strategy.paid_by_year)
+    paid_at_summary = None
+
+    net_worth = np.empty((n_years, n_paths))
+    death_benefit = np.empty((n_years, n_paths))
+
+    for t in range(n_years):
+        if borrow_window(years[t], ages[t], policy):
+            _, loan, fund, last_borrow_year = borrow_step(cv[t], limit_rate[t], loan, fund, last_borrow_year, years[t],
+                                                          ages[t], policy, fee_rate)
+
+        net_income = fund * income_rate
+        fund = fund * np.maximum(1 + r[t] - income_rate, 0)  # 市值重估 (報酬扣除配息，最多虧損到 0)
+        if loan_rate:
+            # 借款利息由配息支付，不足額滾入借款
+            net_income = net_income - loan * loan_rate
+            shortfall = np.maximum(-net_income, 0)
+            loan = loan + shortfall
+            net_income = net_income + shortfall
+
+        if mode == "offset":
+            actual_pay = nominal_premium[t] - net_income
+            accum_cash_out += np.where(actual_pay > 0, 0, -actual_pay)
+            accum_paid += np.maximum(actual_pay, 0)
+            net_worth[t] = cv[t] + fund + accum_cash_out - loan
+            death_benefit[t] = death_base[t] + fund - loan
+        else:
+            accum_net_wealth = accum_net_wealth * (1 + r[t]) + net_income
+            accum_paid += nominal_premium[t]
+            net_worth[t] = cv[t] + fund + accum_net_wealth - loan
+            death_benefit[t] = death_base[t] + fund + accum_net_wealth - loan
+        if ages[t] == summary_age:
+            paid_at_summary = accum_paid.copy()
+        if progress is not None:
+            progress(t + 1, n_years)
+
+    summary = {}
+    hit = np.nonzero(ages == summary_age)[0]
+    if hit.size and n_paths:
+        summary["p_loss"] = float((net_worth[hit[0]] < paid_at_summary).mean())
+    else:
+        summary["p_loss"] = float("nan")
+    for name, values in (("net_worth", net_worth), ("death_benefit", death_benefit)):
+        if hit.size:
+            summary[name] = dict(zip(PERCENTILES, np.percentile(values[hit[0]], PERCENTILES)))
+        else:
+            summary[name] = dict.fromkeys(PERCENTILES, float("nan"))
+
+    return {
+        "ages": ages,
+        "net_worth": np.percentile(net_worth, PERCENTILES, axis=1) if n_years else np.empty((len(PERCENTILES), 0)),
+        "death_benefit": np.percentile(death_benefit, PERCENTILES, axis=1) if n_years else np.empty((len(PERCENTILES), 0)),
+        "summary": summary,
+    }
@@ -0,0 +1,269 @@
+"""
+借款策略最佳化：找出 summary_age (預設 65 歲) 總淨資產最高的借款方式，
+並列出總淨資產對最高借款/解約金比 (停效風險) 的 Pareto 前緣
+- search_policies: 搜尋首借門檻 × 增貸間隔 × 借款比例 (借到可借額度的幾成) × 停借年齡，
+  所有候選策略攤平成一維陣列同時計算，逐年迴圈只跑年度數次 (借款規則即 strategy.borrow_step)
+- optimal_schedule: 不限規則形式，以動態規劃逐年決定是否借款
+  每次借款都借到上限，借款餘額只取決於上次借款年度 (基金本金恆為餘額扣手續費)，
+  狀態即為上次借款年度，每年的配息收益可逐年累加，O(年數²) 求得最佳解
+"""
+import numpy as np
+
+from metrics import count, timed
+from products import PRODUCTS
+from strategy import FEE_RATE, INCOME_RATE, borrow_step, product_arrays
+
+SUMMARY_AGE = 65
+THRESHOLDS = (0, 100000, 200000, 300000, 500000, 1000000)
+INTERVALS = (1, 2, 3, 4, 5, 6)
+FRACTIONS = (0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+STOP_AGES = (45, 50, 55, 60, 65, 70, 75)
+
+CANDIDATE_COLUMNS = ["first_min", "topup_min", "interval", "fraction", "stop_age"]
+COLUMN_LABELS = {
+    "first_min": "首借門檻", "interval": "增貸間隔 (年)", "fraction": "借款比例", "stop_age": "停借年齡",
+    "net_worth": "總淨資產", "peak_ltv": "最高借款/解約金", "n_borrows": "借款次數",
+}
+
+
+def candidate_grid(policy, thresholds=THRESHOLDS, intervals=INTERVALS, fractions=FRACTIONS, stop_ages=STOP_AGES):
+    """
+    候選策略 (各欄為一維陣列)；門檻為首借最低金額，增貸最低金額取原策略與門檻較小者
+    原策略 (門檻、間隔、停借年齡相同且比例為 1) 一併納入，方便比較
+    """
+    thresholds = sorted({*thresholds, policy["first_min"]})
+    intervals = sorted({*intervals, max(policy["interval"], 1)})
+    fractions = sorted({*fractions, 1.0})
+    stop_ages = sorted({*stop_ages, policy["stop_age"]})
+    grid = np.meshgrid(thresholds, intervals, fractions, stop_ages, indexing="ij")
+    first_min, interval, fraction, stop_age = (g.ravel() for g in grid)
+    return {
+        "first_min": first_min.astype(float),
+        "topup_min": np.minimum(policy["topup_min"], first_min).astype(float),
+        "interval": interval.astype(np.int64),
+        "fraction": fraction.astype(float),
+        "stop_age": stop_age.astype(np.int64),
+    }
+
+
+@timed("optimizer.evaluate")
+def evaluate_policies(product, start_age, annual_deposit, candidates, mode="offset", cycle=None,
+                      fee_rate=FEE_RATE, income_rate=INCOME_RATE, summary_age=SUMMARY_AGE):
+    """
+    一次試算所有候選策略 (fraction=1 時與 run_strategy 的結果一致)
+    回傳 dict (每個候選一個值)：net_worth (summary_age 當年，不在試算期間為 NaN)、
+    peak_ltv (整個試算期間借款/解約金的最大值)、loan (summary_age 當年的借款餘額)、n_borrows (至 summary_age 的借款次數)
+    """
+    base = product_arrays(product, start_age, annual_deposit)
+    cv, ages, nominal_premium, limit_rate = base["cv"], base["age"], base["nominal_premium"], base["limit_rate"]
+    n_years = len(cv)
+    n = len(candidates["interval"])
+    count("optimizer.candidates", n)
+    # 候選策略並列：各欄位為陣列的借款策略，交給 strategy.borrow_step
+    policy = {name: candidates[name] for name in ("first_min", "topup_min", "interval", "stop_age")}
+    policy["cycle"] = cycle
+    fraction = candidates["fraction"]
+    summary_t = int(summary_age - start_age - 1)
+
+    loan = np.zeros(n)
+    fund = np.zeros(n)
+    accum = np.zeros(n)  # offset: 累積領回現金；compound: 累積配息 (複利)
+    last_borrow_year = np.zeros(n, dtype=np.int64)
+    n_borrows = np.zeros(n, dtype=np.int64)
+    peak_ltv = np.zeros(n)
+    out = {"net_worth": np.full(n, np.nan), "loan": np.full(n, np.nan), "n_borrows": np.zeros(n, dtype=np.int64)}
+
+    for t in range(n_years):
+        borrow, loan, fund, last_borrow_year = borrow_step(cv[t], limit_rate[t], loan, fund, last_borrow_year, t + 1,
+                                                           ages[t], policy, fee_rate, fraction)
+        n_borrows += borrow
+
+        net_income = fund * income_rate
+        if mode == "offset":
+            actual_pay = nominal_premium[t] - net_income
+            accum = accum + np.where(actual_pay > 0, 0, -actual_pay)
+        else:
+            accum = (accum * (1 + income_rate)) + net_income
+        if cv[t] > 0:
+            np.maximum(peak_ltv, loan / cv[t], out=peak_ltv)
+        else:
+            peak_ltv[loan > 0] = np.inf
+        if t == summary_t:
+            out["net_worth"] = cv[t] + fund + accum - loan
+            out["loan"] = loan.copy()
+            out["n_borrows"] = n_borrows.copy()
+    out["peak_ltv"] = peak_ltv
+    return out
+
+
+def pareto_front(net_worth, risk):
+    """不被支配的候選索引 (總淨資產越高越好、風險越低越好)，依風險由低到高排列；相同結果只保留第一個"""
+    net_worth = np.asarray(net_worth, dtype=float)
+    risk = np.asarray(risk, dtype=float)
+    valid = np.flatnonzero(~np.isnan(net_worth))
+    order = valid[np.lexsort((-net_worth[valid], risk[valid]))]
+    front = []
+    best = -np.inf
+    for i in order:
+        if net_worth[i] > best:
+            front.append(i)
+            best = net_worth[i]
+    return np.array(front, dtype=np.int64)
+
+
+@timed("optimizer.search")
+def search_policies(product, start_age, annual_deposit, mode="offset", policy=None, fee_rate=FEE_RATE,
+                    income_rate=INCOME_RATE, summary_age=SUMMARY_AGE, candidates=None):
+    """
+    搜尋借款策略
+    回傳 dict：table (每個候選一列：參數與結果)、best (總淨資產最高者的索引)、
+    current (原策略的索引)、pareto (Pareto 前緣索引，風險由低到高)
+    """
+    import pandas as pd
+
+    policy = policy or product["loan_policy"]
+    candidates = candidates or candidate_grid(policy)
+    result = evaluate_policies(product, start_age, annual_deposit, candidates, mode, policy["cycle"],
+                               fee_rate, income_rate, summary_age)
+    table = pd.DataFrame({**candidates, **result})
+    current = np.flatnonzero(
+        (table["first_min"] == policy["first_min"]) & (table["topup_min"] == policy["topup_min"])
+        & (table["interval"] == max(policy["interval"], 1)) & (table["fraction"] == 1.0)
+        & (table["stop_age"] == policy["stop_age"])
+    )
+    net_worth = table["net_worth"].to_numpy()
+    best = int(np.nanargmax(net_worth)) if np.isfinite(net_worth).any() else None
+    return {
+        "table": table,
+        "best": best,
+        "current": int(current[0]) if current.size else None,
+        "pareto": pareto_front(net_worth, table["peak_ltv"].to_numpy()),
+    }
+
+
+@timed("optimizer.schedule")
+def optimal_schedule(product, start_age, annual_deposit, mode="offset", fee_rate=FEE_RATE, income_rate=INCOME_RATE,
+                     summary_age=SUMMARY_AGE, fraction=1.0, min_amount=0.0, interval=1, max_ltv=None):
+    """
+    逐年決定是否借款的最佳排程 (每次借到可借額度 × fraction)，不再借款的年度依規則無關
+    min_amount / interval: 每次借款的最低金額、兩次借款的最少間隔年數
+    max_ltv: 整個試算期間借款/解約金的上限 (None 表示不限)
+    回傳 dict：borrow_ages、amounts (各次借款金額)、net_worth、loan、peak_ltv；不在試算期間或無可行解時回傳 None
+    """
+    base = product_arrays(product, start_age, annual_deposit)
+    cv, ages, nominal_premium = base["cv"], base["age"], base["nominal_premium"]
+    T = int(summary_age - start_age - 1)
+    if T < 0 or T >= len(cv):
+        return None
+    cap = cv[:T + 1] * base["limit_rate"][:T + 1] * fraction
+    # 狀態 s+1 (s = 上次借款年度索引，-1 為未借款) 對應的借款餘額
+    level = np.concatenate(([0.0], cap))
+    n_states = T + 2
+    value = np.full(n_states, -np.inf)
+    value[0] = 0.0
+    parent = np.full(n_states, -1, dtype=np.int64)
+    since = np.arange(-1, T + 1)  # 各狀態的借款年度索引
+    growth = 1 + income_rate
+
+    for t in range(T + 1):
+        # 今年借款：由可行的前一狀態轉入狀態 t
+        amount = cap[t] - level[:t + 1]
+        ok = np.isfinite(value[:t + 1]) & (amount > 0) & (amount >= min_amount)
+        ok[1:] &= (t - since[1:t + 1]) >= interval
+        if ok.any():
+            prev = int(np.argmax(np.where(ok, value[:t + 1], -np.inf)))
+            value[t + 1] = value[prev]
+            parent[t + 1] = prev
+        # 當年的配息收益 (只與借款餘額有關)；超過風險上限的狀態不可行
+        income = level[:t + 2] * (1 - fee_rate) * income_rate
+        if mode == "offset":
+            value[:t + 2] += np.maximum(income - nominal_premium[t], 0)
+        else:
+            value[:t + 2] += income * growth ** (T - t)
+        if max_ltv is not None:
+            value[:t + 2][level[:t + 2] > max_ltv * cv[t]] = -np.inf
+
+    # 期末：總淨資產 = 解約金 + 基金 + 累積收益 - 借款 = 解約金 - 手續費率 × 借款 + 累積收益
+    final = value + cv[T] - fee_rate * level
+    later_cv = cv[T + 1:]
+    if max_ltv is not None and later_cv.size:
+        final[level > max_ltv * later_cv.min()] = -np.inf
+    state = int(np.argmax(final))
+    if not np.isfinite(final[state]):
+        return None
+    path = []
+    while state > 0:
+        path.append(state - 1)
+        state = parent[state]
+    path.reverse()
+    loans = cap[path]
+    loan = float(loans[-1]) if path else 0.0
+    # 借款後餘額固定，借款/解約金的高點出現在借款當年或其後解約金較低的年度
+    peak_ltv = 0.0
+    for i, t in enumerate(path):
+        end = path[i + 1] if i + 1 < len(path) else len(cv)
+        window = cv[t:end]
+        peak_ltv = max(peak_ltv, loans[i] / window.min() if window.min() > 0 else np.inf)
+    return {
+        "borrow_ages": ages[path],
+        "amounts": np.diff(np.concatenate(([0.0], loans))),
+        "net_worth": float(final.max()),
+        "loan": loan,
+        "peak_ltv": peak_ltv,
+    }
+
+
+def optimize(product_key, start_age, annual_deposit, mode="offset"):
+    """頁面使用 (可送到背景行程池)：策略搜尋與逐年最佳排程"""
+    product = PRODUCTS[product_key]
+    search = search_policies(product, start_age, annual_deposit, mode)
+    search["schedule"] = optimal_schedule(product, start_age, annual_deposit, mode)
+    return search
+
+
+# --- 顯示 ---
+def policy_label(row):
+    return (f"門檻 {row['first_min'] / 10000:,.0f} 萬 / 每 {row['interval']} 年 / "
+            f"借 {row['fraction']:.0%} / {row['stop_age']} 歲停借")
+
+
+def render_optimizer(container, result, format_money):
+    """最佳策略與原策略比較、Pareto 前緣圖表，以及逐年最佳排程；container 傳入 st 或任一容器"""
+    import altair as alt
+
+    table = result["table"]
+    if result["best"] is None:
+        container.info("目前年齡不在試算期間內，無法比較。")
+        return
+    best = table.iloc[result["best"]]
+    col1, col2 = container.columns(2)
+    col1.metric("最佳策略總淨資產", format_money(best["net_worth"]), help=policy_label(best))
+    if result["current"] is not None:
+        current = table.iloc[result["current"]]
+        col2.metric("目前策略總淨資產", format_money(current["net_worth"]),
+                    delta=format_money(current["net_worth"] - best["net_worth"]))
+    container.caption(f"最佳策略：{policy_label(best)}，最高借款/解約金 {best['peak_ltv']:.0%}")
+
+    front = table.iloc[result["pareto"]].assign(pareto=True)
+    chart_frame = table[np.isfinite(table["net_worth"]) & np.isfinite(table["peak_ltv"])].assign(
+        pareto=lambda df: df.index.isin(front.index))
+    chart = alt.Chart(chart_frame).mark_circle().encode(
+        x=alt.X("peak_ltv:Q", title="最高借款/解約金", axis=alt.Axis(format="%")),
+        y=alt.Y("net_worth:Q", title=f"{SUMMARY_AGE} 歲總淨資產", axis=alt.Axis(format=",.0f")),
+        color=alt.Color("pareto:N", title="Pareto 前緣", scale=alt.Scale(range=["#bfbfbf", "#cf1322"])),
+        size=alt.condition("datum.pareto", alt.value(60), alt.value(15)),
+        tooltip=[alt.Tooltip(f"{col}:Q", title=COLUMN_LABELS[col], format=fmt) for col, fmt in (
+            ("first_min", ",.0f"), ("interval", "d"), ("fraction", ".0%"), ("stop_age", "d"),
+            ("net_worth", ",.0f"), ("peak_ltv", ".1%"))],
+    )
+    container.altair_chart(chart, use_container_width=True)
+    shown = front[["first_min", "interval", "fraction", "stop_age", "n_borrows", "peak_ltv", "net_worth"]]
+    container.dataframe(shown.rename(columns=COLUMN_LABELS).style.format({
+        "首借門檻": "{:,.0f}", "借款比例": "{:.0%}", "最高借款/解約金": "{:.1%}", "總淨資產": format_money,
+    }), use_container_width=True, hide_index=True)
+
+    schedule = result["schedule"]
+    if schedule is not None:
+        ages = "、".join(str(a) for a in schedule["borrow_ages"]) or "不借款"
+        container.caption(f"逐年最佳排程 (每次借到上限、不限門檻與間隔)：於 {ages} 歲借款，"
+                          f"總淨資產 {format_money(schedule['net_worth'])}，最高借款/解約金 {schedule['peak_ltv']:.0%}")
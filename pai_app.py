@@ -1,6 +1,14 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
+from assets import inject_css, render_image
+from backend import drop_session_job, session_job, session_result, wait_in_page
+from cache import cache_stats
+from metrics import publish, render_debug_panel, startup, timer
+from export import available as export_available, strategy_export
+from display import build_style_frame, format_loan_age, format_loan_column, format_money, money_formatter, returns_html
+from strategy import cached_strategy, result_frame, returns_at, snapshot
+from montecarlo import simulate_pai, PERCENTILES
+from optimizer import optimize, render_optimizer
+from sweep import SWEEP_AGES, cached_strategy_grid, deposit_range, render_heatmap
 
 # --- 1. 頁面基礎設定 ---
 st.set_page_config(
@@ -8,6 +16,7 @@ st.set_page_config(
     page_icon="📊",
     layout="wide"
 )
+startup("imports")  # 冷啟動量測：頁面模組載入完成
 
 # --- 1.5 密碼驗證模組 ---
 def check_password():
@@ -34,93 +43,12 @@ def check_password():
 if not check_password():
     st.stop()
 
-# --- 2. CSS 樣式注入 ---
-st.markdown("""
-    <style>
-    :root {
-        --brand-color: #006d75;
-        --brand-bg: #e6fffb;
-        --text-main: #262626;
-        --pay-text: #389e0d;
-        --receive-text: #c41d7f;
-        --debt-color: #cf1322;
-        --asset-bg: #e6f7ff;
-        --asset-text: #096dd9;
-    }
-    h1, h2, h3 { color: var(--brand-color) !important; font-family: -apple-system, sans-serif; }
-    .verify-box {
-        background-color: #262626;
-        color: white;
-        padding: 24px;
-        border-radius: 10px;
-        margin-top: 24px;
-        font-family: monospace;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-    }
-    .verify-title { color: #faad14; font-weight: bold; margin-bottom: 15px; border-bottom: 1px solid #434343; padding-bottom: 10px; font-size: 16px; }
-    .verify-row { display: flex; justify-content: space-between; margin-bottom: 8px; align-items: center; }
-    .verify-total { font-size: 20px; font-weight: bold; color: #52c41a; margin-top: 15px; border-top: 1px solid #555; padding-top: 15px; display: flex; justify-content: space-between; }
-    .verify-note { font-size: 13px; color: #8c8c8c; margin-top: 15px; border-top: 1px dashed #434343; padding-top: 10px; }
-    .disclaimer-box { margin-top: 40px; padding: 15px; background-color: #f8f9fa; border: 1px solid #e9ecef; border-radius: 5px; color: #6c757d; font-size: 12px; line-height: 1.5; }
-    .disclaimer-title { font-weight: bold; margin-bottom: 5px; display: flex; align-items: center; }
-    </style>
-""", unsafe_allow_html=True)
+# --- 2. CSS 樣式注入 (assets/*.css，行程內只讀檔一次) ---
+inject_css("pai.css", "common.css")
 
 # --- 3. 核心資料與函式 ---
-# PAI 解約金數據
-PAI_BASE_DATA = [
-    0, 75568, 151906, 229013, 306899, 368190, 429482, 549969, 679495, 815609, 960677, 
-    1112453, 1273472, 1441892, 1619008, 1804891, 1999194, 2170489, 2345219, 2525180, 2708683, 
-    2796023, 2871780, 2949471, 3030006, 3111221, 3194976, 3280911, 3369035, 3459379, 3552969, 
-    3646561, 3744237, 3843884, 3945018, 4049162, 4155962, 4264024, 4375249, 4489180, 4605868, 
-    4722041, 4843080, 4964110, 5088924, 5215376, 5344037, 5473126, 5604778, 5738463, 5874202, 
-    6011861, 6151926, 6292620, 6434379, 6578609, 6723359, 6870598, 7019910, 7168168, 7319472, 
-    7472919, 7626897, 7781843, 7937799, 8096541, 8255893, 8418253, 8583316, 8749459, 8921196, 
-    9097991, 9280402, 9471102, 9674587, 9895415, 10142999, 10414816, 10696778, 10992809, 11304075, 
-    11632752, 11979388, 12355444, 12765735, 13233318, 13766422
-]
-
-# PAI 身故金數據 (年度末身故/完全失能時可領總金額) 
-PAI_DEATH_DATA = [
-    0, 170000, 340185, 510558, 681120, 858687, 6849302, 6807176, 6772672, 6745104, 6724209, 
-    6710612, 6702492, 6701107, 6706363, 6718151, 6735241, 6760773, 6791657, 6828419, 6871177, 
-    6915181, 6946482, 6977752, 7009859, 7042364, 7075362, 7109371, 7143494, 7178647, 7214892, 
-    7250015, 7288018, 7324779, 7363849, 7402672, 7442997, 7483378, 7525738, 7567382, 7611693, 
-    7655608, 7702077, 7747425, 7796685, 7845305, 7895147, 7947001, 8000527, 8055223, 8111151, 
-    8168164, 8226834, 8286878, 8350332, 8414295, 8481377, 8549089, 8618573, 8691615, 8766065, 
-    8842680, 8923339, 9005279, 9090404, 9178873, 9270456, 9365880, 9463047, 9566182, 9672209, 
-    9782518, 9897691, 10018324, 10142410, 10271878, 10408931, 10597577, 10866775, 11149518, 
-    11446957, 11761249, 12095401, 12455963, 12847598, 13280185, 13766422
-]
-
-BASE_PREMIUM = 120003
-
-def get_pai_cv(year, annual_deposit):
-    if year <= 0: return 0
-    idx = year if year < len(PAI_BASE_DATA) else len(PAI_BASE_DATA) - 1
-    base = PAI_BASE_DATA[idx]
-    return base * (annual_deposit / BASE_PREMIUM)
-
-def get_pai_death(year, annual_deposit):
-    if year <= 0: return 0
-    idx = year if year < len(PAI_DEATH_DATA) else len(PAI_DEATH_DATA) - 1
-    base = PAI_DEATH_DATA[idx]
-    return base * (annual_deposit / BASE_PREMIUM)
-
-def get_loan_limit_rate(year):
-    if year >= 12: return 0.90
-    if year >= 10: return 0.85
-    if year >= 8: return 0.80
-    if year >= 6: return 0.75
-    return 0.70
-
-def format_money(val, is_receive_column=False):
-    if val == 0: return "-"
-    abs_val = abs(val)
-    money_str = f"${abs_val:,.0f}"
-    if is_receive_column and val < 0: return f"領 {money_str}"
-    elif val < 0: return f"-{money_str}"
-    return money_str
+# PAI 解約金/身故金數據、借款成數與借款規則定義於 products，逐年試算由 strategy 引擎負責
+# 金額格式 (format_money) 定義於 display，只在顯示時套用
 
 # --- 4. 側邊欄 ---
 with st.sidebar:
@@ -130,35 +58,39 @@ with st.sidebar:
     st.divider()
     mode = st.radio("🔄 選擇策略模式", ["🛡️ 以息養險 (折抵保費)", "🚀 階梯槓桿 (複利滾存)"])
     st.info("💡 說明：\n\n**以息養險**：配息優先折抵保費，多餘領現。\n\n**階梯槓桿**：配息全數再投入，追求資產最大化。\n\n**⚡ 借款規則**：\n1. 可貸額度需滿 30 萬。\n2. 之後每滿 3 年且額度足夠才借。")
+    st.divider()
+    run_mc = st.toggle("🎲 蒙地卡羅模擬", value=False)
+    if run_mc:
+        mc_paths = st.select_slider("模擬路徑數", options=[10000, 20000, 50000, 100000], value=10000)
+        mc_mean = st.number_input("平均年報酬 (%)", value=7.0, step=0.5) / 100
+        mc_vol = st.number_input("年化波動度 (%)", value=15.0, step=1.0) / 100
+        mc_loan_rate = st.number_input("保單借款利率 (%)", value=0.0, step=0.25) / 100
+        mc_history_csv = st.text_input("歷史報酬 CSV 路徑 (選填，改用歷史抽樣)", value="")
+    st.divider()
+    run_optimizer = st.toggle("🧭 借款策略最佳化", value=False)
+    st.divider()
+    run_sweep = st.toggle("🗺️ 參數掃描 (年齡 × 月存熱力圖)", value=False)
+    if run_sweep:
+        sweep_low, sweep_high = st.slider("月存金額範圍", 1000, 200000, (2000, 100000), step=1000)
+        sweep_step = st.number_input("月存級距", value=2000, min_value=500, step=500)
+        # 保障維持至 (歲) 只適用萬能壽險 (927UNN)：PAI 的借款不會超過解約金，保單不會因借款停效
+        sweep_field = st.radio("熱力圖數值", ["net_worth", "death_benefit", "irr", "roi"],
+                               format_func={"net_worth": "65 歲總淨資產", "death_benefit": "65 歲身故金", "irr": "65 歲 IRR",
+                                            "roi": "65 歲累積報酬率"}.get)
 
 # --- 5. 主畫面 ---
 st.title("📊 PAI 策略全能計算機")
 
-IMG_OFFSET = "https://i.postimg.cc/9Mwkq4c1/Gemini-Generated-Image-57o51457o51457o5.png"
-IMG_COMPOUND = "https://i.postimg.cc/SxKDMXr6/Gemini-Generated-Image-p41a4fp41a4fp41a.png"
-
+# 圖片為 assets/ 內打包的檔案 (建置時下載，見 assets.py)
 if "以息養險" in mode:
-    st.image(IMG_OFFSET, use_container_width=True)
+    render_image(st, "pai_offset")
     current_mode = "offset"
 else:
-    st.image(IMG_COMPOUND, use_container_width=True)
+    render_image(st, "pai_compound")
     current_mode = "compound"
 
-# --- 6. 計算邏輯 ---
+# --- 6. 計算邏輯 (共用策略引擎) ---
 annual_deposit = monthly_deposit * 12
-deposit_years = 20
-fee_rate = 0.05
-MIN_LOAN_THRESHOLD = 300000  # 最低借款門檻
-LOAN_INTERVAL_YEARS = 3      # 借款間隔年數
-
-data_rows = []
-raw_data_rows = [] 
-current_loan = 0
-current_fund = 0
-accum_cash_out = 0  
-accum_net_wealth = 0 
-accum_real_cost = 0 
-last_borrow_year = 0 
 
 is_monthly_pay = False
 if current_mode == "offset":
@@ -166,177 +98,173 @@ if current_mode == "offset":
     with col_toggle:
         is_monthly_pay = st.toggle("切換為「月繳」顯示", value=False)
 
-# 迴圈計算
-for age in range(start_age + 1, 86):
-    policy_year = age - start_age
-    cv = get_pai_cv(policy_year, annual_deposit)
-    limit_rate = get_loan_limit_rate(policy_year)
-     
-    # --- 新版借款邏輯 ---
-    loan_tag = ""
-    is_borrowing_year = False # 標記今年是否有借款
-
-    # 只有在 65 歲以前才執行借款策略
-    if age <= 65:
-        max_loan = cv * limit_rate
-        new_borrow = max_loan - current_loan
-        
-        # 條件 1: 可借金額大於 30 萬
-        is_amount_ok = new_borrow >= MIN_LOAN_THRESHOLD
-        
-        # 條件 2: 從未借過款 OR 距離上次借款已滿 3 年
-        is_time_ok = (last_borrow_year == 0) or ((policy_year - last_borrow_year) >= LOAN_INTERVAL_YEARS)
-        
-        if is_amount_ok and is_time_ok:
-            current_loan += new_borrow
-            current_fund += new_borrow * (1 - fee_rate)
-            last_borrow_year = policy_year 
-            loan_tag = "⚡"
-            is_borrowing_year = True
-
-    net_income = current_fund * 0.07
-    nominal_premium = annual_deposit if policy_year <= deposit_years else 0
-    total_net_asset = 0
-
-    # 計算身故金 (保障 + 投資 - 負債)
-    death_benefit_base = get_pai_death(policy_year, annual_deposit)
+# 結果依 (商品, 年齡, 年繳金額, 模式) 快取，切換月繳顯示不重算
+res = cached_strategy("PAI", start_age, annual_deposit, current_mode)
+verify_snapshot = snapshot(res, 65)
+verify_returns = returns_at(res, 65)
 
-    row_display = {}
-    row_raw = {} 
+cache_total = cache_stats()["total"]
+st.sidebar.caption(f"🧮 試算快取：命中 {cache_total['hits']} 次 / 未命中 {cache_total['misses']} 次")
 
-    # 處理借款顯示字串：如果有借款，加上成數
-    loan_display_str = format_money(-current_loan)
-    if is_borrowing_year:
-        loan_display_str += f" ({int(limit_rate*100)}%)"
+# --- 6.5 顯示用數值表 (維持數值型別，字串格式留到 Styler) ---
+table = result_frame(res)
+table["loan"] = 0 - table["loan"]  # 借款以負數顯示
 
-    row_display["保單年度"] = policy_year
-
-    if current_mode == "offset":
-        actual_pay_yearly = nominal_premium - net_income
-        if actual_pay_yearly > 0: accum_real_cost += actual_pay_yearly
-        else: accum_cash_out += abs(actual_pay_yearly)
-
-        total_net_asset = cv + current_fund + accum_cash_out - current_loan
-        display_val = actual_pay_yearly / 12 if is_monthly_pay else actual_pay_yearly
-        
-        # 以息養險模式下的總身故金：保單身故 + 基金本金 - 借款
-        total_death_benefit = death_benefit_base + current_fund - current_loan
-        
-        row_display["年齡"] = f"{age} {loan_tag}"
-        row_display["①應繳年保費"] = format_money(nominal_premium)
-        row_display["②配息抵扣"] = format_money(net_income)
-        row_display["③實繳金額"] = format_money(display_val, is_receive_column=True)
-        row_display["④累積實繳"] = format_money(accum_real_cost)
-        row_display["⑤PAI解約金"] = format_money(cv)
-        row_display["⑥保單借款"] = loan_display_str 
-        row_display["⑦基金本金"] = format_money(current_fund)
-        row_display["⑧總淨資產"] = format_money(total_net_asset)
-        row_display["⑨身故金"] = format_money(total_death_benefit) # 新增
-
-        row_raw = {"loan_year": loan_tag == "⚡", "real_pay_val": display_val, "net_asset": total_net_asset}
-
-    else:
-        actual_deposit = nominal_premium
-        acc_deposit = annual_deposit * policy_year if policy_year <= deposit_years else annual_deposit * deposit_years
-        accum_net_wealth = (accum_net_wealth * 1.07) + net_income
-        total_net_asset = cv + current_fund + accum_net_wealth - current_loan
-
-        # 階梯槓桿模式下的總身故金：保單身故 + 基金本金 + 累積配息 - 借款
-        total_death_benefit = death_benefit_base + current_fund + accum_net_wealth - current_loan
-        
-        row_display["年齡"] = f"{age} {loan_tag}"
-        row_display["①當年存入"] = format_money(actual_deposit)
-        row_display["②累積本金"] = format_money(acc_deposit)
-        row_display["③PAI解約金"] = format_money(cv)
-        row_display["④保單借款"] = loan_display_str 
-        row_display["⑤基金本金"] = format_money(current_fund)
-        row_display["⑥年度淨配息"] = format_money(net_income)
-        row_display["⑦累積配息(複利)"] = format_money(accum_net_wealth)
-        row_display["⑧總淨資產"] = format_money(total_net_asset)
-        row_display["⑨身故金"] = format_money(total_death_benefit) # 新增
-
-        row_raw = {"loan_year": loan_tag == "⚡", "net_asset": total_net_asset}
-
-    data_rows.append(row_display)
-    raw_data_rows.append(row_raw)
-    
-    if age == 65:
-        verify_snapshot = {
-            "cv": cv, "loan": current_loan, "fund": current_fund,
-            "cash_out": accum_cash_out, "accum_wealth": accum_net_wealth,
-            "total": total_net_asset
-        }
-
-# --- 7. 表格樣式化 ---
-df = pd.DataFrame(data_rows)
+if current_mode == "offset":
+    display_columns = {
+        "policy_year": "保單年度", "age": "年齡",
+        "nominal_premium": "①應繳年保費", "net_income": "②配息抵扣", "actual_pay": "③實繳金額",
+        "accum_real_cost": "④累積實繳", "cv": "⑤PAI解約金", "loan": "⑥保單借款", "fund": "⑦基金本金",
+        "net_worth": "⑧總淨資產", "death_benefit": "⑨身故金",  # 身故金 = 保單身故 + 基金本金 - 借款
+    }
+    loan_column = "⑥保單借款"
+else:
+    display_columns = {
+        "policy_year": "保單年度", "age": "年齡",
+        "nominal_premium": "①當年存入", "accum_deposit": "②累積本金", "cv": "③PAI解約金",
+        "loan": "④保單借款", "fund": "⑤基金本金", "net_income": "⑥年度淨配息",
+        "accum_net_wealth": "⑦累積配息(複利)", "net_worth": "⑧總淨資產",
+        "death_benefit": "⑨身故金",  # 身故金 = 保單身故 + 基金本金 + 累積配息 - 借款
+    }
+    loan_column = "④保單借款"
+df = table[list(display_columns)].rename(columns=display_columns)
 
-def style_dataframe(df_input, raw_data):
-    df_style = pd.DataFrame('', index=df_input.index, columns=df_input.columns)
-    for i, raw in enumerate(raw_data):
-        if raw["loan_year"]:
-            df_style.iloc[i, :] = 'background-color: #fffbe6;'
-        
+# --- 7. 表格樣式化 (以整欄遮罩一次產生樣式，金額於顯示時格式化) ---
+def style_dataframe(df_input, res):
+    column_styles = {
         # 總淨資產樣式
-        df_style.iloc[i, df_input.columns.get_loc("⑧總淨資產")] += 'background-color: #e6f7ff; color: #096dd9; font-weight: bold;'
-        
+        "⑧總淨資產": [(True, 'background-color: #e6f7ff; color: #096dd9; font-weight: bold;')],
         # 身故金樣式：暖金背景，深橘金文字
-        df_style.iloc[i, df_input.columns.get_loc("⑨身故金")] += 'background-color: #fff7e6; color: #d46b08; font-weight: bold;'
-        
-        if current_mode == "offset":
-            val = raw["real_pay_val"]
-            if val < 0: df_style.iloc[i, df_input.columns.get_loc("③實繳金額")] += 'color: #c41d7f; font-weight: bold;'
-            elif val > 0: df_style.iloc[i, df_input.columns.get_loc("③實繳金額")] += 'color: #389e0d;'
-            
-            df_style.iloc[i, df_input.columns.get_loc("②配息抵扣")] += 'color: #c41d7f;'
-            df_style.iloc[i, df_input.columns.get_loc("⑥保單借款")] += 'color: #cf1322;'
-        else:
-            df_style.iloc[i, df_input.columns.get_loc("⑥年度淨配息")] += 'color: #c41d7f;'
-            df_style.iloc[i, df_input.columns.get_loc("⑦累積配息(複利)")] += 'color: #722ed1;'
-            
-    return df_style
-
-styler = df.style.apply(lambda x: style_dataframe(df, raw_data_rows), axis=None)
+        "⑨身故金": [(True, 'background-color: #fff7e6; color: #d46b08; font-weight: bold;')],
+    }
+    if current_mode == "offset":
+        real_pay = res["actual_pay"]
+        column_styles["③實繳金額"] = [(real_pay < 0, 'color: #c41d7f; font-weight: bold;'), (real_pay > 0, 'color: #389e0d;')]
+        column_styles["②配息抵扣"] = [(True, 'color: #c41d7f;')]
+        column_styles["⑥保單借款"] = [(True, 'color: #cf1322;')]
+    else:
+        column_styles["⑥年度淨配息"] = [(True, 'color: #c41d7f;')]
+        column_styles["⑦累積配息(複利)"] = [(True, 'color: #722ed1;')]
+    return build_style_frame(df_input, row_mask=res["borrowed"], column_styles=column_styles)
 
-st.dataframe(styler, use_container_width=True, height=600, hide_index=True)
+def format_dataframe(styler):
+    formats = {col: format_money for col in df.columns if col not in ("保單年度", "年齡")}
+    if current_mode == "offset":
+        # 月繳顯示只改變顯示值，表格內仍為年繳金額
+        formats["③實繳金額"] = money_formatter(12 if is_monthly_pay else 1, is_receive_column=True)
+    styler = styler.format(formats)
+    # 借款年：借款欄加上可借成數、年齡加上 ⚡
+    styler = format_loan_column(styler, loan_column, res["limit_rate"], rows=res["borrowed"])
+    return format_loan_age(styler, "年齡", res["borrowed"])
+
+with timer("page.style"):
+    df_style = style_dataframe(df, res)
+    styler = format_dataframe(df.style.apply(lambda _: df_style, axis=None))
+
+with timer("page.render"):
+    st.dataframe(styler, use_container_width=True, height=600, hide_index=True)
+
+# 匯出原始數值 (Parquet，含商品、費率表版本與試算假設)；點擊時才產生檔案
+if export_available():
+    st.download_button(
+        "📦 下載試算結果 (Parquet)", lambda: strategy_export("PAI", res, start_age, annual_deposit),
+        file_name=f"PAI_{start_age}_{current_mode}.parquet", mime="application/vnd.apache.parquet", on_click="ignore",
+    )
 
 # --- 8. 驗證區 ---
-v = verify_snapshot
-v_cv = f"${v['cv']:,.0f}"
-v_fund = f"${v['fund']:,.0f}"
-v_loan = f"-${v['loan']:,.0f}"
-v_total = f"${v['total']:,.0f}"
+# 試算期間未涵蓋 65 歲 (目前年齡 65 歲以上) 時不顯示
+if verify_snapshot is not None:
+    v = verify_snapshot
+    v_cv = f"${v['cv']:,.0f}"
+    v_fund = f"${v['fund']:,.0f}"
+    v_loan = f"-${v['loan']:,.0f}"
+    v_total = f"${v['total']:,.0f}"
 
-if current_mode == "offset":
-    v_cash = f"${v['cash_out']:,.0f}"
-    html_content = f"""
-    <div class="verify-box">
-        <div class="verify-title">🔍 65 歲資產結算驗證</div>
-        <div class="verify-row"><span>[+] PAI 保單現金價值</span> <span>{v_cv}</span></div>
-        <div class="verify-row"><span>[+] 基金本金</span> <span>{v_fund}</span></div>
-        <div class="verify-row" style="color: #c41d7f;"><span>[+] 累積已領回現金 (Cash Out)</span> <span>{v_cash}</span></div>
-        <div class="verify-row" style="color: #cf1322;"><span>[-] 扣除保單借款</span> <span>{v_loan}</span></div>
-        <div class="verify-total">
-            <span>[=] 總淨資產 (Net Worth)</span> <span>{v_total}</span>
+    if current_mode == "offset":
+        v_cash = f"${v['cash_out']:,.0f}"
+        html_content = f"""
+        <div class="verify-box">
+            <div class="verify-title">🔍 65 歲資產結算驗證</div>
+            <div class="verify-row"><span>[+] PAI 保單現金價值</span> <span>{v_cv}</span></div>
+            <div class="verify-row"><span>[+] 基金本金</span> <span>{v_fund}</span></div>
+            <div class="verify-row" style="color: #c41d7f;"><span>[+] 累積已領回現金 (Cash Out)</span> <span>{v_cash}</span></div>
+            <div class="verify-row" style="color: #cf1322;"><span>[-] 扣除保單借款</span> <span>{v_loan}</span></div>
+            <div class="verify-total">
+                <span>[=] 總淨資產 (Net Worth)</span> <span>{v_total}</span>
+            </div>{returns_html(verify_returns)}
+            <div class="verify-note">💡 說明：此模式配息優先抵扣保費，多餘的現金領回放口袋，適合重視現金流者。</div>
         </div>
-        <div class="verify-note">💡 說明：此模式配息優先抵扣保費，多餘的現金領回放口袋，適合重視現金流者。</div>
-    </div>
-    """
-else:
-    v_accum = f"${v['accum_wealth']:,.0f}"
-    html_content = f"""
-    <div class="verify-box">
-        <div class="verify-title">🔍 65 歲資產結算驗證</div>
-        <div class="verify-row"><span>[+] PAI 保單現金價值</span> <span>{v_cv}</span></div>
-        <div class="verify-row"><span>[+] 基金本金</span> <span>{v_fund}</span></div>
-        <div class="verify-row" style="color: #722ed1;"><span>[+] 累積配息滾存 (複利)</span> <span>{v_accum}</span></div>
-        <div class="verify-row" style="color: #cf1322;"><span>[-] 扣除保單借款</span> <span>{v_loan}</span></div>
-        <div class="verify-total">
-            <span>[=] 總淨資產 (Net Worth)</span> <span>{v_total}</span>
+        """
+    else:
+        v_accum = f"${v['accum_wealth']:,.0f}"
+        html_content = f"""
+        <div class="verify-box">
+            <div class="verify-title">🔍 65 歲資產結算驗證</div>
+            <div class="verify-row"><span>[+] PAI 保單現金價值</span> <span>{v_cv}</span></div>
+            <div class="verify-row"><span>[+] 基金本金</span> <span>{v_fund}</span></div>
+            <div class="verify-row" style="color: #722ed1;"><span>[+] 累積配息滾存 (複利)</span> <span>{v_accum}</span></div>
+            <div class="verify-row" style="color: #cf1322;"><span>[-] 扣除保單借款</span> <span>{v_loan}</span></div>
+            <div class="verify-total">
+                <span>[=] 總淨資產 (Net Worth)</span> <span>{v_total}</span>
+            </div>{returns_html(verify_returns)}
+            <div class="verify-note">💡 說明：此模式假設配息全部再投入 (7%複利)，適合追求資產最大化者。</div>
         </div>
-        <div class="verify-note">💡 說明：此模式假設配息全部再投入 (7%複利)，適合追求資產最大化者。</div>
-    </div>
-    """
-st.markdown(html_content, unsafe_allow_html=True)
+        """
+    st.markdown(html_content, unsafe_allow_html=True)
+
+# --- 8.5 蒙地卡羅模擬 (送到背景行程池，頁面只輪詢進度) ---
+def render_monte_carlo(mc):
+    import pandas as pd
+
+    mc_summary = mc["summary"]
+    band_labels = [f"P{p}" for p in PERCENTILES]
+    if (mc["ages"] == 65).any():
+        mc_col1, mc_col2, mc_col3 = st.columns(3)
+        mc_col1.metric("總淨資產中位數", format_money(mc_summary["net_worth"][50]))
+        mc_col2.metric("身故金中位數", format_money(mc_summary["death_benefit"][50]))
+        mc_col3.metric("淨資產低於累積實繳機率", f"{mc_summary['p_loss'] * 100:.1f}%")
+        st.dataframe(pd.DataFrame(
+            {"總淨資產": [format_money(mc_summary["net_worth"][p]) for p in PERCENTILES],
+             "身故金": [format_money(mc_summary["death_benefit"][p]) for p in PERCENTILES]},
+            index=band_labels,
+        ), use_container_width=True)
+    else:
+        st.info("試算期間未涵蓋 65 歲，僅顯示逐年分布")
+    st.line_chart(pd.DataFrame(mc["net_worth"].T, index=mc["ages"], columns=band_labels))
+
+
+if run_mc:
+    mc_job = session_job(
+        st.session_state, "mc", simulate_pai, start_age, monthly_deposit, current_mode, with_progress=True,
+        n_paths=mc_paths, returns="bootstrap" if mc_history_csv else "lognormal", mean=mc_mean, vol=mc_vol,
+        history_csv=mc_history_csv or None, loan_rate=mc_loan_rate,
+    )
+    st.markdown("### 🎲 蒙地卡羅模擬 (65 歲分布)")
+    if wait_in_page(mc_job, "模擬中…"):
+        mc = session_result(st.session_state, "mc", mc_job, "蒙地卡羅模擬")
+        if mc is not None:
+            render_monte_carlo(mc)
+else:
+    drop_session_job(st.session_state, "mc")
+
+# --- 8.55 借款策略最佳化 (門檻 × 間隔 × 借款比例 × 停借年齡，以及逐年最佳排程) ---
+if run_optimizer:
+    opt_job = session_job(st.session_state, "optimizer", optimize, "PAI", start_age, monthly_deposit * 12, current_mode)
+    st.markdown("### 🧭 借款策略最佳化 (65 歲總淨資產 vs 借款風險)")
+    if wait_in_page(opt_job, "搜尋中…"):
+        opt_result = session_result(st.session_state, "optimizer", opt_job, "借款策略最佳化")
+        if opt_result is not None:
+            render_optimizer(st, opt_result, format_money)
+else:
+    drop_session_job(st.session_state, "optimizer")
+
+# --- 8.6 參數掃描 (0~80 歲 × 各月存金額整張網格一次試算) ---
+if run_sweep:
+    sweep_deposits = deposit_range(sweep_low, sweep_high, sweep_step)
+    with timer("page.sweep"):
+        grid = cached_strategy_grid("PAI", SWEEP_AGES, sweep_deposits, current_mode)
+    st.markdown(f"### 🗺️ 參數掃描 ({len(SWEEP_AGES)} 個年齡 × {len(sweep_deposits)} 檔月存)")
+    render_heatmap(st, grid, sweep_field, deposit_divisor=12, deposit_label="月存金額")
 
 # --- 9. 免責聲明 ---
 st.markdown("""
@@ -349,3 +277,8 @@ st.markdown("""
     4. 使用者應自行評估風險，本工具開發者不對任何引用本工具所做出之投資決策負責。
 </div>
 """, unsafe_allow_html=True)
+
+# --- 效能監測 (PAI_METRICS=1 時顯示於側邊欄) ---
+startup("first_render")
+render_debug_panel(st.sidebar)
+publish()
@@ -0,0 +1,188 @@
+"""
+商品登錄表：商品參數與費率表由 rates/ 下的資料檔描述，新增商品只需加資料檔，不必複製頁面
+rates/products.json: 各商品的參數 (繳費年期、基準保費、借款成數階梯、借款策略名稱、試算期間) 與費率表檔名
+rates/*.csv: 費率表，每列為 sex, issue_age, 第0年起的數值 ("*" 代表不分性別/投保年齡)
+
+費率表在第一次使用時才載入為 NumPy 陣列，並以 (商品, 性別, 投保年齡) 建索引；
+已載入的表依最近使用順序保留，總大小超過上限時淘汰最久未用的表
+"""
+import csv
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+RATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rates")
+MANIFEST_FILE = "products.json"
+MAX_TABLE_BYTES = 64 * 1024 * 1024  # 已載入費率表的總大小上限
+ANY = "*"
+
+# --- 借款策略 ---
+# stop_age: 超過此年齡不再借款
+# cycle: 只在保單年度為其倍數時借款 (None 表示每年都可檢查)
+# interval: 首次借款後，距上次借款需滿幾年
+# first_min / topup_min: 首借 / 增貸的最低金額 (均需 ≥ 0；0 表示不設門檻，借款金額仍需大於 0)
+THRESHOLD_LOAN_POLICY = {"stop_age": 65, "cycle": None, "interval": 3, "first_min": 300000, "topup_min": 300000}
+IAT2_LOAN_POLICY = {"stop_age": 75, "cycle": None, "interval": 3, "first_min": 300000, "topup_min": 0}
+CYCLE_LOAN_POLICY = {"stop_age": 65, "cycle": 3, "interval": 0, "first_min": 0, "topup_min": 0}
+
+LOAN_POLICIES = {"THRESHOLD": THRESHOLD_LOAN_POLICY, "IAT2": IAT2_LOAN_POLICY, "CYCLE": CYCLE_LOAN_POLICY}
+
+
+def _key_part(value):
+    return ANY if value in (None, "", ANY) else int(value)
+
+
+class RateTable:
+    """
+    一張費率表：values 為 (列, 年度) 的 float64 密集陣列 (不足補 NaN)，lengths 為各列有效長度
+    index 以 (性別, 投保年齡) 對應列號
+    """
+    def __init__(self, keys, rows):
+        width = max((len(r) for r in rows), default=0)
+        self.values = np.full((len(rows), width), np.nan)
+        self.lengths = np.array([len(r) for r in rows], dtype=np.int32)
+        for i, r in enumerate(rows):
+            self.values[i, :len(r)] = r
+        self.values.setflags(write=False)
+        self.index = {}
+        for i, key in enumerate(keys):
+            self.index.setdefault(key, i)  # 重複的鍵保留第一筆
+
+    @classmethod
+    def from_csv(cls, path):
+        keys, rows = [], []
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # 欄位標題
+            for row in reader:
+                if not row:
+                    continue
+                keys.append((_key_part(row[0]), _key_part(row[1])))
+                rows.append([float(v) for v in row[2:] if v != ""])
+        return cls(keys, rows)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.lengths.nbytes
+
+    def row(self, sex=None, issue_age=None):
+        """查 (性別, 投保年齡) 的數值；找不到完全相符時依序退回 (性別, *)、(*, 投保年齡)、(*, *)，都沒有則為 None"""
+        sex, issue_age = _key_part(sex), _key_part(issue_age)
+        for key in ((sex, issue_age), (sex, ANY), (ANY, issue_age), (ANY, ANY)):
+            i = self.index.get(key)
+            if i is not None:
+                return self.values[i, :self.lengths[i]]
+        return None
+
+
+class ProductRegistry:
+    """
+    商品登錄表 (行程內共用)
+    PRODUCTS[key] 回傳試算引擎使用的商品 dict；PRODUCTS.table(key, name) 取得整張費率表
+    """
+    def __init__(self, rates_dir=RATES_DIR, max_bytes=MAX_TABLE_BYTES):
+        self.rates_dir = rates_dir
+        self.max_bytes = max_bytes
+        self._manifest = None
+        self._tables = OrderedDict()  # (商品, 表名) -> RateTable
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self._versions = {}
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with open(os.path.join(self.rates_dir, MANIFEST_FILE), encoding="utf-8") as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    def __contains__(self, key):
+        return key in self.manifest
+
+    def __iter__(self):
+        return iter(self.manifest)
+
+    def names(self, kind=None):
+        return [key for key, spec in self.manifest.items() if kind is None or spec.get("kind") == kind]
+
+    def table(self, key, name):
+        """載入 (或從已載入中取出) 商品的費率表；商品沒有這張表時回傳 None"""
+        filename = self.manifest[key].get("tables", {}).get(name)
+        if filename is None:
+            return None
+        with self._lock:
+            table = self._tables.get((key, name))
+            if table is not None:
+                self._tables.move_to_end((key, name))
+                return table
+        table = RateTable.from_csv(os.path.join(self.rates_dir, filename))
+        with self._lock:
+            if (key, name) not in self._tables:
+                self._tables[(key, name)] = table
+                self._bytes += table.nbytes
+                self.loads += 1
+            # 超過上限時淘汰最久未用的表 (至少保留剛載入的這張)
+            while self._bytes > self.max_bytes and len(self._tables) > 1:
+                _, old = self._tables.popitem(last=False)
+                self._bytes -= old.nbytes
+                self.evictions += 1
+        return table
+
+    def lookup(self, key, name, sex=None, issue_age=None):
+        table = self.table(key, name)
+        return None if table is None else table.row(sex, issue_age)
+
+    def product(self, key, sex=None, issue_age=None):
+        """
+        試算引擎使用的商品 dict (策略商品: cv_table、death_table、loan_ladder、loan_policy 等)
+        費率表依 (性別, 投保年齡) 取出；商品沒有的表為 None
+        """
+        spec = dict(self.manifest[key])
+        for name in spec.pop("tables", {}):
+            spec[f"{name}_table"] = self.lookup(key, name, sex, issue_age)
+        spec.setdefault("death_table", None)
+        if "loan_ladder" in spec:
+            spec["loan_ladder"] = tuple((int(year), rate) for year, rate in spec["loan_ladder"])
+        if "loan_policy" in spec:
+            spec["loan_policy"] = LOAN_POLICIES[spec["loan_policy"]]
+        return spec
+
+    def version(self, key):
+        """費率表版本：商品參數與各費率檔內容的雜湊 (前 12 碼)，資料檔改變即不同；匯出與結果快取以此辨識"""
+        version = self._versions.get(key)
+        if version is None:
+            spec = self.manifest[key]
+            h = hashlib.sha256(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+            if "loan_policy" in spec:  # 借款策略定義在程式內，一併納入
+                h.update(json.dumps(LOAN_POLICIES[spec["loan_policy"]], sort_keys=True).encode("utf-8"))
+            for name, filename in sorted(spec.get("tables", {}).items()):
+                h.update(name.encode("utf-8"))
+                with open(os.path.join(self.rates_dir, filename), "rb") as f:
+                    h.update(f.read())
+            version = self._versions[key] = h.hexdigest()[:12]
+        return version
+
+    def __getitem__(self, key):
+        if key not in self.manifest:
+            raise KeyError(key)
+        return self.product(key)
+
+    def stats(self):
+        with self._lock:
+            return {"loaded": len(self._tables), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "loads": self.loads, "evictions": self.evictions}
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self._bytes = 0
+            self._versions.clear()
+
+
+PRODUCTS = ProductRegistry()
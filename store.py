@@ -0,0 +1,302 @@
+"""
+試算結果持久化：記憶體快取 (cache.memoize) 未命中時，再查本機磁碟上的 SQLite 結果庫
+同一台機器上的所有 Streamlit 行程 (負載平衡後的多個 worker)、背景工作行程與重新啟動後都共用
+- 鍵：命名空間 + 費率表版本 + 正規化後輸入的 sha256；版本含引擎程式碼的雜湊，費率檔或程式改變即自然失效，
+  舊版本的資料在該命名空間第一次使用時刪除
+- 值：結果 dict 的陣列原始資料加 JSON 標頭 (不使用 pickle)，讀出的陣列為唯讀
+- WAL 模式：多個行程可同時讀取，寫入互不阻擋讀取；總大小超過上限時刪除最久未使用的結果
+- 結果庫無法開啟或讀寫失敗時視為未命中，不影響試算
+
+結果庫路徑由環境變數 PAI_STORE 設定 (預設 ~/.cache/pai_results.sqlite3；設為空字串或 off 則停用)，
+容量上限由 PAI_STORE_MB 設定 (預設 256)
+
+    python store.py             # 預先試算常用報價 (標準年齡 × 整數存入金額)
+    python store.py --stats     # 結果庫統計
+    python store.py --clear     # 清空結果庫
+"""
+import functools
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from cache import CACHES, freeze
+from metrics import count, timed
+
+STORE_PATH = os.environ.get("PAI_STORE", os.path.join(os.path.expanduser("~"), ".cache", "pai_results.sqlite3"))
+MAX_BYTES = int(float(os.environ.get("PAI_STORE_MB", 256)) * (1 << 20))
+EVICT_TO = 0.9              # 超過上限時刪到上限的 90%，避免每次寫入都觸發
+EVICT_CHECK = 32            # 每個行程每寫入幾筆檢查一次總大小 (加總需掃描整張表)
+TOUCH_INTERVAL = 60         # 秒；讀取時最後使用時間的更新間隔，多數讀取不需寫入
+BUSY_TIMEOUT = 5            # 秒；其他行程寫入中時的等待上限
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+CREATE INDEX IF NOT EXISTS results_namespace ON results (namespace, version);
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(*modules):
+    """引擎模組原始碼的雜湊 (前 12 碼)，與費率表版本一起組成結果版本"""
+    h = hashlib.sha256()
+    for name in modules:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{name}.py"), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+def scenario_key(namespace, version, args):
+    """穩定的結果鍵：不同行程、不同次啟動都相同 (不使用 Python 內建 hash)"""
+    payload = json.dumps([namespace, version, list(args)], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def encode(result):
+    """
+    結果 dict -> 位元組：4 位元組標頭長度 + JSON 標頭 (純量直接存值，陣列存 dtype/shape/位移) + 各陣列原始資料
+    不使用 npz/pickle：讀取時不需解壓縮，陣列直接以 np.frombuffer 取得零複製 view
+    """
+    header, chunks, offset = {}, [], 0
+    for name, value in result.items():
+        if isinstance(value, np.ndarray):
+            data = np.ascontiguousarray(value).tobytes()
+            header[name] = {"dtype": value.dtype.str, "shape": list(value.shape), "offset": offset}
+            chunks.append(data)
+            offset += len(data)
+        else:
+            header[name] = {"value": value.item() if isinstance(value, np.generic) else value}
+    head = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"".join([len(head).to_bytes(4, "little"), head, *chunks])
+
+
+def decode(blob):
+    """encode 的反向；陣列為唯讀 view"""
+    size = int.from_bytes(blob[:4], "little")
+    header = json.loads(blob[4:4 + size])
+    body = memoryview(blob)[4 + size:]
+    result = {}
+    for name, spec in header.items():
+        if "value" in spec:
+            result[name] = spec["value"]
+            continue
+        n = math.prod(spec["shape"])
+        result[name] = np.frombuffer(body, dtype=spec["dtype"], count=n, offset=spec["offset"]).reshape(spec["shape"])
+    return result
+
+
+class ResultStore:
+    def __init__(self, path=STORE_PATH, max_bytes=MAX_BYTES):
+        self.path = path if path and path.lower() != "off" else None
+        self.max_bytes = max_bytes
+        self._local = threading.local()    # sqlite3 連線不跨執行緒共用，每個執行緒各開一條
+        self._lock = threading.Lock()
+        self._pruned = set()                # 本行程已清除舊版本的 (命名空間, 版本)
+        self._broken = False
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _failed(self):
+        """讀寫失敗：記錄後視為未命中；無法開啟時本行程停用 (不必每次重試)"""
+        with self._lock:
+            self.errors += 1
+            if getattr(self._local, "conn", None) is None:
+                self._broken = True
+        count("store.errors")
+
+    @property
+    def enabled(self):
+        return self.path is not None and not self._broken
+
+    def _prune(self, conn, namespace, version):
+        """刪除同命名空間的舊版本結果 (每個行程每個版本只做一次)"""
+        if (namespace, version) in self._pruned:
+            return
+        deleted = conn.execute("DELETE FROM results WHERE namespace = ? AND version != ?", (namespace, version)).rowcount
+        self._pruned.add((namespace, version))
+        if deleted:
+            count("store.invalidated", deleted)
+
+    def get(self, namespace, version, args):
+        """回傳 (是否命中, 結果)"""
+        if not self.enabled:
+            return False, None
+        key = scenario_key(namespace, version, args)
+        try:
+            conn = self._connect()
+            self._prune(conn, namespace, version)
+            row = conn.execute("SELECT value, accessed FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                now = time.time()
+                if now - row[1] > TOUCH_INTERVAL:
+                    conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                value = decode(row[0])
+        except (sqlite3.Error, OSError, ValueError):
+            self._failed()
+            return False, None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        count("store.hits" if row is not None else "store.misses")
+        return (True, value) if row is not None else (False, None)
+
+    def put(self, namespace, version, args, result):
+        if not self.enabled:
+            return
+        key = scenario_key(namespace, version, args)
+        blob = encode(result)
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, namespace, version, blob, len(blob), now, now))
+            with self._lock:
+                self.writes += 1
+                check = self.writes % EVICT_CHECK == 1
+            if check:
+                self._evict(conn)
+        except (sqlite3.Error, OSError):
+            self._failed()
+
+    def _evict(self, conn):
+        """總大小超過上限時，依最後使用時間由舊到新刪除到 EVICT_TO"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * EVICT_TO)
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY accessed"):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+        with self._lock:
+            self.evictions += len(doomed)
+        count("store.evictions", len(doomed))
+
+    def fetch(self, namespace, version, args, compute):
+        """先查結果庫，未命中時 compute() 試算並寫入；回傳唯讀結果"""
+        hit, value = self.get(namespace, version, args)
+        if hit:
+            return value
+        value = freeze(compute())
+        self.put(namespace, version, args, value)
+        return value
+
+    def clear(self):
+        if not self.enabled:
+            return
+        try:
+            self._connect().execute("DELETE FROM results")
+        except sqlite3.Error:
+            self._failed()
+
+    def usage(self):
+        """結果庫內的筆數與總大小 (各行程共用的數字)"""
+        if not self.enabled:
+            return {"entries": 0, "bytes": 0}
+        try:
+            entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        except sqlite3.Error:
+            self._failed()
+            return {"entries": 0, "bytes": 0}
+        return {"entries": entries, "bytes": size}
+
+    def stats(self):
+        """本行程的命中統計 (格式與 LRUCache.stats 相容，供狀態面板彙總)"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "path": self.path,
+                "max_bytes": self.max_bytes,
+            }
+
+
+STORE = ResultStore()
+CACHES["store.results"] = STORE
+
+
+# --- 常用報價預先試算 ---
+WARM_AGES = range(20, 61, 5)
+WARM_DEPOSITS = (60000, 100000, 120000, 200000, 300000, 500000, 1000000)
+WARM_MODES = ("offset", "compound")
+
+
+@timed("store.warm")
+def warm(ages=WARM_AGES, deposits=WARM_DEPOSITS):
+    """
+    策略商品 (PAI / IAT2 / 舊版 PAI) 與 UL 的常用報價試算並寫入結果庫；
+    UL 以存入金額為目標保費、頁面預設的保額、繳費年期與宣告利率，男女各一
+    回傳試算 (或已存在) 的報價數
+    """
+    from products import PRODUCTS
+    from strategy import cached_strategy
+    from ul_engine import cached_projection
+
+    n = 0
+    for key in PRODUCTS:
+        kind = PRODUCTS.manifest[key]["kind"]
+        for age in ages:
+            for deposit in deposits:
+                if kind == "strategy":
+                    for mode in WARM_MODES:
+                        cached_strategy(key, age, deposit, mode)
+                        n += 1
+                elif kind == "ul":
+                    for gender in ("男性", "女性"):
+                        cached_projection(age, gender, deposit, 12000000, 20, 0.08)
+                        n += 1
+    return n
+
+
+if __name__ == "__main__":
+    if not STORE.enabled:
+        sys.exit("結果庫已停用 (PAI_STORE)")
+    if "--clear" in sys.argv[1:]:
+        STORE.clear()
+        print(f"已清空 {STORE.path}")
+    elif "--stats" in sys.argv[1:]:
+        usage = STORE.usage()
+        print(f"{STORE.path}: {usage['entries']:,} 筆, {usage['bytes'] / (1 << 20):.1f} MB (上限 {STORE.max_bytes / (1 << 20):.0f} MB)")
+    else:
+        started = time.perf_counter()
+        n = warm()
+        usage = STORE.usage()
+        print(f"已預先試算 {n:,} 筆報價 ({time.perf_counter() - started:.1f} 秒)；"
+              f"結果庫 {usage['entries']:,} 筆, {usage['bytes'] / (1 << 20):.1f} MB")
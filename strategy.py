@@ -0,0 +1,410 @@
+"""
+商品無關的借款投資策略引擎 (PAI / IAT2 / 927money 共用)
+逐年規則: 依借款成數借到 cv * limit_rate，扣手續費後投入基金，基金每年配息 7%，
+配息依模式折抵保費 (offset) 或複利滾存 (compound)
+輸出為逐年數值陣列，格式化交由各頁面處理
+"""
+import functools
+
+import numpy as np
+
+from analytics import break_even_year, roi, settled_irr
+from cache import memoize, normalize_amount
+from metrics import count, timed
+from products import PRODUCTS
+from store import STORE, code_version
+
+FEE_RATE = 0.05      # 借款投入基金的手續費
+INCOME_RATE = 0.07   # 基金年配息率
+
+
+def n_projection_years(product, start_age):
+    if product["end_age"] is not None:
+        return max(product["end_age"] - start_age, 0)
+    return product["max_years"]
+
+
+def table_values(table, years, scale):
+    """依保單年度查表 (超過表長取最後一年)，再依保費比例放大；無表時為 0"""
+    if table is None:
+        return np.zeros(len(years))
+    table = np.asarray(table, dtype=float)
+    return table[np.minimum(years, len(table) - 1)] * scale
+
+
+def loan_limit_rates(ladder, years):
+    """借款成數階梯 -> 各保單年度的可借成數"""
+    years = np.asarray(years)
+    rates = np.zeros(len(years))
+    assigned = np.zeros(len(years), dtype=bool)
+    for min_year, rate in ladder:
+        hit = ~assigned & (years >= min_year)
+        rates[hit] = rate
+        assigned |= hit
+    return rates
+
+
+def product_arrays(product, start_age, annual_deposit):
+    """與策略無關的逐年商品數值：保單年度、年齡、解約金、身故金、可借成數、應繳保費、累積本金"""
+    years = np.arange(1, n_projection_years(product, start_age) + 1)
+    scale = annual_deposit / product["base_premium"]
+    term = product["premium_term"]
+    return {
+        "policy_year": years,
+        "age": start_age + years,
+        "cv": table_values(product["cv_table"], years, scale),
+        "death_base": table_values(product["death_table"], years, scale),
+        "limit_rate": loan_limit_rates(product["loan_ladder"], years),
+        "nominal_premium": np.where(years <= term, annual_deposit, 0),
+        "accum_deposit": annual_deposit * np.minimum(years, term),
+    }
+
+
+def borrow_window(policy_year, age, policy):
+    """與借款狀態無關的條件 (年齡未超過 stop_age、保單年度符合 cycle)：可能借款的年度；純量或陣列皆可"""
+    in_cycle = policy_year % policy["cycle"] == 0 if policy["cycle"] else True
+    return (age <= policy["stop_age"]) & in_cycle
+
+
+def borrow_step(cv, limit_rate, loan, fund, last_borrow_year, policy_year, age, policy, fee_rate=FEE_RATE, fraction=1.0):
+    """
+    單一年度的借款規則 (逐年試算、跳躍搜尋、參數掃描、蒙地卡羅與策略最佳化共用，規則只定義在這裡)：
+    在 borrow_window 內 (年齡未超過 stop_age、保單年度符合 cycle)、距上次借款滿 interval 年 (首借不限)，
+    且新借金額 (借到 cv * limit_rate * fraction 為止) 達首借 first_min / 增貸 topup_min 時借款，扣手續費後投入基金
+    各參數可為純量或陣列 (情境、候選策略或年度並列)，policy 的 first_min / topup_min / interval / stop_age 也可為陣列
+    回傳借款後的 (是否借款, 借款餘額, 基金本金, 上次借款年度)
+    """
+    new_borrow = cv * limit_rate * fraction - loan
+    is_first = last_borrow_year == 0
+    is_time_ok = is_first | ((policy_year - last_borrow_year) >= policy["interval"])
+    scalar = isinstance(is_first, (bool, np.bool_))  # 逐年迴圈每年呼叫：純量直接判斷，不建立陣列
+    min_amount = (policy["first_min"] if is_first else policy["topup_min"]) if scalar else \
+        np.where(is_first, policy["first_min"], policy["topup_min"])
+    borrow = borrow_window(policy_year, age, policy) & (new_borrow > 0) & (new_borrow >= min_amount) & is_time_ok
+    if scalar:
+        if not borrow:
+            return False, loan, fund, last_borrow_year
+        return True, loan + new_borrow, fund + new_borrow * (1 - fee_rate), policy_year
+    return (
+        borrow,
+        np.where(borrow, loan + new_borrow, loan),
+        np.where(borrow, fund + new_borrow * (1 - fee_rate), fund),
+        np.where(borrow, policy_year, last_borrow_year),
+    )
+
+
+def borrow_schedule(cv, limit_rate, ages, policy, fee_rate=FEE_RATE, resume=None):
+    """
+    依借款策略逐年決定是否借款 (借到 cv * limit_rate 為止)
+    回傳 (借款餘額, 基金本金, 是否借款年, 上次借款年度) 四個逐年陣列，即每年年末的狀態
+    resume=(previous, t0): 前 t0 年沿用 previous (先前結果) 的逐年狀態，只從第 t0 年起重算
+    """
+    n = len(cv)
+    loan = np.zeros(n)
+    fund = np.zeros(n)
+    borrowed = np.zeros(n, dtype=bool)
+    last_borrow = np.zeros(n, dtype=np.int64)
+    current_loan = 0.0
+    current_fund = 0.0
+    last_borrow_year = 0
+    t0 = 0
+    if resume is not None:
+        previous, t0 = resume
+        loan[:t0] = previous["loan"][:t0]
+        fund[:t0] = previous["fund"][:t0]
+        borrowed[:t0] = previous["borrowed"][:t0]
+        last_borrow[:t0] = previous["last_borrow_year"][:t0]
+        if t0 > 0:
+            current_loan, current_fund = float(loan[t0 - 1]), float(fund[t0 - 1])
+            last_borrow_year = int(last_borrow[t0 - 1])
+
+    # 逐年迴圈以 Python 純量計算 (borrow_step 的純量路徑)，最後一次寫回；不在 borrow_window 內的年度狀態不變
+    cv, limit_rate, ages = cv.tolist(), limit_rate.tolist(), ages.tolist()
+    states = []
+    for t in range(t0, n):
+        if borrow_window(t + 1, ages[t], policy):
+            state = borrow_step(cv[t], limit_rate[t], current_loan, current_fund, last_borrow_year, t + 1, ages[t],
+                                policy, fee_rate)
+            _, current_loan, current_fund, last_borrow_year = state
+        else:
+            state = (False, current_loan, current_fund, last_borrow_year)
+        states.append(state)
+    if states:
+        borrowed[t0:], loan[t0:], fund[t0:], last_borrow[t0:] = zip(*states)
+    return loan, fund, borrowed, last_borrow
+
+
+def _first_difference(a, b):
+    """兩個逐年陣列第一個不同的索引 (長度不同時以較短者為準，完全相同回傳較短長度)"""
+    n = min(len(a), len(b))
+    diff = np.flatnonzero(np.asarray(a[:n]) != np.asarray(b[:n]))
+    return int(diff[0]) if diff.size else n
+
+
+def first_affected_year(previous, cv, limit_rate, ages, policy, fee_rate=FEE_RATE):
+    """
+    先前結果的逐年狀態中，前幾年可以直接沿用 (回傳第一個需要重算的年度索引)
+    沿著先前的狀態軌跡，以新的輸入與借款策略向量化重判每年是否借款，
+    在輸入第一次不同或借款決定第一次改變之前，逐年狀態必然相同
+    """
+    t0 = min(
+        _first_difference(previous["cv"], cv),
+        _first_difference(previous["limit_rate"], limit_rate),
+        _first_difference(previous["age"], ages),
+        len(cv),
+    )
+    if t0 == 0:
+        return 0
+
+    # 各年度開始前的狀態 (沿先前軌跡)
+    prev_loan = np.concatenate(([0.0], previous["loan"][:t0 - 1]))
+    prev_last = np.concatenate(([0], previous["last_borrow_year"][:t0 - 1]))
+    decision, _, _, _ = borrow_step(cv[:t0], limit_rate[:t0], prev_loan, 0.0, prev_last, np.arange(1, t0 + 1),
+                                    ages[:t0], policy, fee_rate)
+    decision = np.broadcast_to(decision, (t0,))
+    t0 = min(t0, _first_difference(previous["borrowed"], decision))
+
+    if fee_rate != previous["fee_rate"]:
+        # 手續費只影響基金本金：從第一次借款起重算
+        t0 = min(t0, _first_difference(previous["borrowed"], np.zeros(t0, dtype=bool)))
+    return t0
+
+
+def run_strategy(product, start_age, annual_deposit, mode="offset", policy=None,
+                 fee_rate=FEE_RATE, income_rate=INCOME_RATE, previous=None):
+    """
+    mode: "offset" 以息養險 (配息折抵保費，多餘領回) / "compound" 階梯槓桿 (配息複利滾存)
+    policy: 借款策略，預設為商品的 loan_policy
+    previous: 先前的試算結果 (可為其他參數)；借款與複利的逐年迴圈只從第一個受影響的年度接續重算
+    回傳 dict，每個欄位為逐年陣列 (長度 = 試算年數)
+    """
+    count("strategy.scenarios")
+    policy = policy or product["loan_policy"]
+    res = product_arrays(product, start_age, annual_deposit)
+    resume = None
+    if previous is not None:
+        t0 = first_affected_year(previous, res["cv"], res["limit_rate"], res["age"], policy, fee_rate)
+        resume = (previous, t0)
+        count("strategy.reused_years", t0)
+    loan, fund, borrowed, last_borrow = borrow_schedule(res["cv"], res["limit_rate"], res["age"], policy, fee_rate, resume)
+    net_income = fund * income_rate
+    n = len(loan)
+
+    res.update({"loan": loan, "fund": fund, "borrowed": borrowed, "last_borrow_year": last_borrow, "net_income": net_income})
+    if mode == "offset":
+        actual_pay = res["nominal_premium"] - net_income
+        accum_cash_out = np.cumsum(np.where(actual_pay > 0, 0, -actual_pay))
+        res["actual_pay"] = actual_pay
+        res["accum_real_cost"] = np.cumsum(np.where(actual_pay > 0, actual_pay, 0))
+        res["accum_cash_out"] = accum_cash_out
+        res["accum_net_wealth"] = np.zeros(n)
+        res["net_worth"] = res["cv"] + fund + accum_cash_out - loan
+        res["death_benefit"] = res["death_base"] + fund - loan
+    else:
+        accum_net_wealth = np.zeros(n)
+        wealth = 0.0
+        t0 = 0
+        if previous is not None and previous["mode"] == "compound" and previous["income_rate"] == income_rate:
+            # 配息前段相同時，複利滾存也沿用先前結果
+            t0 = _first_difference(previous["net_income"], net_income)
+            accum_net_wealth[:t0] = previous["accum_net_wealth"][:t0]
+            wealth = accum_net_wealth[t0 - 1] if t0 > 0 else 0.0
+        for t in range(t0, n):
+            wealth = (wealth * (1 + income_rate)) + net_income[t]
+            accum_net_wealth[t] = wealth
+        res["actual_pay"] = np.zeros(n)
+        res["accum_real_cost"] = np.zeros(n)
+        res["accum_cash_out"] = np.zeros(n)
+        res["accum_net_wealth"] = accum_net_wealth
+        res["net_worth"] = res["cv"] + fund + accum_net_wealth - loan
+        res["death_benefit"] = res["death_base"] + fund + accum_net_wealth - loan
+    res.update({"mode": mode, "fee_rate": fee_rate, "income_rate": income_rate})
+    return res
+
+
+def snapshot(result, age):
+    """取出指定年齡當年的結算數值 (65 歲驗證區使用)；不在試算期間內回傳 None"""
+    hit = np.nonzero(result["age"] == age)[0]
+    if not hit.size:
+        return None
+    t = hit[0]
+    return {
+        "cv": result["cv"][t],
+        "loan": result["loan"][t],
+        "fund": result["fund"][t],
+        "cash_out": result["accum_cash_out"][t],
+        "accum_wealth": result["accum_net_wealth"][t],
+        "total": result["net_worth"][t],
+    }
+
+
+def paid_by_year(result):
+    """每年自付的金額 (報酬分析的現金流出)：以息養險為扣除配息折抵後的實繳，複利滾存為全額存入"""
+    if result["mode"] == "offset":
+        return np.maximum(result["actual_pay"], 0)
+    return np.asarray(result["nominal_premium"], dtype=float)
+
+
+def returns_at(result, age):
+    """
+    指定年齡當年末以總淨資產結清的 IRR、累積報酬率，以及損益兩平 (總淨資產第一次不低於累積實繳) 的年齡
+    未達損益兩平時 break_even_age 為 None；不在試算期間內回傳 None
+    """
+    hit = np.nonzero(result["age"] == age)[0]
+    if not hit.size:
+        return None
+    t = hit[0]
+    paid = paid_by_year(result)[:t + 1]
+    net_worth = result["net_worth"][:t + 1]
+    cumulative = np.cumsum(paid)
+    year = int(break_even_year(cumulative, net_worth))
+    return {
+        "irr": float(settled_irr(paid, net_worth[t])[0]),
+        "roi": float(roi(cumulative[t], net_worth[t])),
+        "break_even_age": int(result["age"][year - 1]) if year else None,
+    }
+
+
+# --- 單一年度的快速結算 (不跑完整逐年迴圈) ---
+@functools.lru_cache(maxsize=64)
+def _ladder_rates(ladder, n):
+    """第 1~n 保單年度的可借成數 (依階梯快取，唯讀)"""
+    rates = loan_limit_rates(ladder, np.arange(1, n + 1))
+    rates.setflags(write=False)
+    return rates
+
+
+def _iter_borrow_events(cv, limit_rate, ages, policy, fee_rate, n):
+    """
+    逐次產生 (借款年度索引, 借款後餘額, 借款後基金本金)；每年是否借款由 borrow_step 判斷，
+    只檢查 borrow_window 內的年度，借款後直接跳到滿 interval 年的年度再往後找，不逐年檢查中間的年度
+    """
+    capacity, ages = (cv[:n] * limit_rate[:n]).tolist(), ages[:n].tolist()
+    step = max(policy["interval"], 1)
+    loan = fund = 0.0
+    last_borrow_year = 0
+    t = 0
+    while t < n:
+        if not borrow_window(t + 1, ages[t], policy):
+            t += 1
+            continue
+        borrow, loan, fund, last_borrow_year = borrow_step(
+            capacity[t], 1.0, loan, fund, last_borrow_year, t + 1, ages[t], policy, fee_rate)
+        if borrow:
+            yield t, loan, fund
+            t += step
+        else:
+            t += 1
+
+
+def borrow_events(cv, limit_rate, ages, policy, fee_rate=FEE_RATE, until=None):
+    """
+    只找出借款年度 (不計算逐年的餘額與基金陣列)，借款後直接跳過未滿 interval 年的年度
+    until: 只搜尋到此年度索引 (含)
+    回傳 (借款年度索引, 借款後餘額, 借款後基金本金) 三個陣列，與 borrow_schedule 的逐年結果一致
+    """
+    n = len(cv) if until is None else min(until + 1, len(cv))
+    events = list(_iter_borrow_events(cv, limit_rate, ages, policy, fee_rate, n))
+    if not events:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    t, loan, fund = zip(*events)
+    return np.array(t, dtype=np.int64), np.array(loan), np.array(fund)
+
+
+def summary_at(product, start_age, annual_deposit, age, mode="offset", policy=None,
+               fee_rate=FEE_RATE, income_rate=INCOME_RATE):
+    """
+    指定年齡當年的結算數值 (欄位同 snapshot，另含 death_benefit 與逐年自付金額 paid)，不跑完整逐年迴圈：
+    借款年度以跳躍搜尋找出，兩次借款之間基金本金與配息固定 (繳費期滿前後應繳保費也固定)，
+    領回現金為等差累加、複利滾存為等比級數，每個區段以公式一次算出
+    與 run_strategy + snapshot 的差異只在浮點運算順序 (相對誤差約 1e-15)；不在試算期間內回傳 None
+    """
+    policy = policy or product["loan_policy"]
+    end = age - start_age - 1
+    if end < 0 or end >= n_projection_years(product, start_age):
+        return None
+    years = np.arange(1, end + 2)
+    scale = annual_deposit / product["base_premium"]
+    cv = table_values(product["cv_table"], years, scale)
+    limit_rate = _ladder_rates(product["loan_ladder"], end + 1)
+    events = list(_iter_borrow_events(cv, limit_rate, start_age + years, policy, fee_rate, end + 1))
+
+    # 區段界線：各借款年度與繳費期滿的隔年
+    term = product["premium_term"]
+    cuts = sorted({0, *(t for t, _, _ in events), *((term,) if term <= end else ())})
+    cuts.append(end + 1)
+    cash_out = wealth = 0.0
+    growth = 1 + income_rate
+    fund = 0.0
+    paid = np.zeros(end + 1)  # 與 paid_by_year 相同
+    e = 0
+    for a, b in zip(cuts[:-1], cuts[1:]):
+        while e < len(events) and events[e][0] <= a:
+            fund = events[e][2]
+            e += 1
+        k = b - a
+        net_income = fund * income_rate
+        nominal = annual_deposit if a < term else 0
+        if mode == "offset":
+            cash_out += max(net_income - nominal, 0.0) * k
+            paid[a:b] = max(nominal - net_income, 0.0)
+        else:
+            paid[a:b] = nominal
+            if income_rate:
+                factor = growth ** k
+                wealth = wealth * factor + net_income * (factor - 1) / income_rate
+            else:
+                wealth += net_income * k
+
+    loan = events[-1][1] if events else 0.0
+    death_base = table_values(product["death_table"], years[-1:], scale)[0]
+    if mode == "offset":
+        total = cv[end] + fund + cash_out - loan
+        death_benefit = death_base + fund - loan
+    else:
+        total = cv[end] + fund + wealth - loan
+        death_benefit = death_base + fund + wealth - loan
+    return {"cv": cv[end], "loan": loan, "fund": fund, "cash_out": cash_out, "accum_wealth": wealth,
+            "total": total, "death_benefit": death_benefit, "paid": paid}
+
+
+RESULT_COLUMNS = [
+    "policy_year", "age", "borrowed", "limit_rate", "nominal_premium", "accum_deposit",
+    "net_income", "actual_pay", "accum_real_cost", "accum_cash_out", "accum_net_wealth",
+    "cv", "death_base", "loan", "fund", "net_worth", "death_benefit",
+]
+
+
+def result_frame(result):
+    """
+    引擎結果轉為型別明確的 DataFrame (年度/年齡 int64、金額 float64、借款年 bool)
+    顯示、匯出與比較都由此表出發，格式化留到顯示層
+    """
+    import pandas as pd
+
+    dtypes = {"policy_year": np.int64, "age": np.int64, "borrowed": bool}
+    return pd.DataFrame({col: np.asarray(result[col], dtype=dtypes.get(col, np.float64)) for col in RESULT_COLUMNS})
+
+
+# 各商品最近一次算出的結果，快取未命中時作為接續重算的起點 (結果為唯讀，可跨使用者共用)
+_recent = {}
+
+
+@memoize(maxsize=512, ttl=3600)
+def _cached_strategy(product_key, start_age, annual_deposit, mode):
+    res = STORE.fetch(
+        f"strategy.{product_key}", f"{PRODUCTS.version(product_key)}-{code_version('strategy')}",
+        (product_key, start_age, annual_deposit, mode),
+        lambda: run_strategy(PRODUCTS[product_key], start_age, annual_deposit, mode, previous=_recent.get(product_key)),
+    )
+    _recent[product_key] = res
+    return res
+
+
+def cached_strategy(product_key, start_age, annual_deposit, mode="offset"):
+    """
+    run_strategy 的快取版本 (product_key 為 PRODUCTS 的鍵)
+    輸入先正規化再查快取；回傳的陣列為唯讀，只影響顯示的切換 (如月繳顯示) 直接重用
+    未命中時先查磁碟結果庫 (store，各行程共用)，仍未命中才以同商品上一次的結果接續，只重算受影響的年度
+    """
+    return _cached_strategy(product_key, int(start_age), normalize_amount(annual_deposit), mode)
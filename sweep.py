@@ -0,0 +1,203 @@
+"""
+參數掃描：投保年齡 × 存入金額整張網格一次試算，供熱力圖與矩陣下載使用
+所有情境攤平成一維陣列同時計算，逐年迴圈只跑年度數次 (策略商品的借款規則即 strategy.borrow_step，927UNN 直接用 project_batch)
+每個格點輸出 summary_age 時的總淨資產 / 身故金、於該年末結清的 IRR 與累積報酬率，萬能壽險另有保障維持至幾歲；
+不在試算期間內的格點為 NaN
+"""
+import numpy as np
+
+from analytics import roi, settled_irr
+from cache import freeze, memoize, normalize_amount
+from metrics import count, timed
+from products import PRODUCTS
+from strategy import FEE_RATE, INCOME_RATE, borrow_step, loan_limit_rates
+
+SUMMARY_AGE = 65
+SWEEP_AGES = tuple(range(0, 81))
+SWEEP_MONTHLY_DEPOSITS = tuple(range(2000, 102000, 2000))  # 月存 2,000 ~ 100,000，共 50 檔
+
+FIELD_LABELS = {"net_worth": "總淨資產", "death_benefit": "身故金", "coverage_age": "保障維持至 (歲)",  # coverage_age 只有 ul_grid
+                "irr": "IRR", "roi": "累積報酬率"}
+RATE_FIELDS = ("irr", "roi")
+
+
+def grid_points(start_ages, deposits):
+    """(年齡, 金額) 網格攤平為兩個一維陣列，年齡為外層 (與結果矩陣的列對應)"""
+    ages, amounts = np.meshgrid(np.asarray(start_ages, dtype=np.int64), np.asarray(deposits, dtype=float), indexing="ij")
+    return ages.ravel(), amounts.ravel()
+
+
+@timed("sweep.strategy")
+def strategy_grid(product, start_ages, annual_deposits, mode="offset", policy=None,
+                  fee_rate=FEE_RATE, income_rate=INCOME_RATE, summary_age=SUMMARY_AGE):
+    """
+    策略商品 (PAI / IAT2 / 舊版 PAI) 的網格試算，每個格點與 run_strategy 的結果一致
+    IRR / 累積報酬率: 每年自付金額 (以息養險扣除配息折抵) 於 summary_age 當年末以總淨資產結清
+    不輸出保障維持至 (coverage_age)：借款受借款成數限制不會超過解約金，保單不會因借款停效，
+    每格都只會是試算期末年齡
+    回傳 dict: ages、deposits 與 (年齡數, 金額數) 的 net_worth / death_benefit / irr / roi 矩陣
+    """
+    policy = policy or product["loan_policy"]
+    shape = (len(start_ages), len(annual_deposits))
+    age0, deposit = grid_points(start_ages, annual_deposits)
+    n = age0.size
+    count("sweep.scenarios", n)
+
+    if product["end_age"] is not None:
+        horizon = np.maximum(product["end_age"] - age0, 0)
+    else:
+        horizon = np.full(n, product["max_years"])
+    n_years = int(horizon.max()) if n else 0
+    scale = deposit / product["base_premium"]
+    cv_table = None if product["cv_table"] is None else np.asarray(product["cv_table"], dtype=float)
+    death_table = None if product["death_table"] is None else np.asarray(product["death_table"], dtype=float)
+    limit_rate = loan_limit_rates(product["loan_ladder"], np.arange(1, n_years + 1))
+    zeros = np.zeros(n)
+
+    loan = np.zeros(n)
+    fund = np.zeros(n)
+    last_borrow_year = np.zeros(n, dtype=np.int64)
+    accum = np.zeros(n)  # offset: 累積領回現金；compound: 累積配息 (複利)
+    out = {name: np.full(n, np.nan) for name in ("net_worth", "death_benefit")}
+    paid = np.zeros((n, n_years))  # 每年自付金額 (與 strategy.paid_by_year 相同)，IRR 使用
+
+    for t in range(n_years):
+        policy_year = t + 1
+        live = policy_year <= horizon
+        ages = age0 + policy_year
+        cv = zeros if cv_table is None else cv_table[min(policy_year, len(cv_table) - 1)] * scale
+        death_base = zeros if death_table is None else death_table[min(policy_year, len(death_table) - 1)] * scale
+
+        _, loan, fund, last_borrow_year = borrow_step(cv, limit_rate[t], loan, fund, last_borrow_year, policy_year,
+                                                      ages, policy, fee_rate)
+
+        net_income = fund * income_rate
+        if mode == "offset":
+            actual_pay = np.where(policy_year <= product["premium_term"], deposit, 0) - net_income
+            accum = accum + np.where(actual_pay > 0, 0, -actual_pay)
+            paid[:, t] = np.maximum(actual_pay, 0)
+            net_worth = cv + fund + accum - loan
+            death_benefit = death_base + fund - loan
+        else:
+            accum = (accum * (1 + income_rate)) + net_income
+            paid[:, t] = np.where(policy_year <= product["premium_term"], deposit, 0)
+            net_worth = cv + fund + accum - loan
+            death_benefit = death_base + fund + accum - loan
+
+        at = live & (ages == summary_age)
+        out["net_worth"][at] = net_worth[at]
+        out["death_benefit"][at] = death_benefit[at]
+
+    out["irr"], out["roi"] = _returns_at(paid, out["net_worth"], summary_age - age0 - 1)
+    result = {name: values.reshape(shape) for name, values in out.items()}
+    result.update({"ages": np.asarray(start_ages), "deposits": np.asarray(annual_deposits, dtype=float)})
+    return result
+
+
+def _returns_at(paid, value, end):
+    """各格點於 end 年末 (年度索引) 以 value 結清的 IRR 與累積報酬率；value 為 NaN 的格點 (不在試算期間內) 為 NaN"""
+    rows = np.flatnonzero(~np.isnan(value))
+    irr = np.full(len(value), np.nan)
+    ratio = np.full(len(value), np.nan)
+    if rows.size:
+        end = end[rows]
+        paid = paid[rows, :end.max() + 1]
+        irr[rows] = settled_irr(paid, value[rows], end)
+        ratio[rows] = roi(np.where(np.arange(paid.shape[1]) <= end[:, None], paid, 0).sum(axis=1), value[rows])
+    return irr, ratio
+
+
+@timed("sweep.ul")
+def ul_grid(ages, target_premiums, gender, basic_sum_assured, payment_term, interest_rate, summary_age=SUMMARY_AGE):
+    """
+    927UNN 萬能壽險的網格試算：整張網格一次交給 project_batch
+    總淨資產取 summary_age 當年末的帳戶價值 (IRR / 累積報酬率以實繳保費與該帳戶價值計算)，
+    保障維持至取 coverage_age (帳戶價值歸零前的最後年齡)
+    """
+    from ul_engine import account_value_at, coverage_age, project_batch
+
+    shape = (len(ages), len(target_premiums))
+    age0, premium = grid_points(ages, target_premiums)
+    count("sweep.scenarios", age0.size)
+    batch = project_batch(age0, gender, premium, basic_sum_assured, payment_term, interest_rate)
+
+    # 年齡 summary_age 為第 (summary_age - 投保年齡 + 1) 年；逐格取對應年度
+    idx = summary_age - age0
+    valid = (idx >= 0) & (idx < batch["n_years"])
+    rows = np.flatnonzero(valid)
+    out = {name: np.full(age0.size, np.nan) for name in ("net_worth", "death_benefit")}
+    out["net_worth"][rows] = batch["account_value"][rows, idx[rows]]
+    out["death_benefit"][rows] = batch["death_benefit"][rows, idx[rows]]
+    out["coverage_age"] = coverage_age(batch).astype(float)
+    out["irr"], out["roi"] = _returns_at(batch["premium"], out["net_worth"], idx)
+
+    result = {name: values.reshape(shape) for name, values in out.items()}
+    result.update({"ages": np.asarray(ages), "deposits": np.asarray(target_premiums, dtype=float)})
+    return result
+
+
+@memoize(maxsize=32, ttl=3600)
+def _cached_strategy_grid(product_key, start_ages, annual_deposits, mode):
+    return freeze(strategy_grid(PRODUCTS[product_key], start_ages, annual_deposits, mode))
+
+
+def cached_strategy_grid(product_key, start_ages, monthly_deposits, mode="offset"):
+    """strategy_grid 的快取版本 (月存金額)；回傳矩陣為唯讀，deposits 為年繳金額"""
+    return _cached_strategy_grid(
+        product_key, tuple(int(a) for a in start_ages),
+        tuple(normalize_amount(m * 12) for m in monthly_deposits), mode,
+    )
+
+
+@memoize(maxsize=32, ttl=3600)
+def _cached_ul_grid(ages, target_premiums, gender, basic_sum_assured, payment_term, interest_rate):
+    return freeze(ul_grid(ages, target_premiums, gender, basic_sum_assured, payment_term, interest_rate))
+
+
+def cached_ul_grid(ages, target_premiums, gender, basic_sum_assured, payment_term, interest_rate):
+    """ul_grid 的快取版本 (年繳目標保費)"""
+    return _cached_ul_grid(
+        tuple(int(a) for a in ages), tuple(normalize_amount(p) for p in target_premiums), gender,
+        normalize_amount(basic_sum_assured), int(payment_term), float(interest_rate),
+    )
+
+
+def deposit_range(low, high, step):
+    """側邊欄的金額範圍 -> 網格金額 (含上限)"""
+    step = max(step, 1)
+    return tuple(range(int(low), int(high) + 1, int(step)))
+
+
+# --- 顯示與下載 ---
+def grid_matrix(result, field, deposit_divisor=1):
+    """結果矩陣轉為 DataFrame (列 = 年齡、欄 = 金額)，下載用；deposit_divisor=12 時欄位顯示月存金額"""
+    import pandas as pd
+
+    columns = pd.Index(np.round(result["deposits"] / deposit_divisor).astype(np.int64), name="金額")
+    return pd.DataFrame(result[field], index=pd.Index(result["ages"], name="年齡"), columns=columns)
+
+
+def grid_long_frame(result, field, deposit_divisor=1):
+    """熱力圖用長表：年齡、金額、數值三欄"""
+    matrix = grid_matrix(result, field, deposit_divisor)
+    return matrix.stack(future_stack=True).rename("數值").reset_index()
+
+
+def render_heatmap(container, result, field, deposit_divisor=1, deposit_label="金額"):
+    """以 Altair 畫熱力圖 (Streamlit 內建相依)，並提供矩陣 CSV 下載；container 傳入 st 或任一容器"""
+    import altair as alt
+
+    label = FIELD_LABELS[field]
+    long_frame = grid_long_frame(result, field, deposit_divisor)
+    value_format = {"coverage_age": "d", "irr": ".2%", "roi": ".0%"}.get(field, ",.0f")
+    chart = alt.Chart(long_frame).mark_rect().encode(
+        x=alt.X("金額:O", title=deposit_label, axis=alt.Axis(format=",d", labelOverlap=True)),
+        y=alt.Y("年齡:O", title="投保年齡", sort="descending", axis=alt.Axis(labelOverlap=True)),
+        color=alt.Color("數值:Q", title=label, scale=alt.Scale(scheme="tealblues")),
+        tooltip=[alt.Tooltip("年齡:O", title="投保年齡"), alt.Tooltip("金額:O", title=deposit_label, format=",d"),
+                 alt.Tooltip("數值:Q", title=label, format=value_format)],
+    ).properties(height=max(300, 7 * len(result["ages"])))
+    container.altair_chart(chart, use_container_width=True)
+    csv = grid_matrix(result, field, deposit_divisor).to_csv(float_format="%.6f" if field in RATE_FIELDS else "%.0f")
+    csv = csv.encode("utf-8-sig")
+    container.download_button(f"下載{label}矩陣 (CSV)", csv, file_name=f"sweep_{field}.csv", mime="text/csv")
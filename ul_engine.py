@@ -0,0 +1,252 @@
+import numpy as np
+
+from cache import memoize, normalize_amount
+from metrics import count, timed
+from products import PRODUCTS
+from store import STORE, code_version
+
+# --- 商品參數 ---
+MAX_AGE = 110                                   # 試算至110歲
+EXPENSE_RATES = [0.58, 0.33, 0.23, 0.13, 0.13]  # 前5年保費費用率
+ADMIN_FEE = 1200                                # 每年管理費
+COI_LOADING = 1.2                               # 危險成本加成
+GENDERS = ['男性', '女性']
+
+
+def load_coi_table(product="UL"):
+    """
+    由商品登錄表取出危險保費率 (每千元)，整理為 (性別, 年齡) 的 NumPy 陣列
+    table[g, age] 即為該性別該年齡的費率；表中缺漏的年齡以該性別最高費率補齊
+    """
+    rates = PRODUCTS.table(product, "coi")
+    table = np.empty((len(GENDERS), MAX_AGE + 1))
+    for g in range(len(GENDERS)):
+        row = rates.row(sex=g + 1)  # 費率表性別代碼 1=男、2=女
+        table[g, :] = row.max()
+        n = min(len(row), MAX_AGE + 1)
+        table[g, :n] = row[:n]
+    return table
+
+
+def gender_index(genders):
+    """'男性'/'女性' (或 0/1) 轉為 load_coi_table() 的列索引"""
+    genders = np.asarray(genders)
+    if genders.dtype.kind in 'iu':
+        return genders.astype(np.int64)
+    return np.where(genders == GENDERS[0], 0, 1)
+
+
+@timed("ul.project_batch")
+def project_batch(ages, genders, target_premiums, sum_assureds, payment_terms, interest_rates, coi_table=None):
+    """
+    批次試算帳戶價值：每個參數可為純量或陣列，廣播後每列代表一個情境
+    回傳 dict，各欄位為 (情境數, 年度數) 的陣列；n_years 為各情境的有效年度數
+    (繳費期滿後帳戶價值歸零即停止，與單筆試算相同)
+    coi_table: (性別, 年齡) 危險保費率，未提供時由商品登錄表載入
+    """
+    if coi_table is None:
+        coi_table = load_coi_table()
+    ages, g_idx, premiums, sum_assureds, payment_terms, interest_rates = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(ages, dtype=np.int64)),
+        gender_index(genders),
+        np.asarray(target_premiums),
+        np.asarray(sum_assureds, dtype=float),
+        np.asarray(payment_terms, dtype=np.int64),
+        np.asarray(interest_rates, dtype=float),
+    )
+    n = ages.shape[0]
+    count("ul.scenarios", n)
+    horizons = MAX_AGE - ages + 1
+    max_years = int(horizons.max()) if n else 0
+
+    out = {
+        'premium': np.zeros((n, max_years), dtype=premiums.dtype),
+        'expense': np.zeros((n, max_years)),
+        'coi': np.zeros((n, max_years)),
+        'account_value': np.zeros((n, max_years)),
+        'death_benefit': np.zeros((n, max_years)),
+    }
+    n_years = np.zeros(n, dtype=np.int64)
+    account_value = np.zeros(n)
+    active = np.ones(n, dtype=bool)
+    last_age = coi_table.shape[1] - 1
+
+    for t in range(max_years):
+        year = t + 1
+        active &= year <= horizons
+        if not active.any():
+            break
+
+        gross_premium = np.where(year <= payment_terms, premiums, 0)
+        if year <= len(EXPENSE_RATES):
+            premium_expense = gross_premium * EXPENSE_RATES[t]
+        else:
+            premium_expense = np.zeros(n)
+
+        raw_rate = coi_table[g_idx, np.minimum(ages + t, last_age)]
+        net_amount_at_risk = np.maximum(0, sum_assureds - account_value)
+        insurance_cost = net_amount_at_risk * (raw_rate / 1000) * COI_LOADING
+
+        net_premium = gross_premium - premium_expense
+        balance_before_interest = account_value + net_premium - ADMIN_FEE - insurance_cost
+        balance_before_interest = np.where(balance_before_interest < 0, 0, balance_before_interest)
+
+        account_value_end = balance_before_interest * (1 + interest_rates)
+        death_benefit = np.maximum(sum_assureds, account_value_end)
+
+        out['premium'][active, t] = gross_premium[active]
+        out['expense'][active, t] = premium_expense[active]
+        out['coi'][active, t] = insurance_cost[active]
+        out['account_value'][active, t] = account_value_end[active]
+        out['death_benefit'][active, t] = death_benefit[active]
+        n_years += active
+
+        account_value = np.where(active, account_value_end, account_value)
+        # 只有在繳費期滿後且帳戶價值歸零才停止
+        active &= ~((account_value_end <= 0) & (year > payment_terms))
+
+    out['ages'] = ages
+    out['n_years'] = n_years
+    return out
+
+
+@memoize(maxsize=512, ttl=3600)
+def _cached_projection(age, gender, target_premium, basic_sum_assured, payment_term, interest_rate):
+    return STORE.fetch(
+        "ul", f"{PRODUCTS.version('UL')}-{code_version('ul_engine')}",
+        (age, gender, target_premium, basic_sum_assured, payment_term, interest_rate),
+        lambda: project_batch(age, gender, target_premium, basic_sum_assured, payment_term, interest_rate),
+    )
+
+
+def cached_projection(age, gender, target_premium, basic_sum_assured, payment_term, interest_rate):
+    """單一情境試算 (內建費率表) 的快取版本，輸入正規化後查快取 (記憶體，再來是磁碟結果庫)，回傳唯讀批次結果"""
+    return _cached_projection(
+        int(age), gender, normalize_amount(target_premium), normalize_amount(basic_sum_assured),
+        int(payment_term), float(interest_rate),
+    )
+
+
+def projection_frame(batch, i=0):
+    """取出批次結果中第 i 個情境，轉為與逐年試算相同欄位的 DataFrame"""
+    import pandas as pd
+
+    n = int(batch['n_years'][i])
+    years = np.arange(1, n + 1)
+    return pd.DataFrame({
+        '年度': years,
+        '年齡': batch['ages'][i] + years - 1,
+        '實繳保費': batch['premium'][i, :n],
+        '保費費用': batch['expense'][i, :n].astype(np.int64),
+        '危險成本': batch['coi'][i, :n].astype(np.int64),
+        '帳戶價值': batch['account_value'][i, :n].astype(np.int64),
+        '身故保險金': batch['death_benefit'][i, :n].astype(np.int64),
+    })
+
+
+def batch_long_frame(batch):
+    """批次結果中所有情境串接為一張長表 (欄位同 projection_frame)，另加 scenario 欄標示情境序號"""
+    import pandas as pd
+
+    n, T = batch['premium'].shape
+    years = np.arange(1, T + 1)
+    valid = years[None, :] <= batch['n_years'][:, None]
+    return pd.DataFrame({
+        'scenario': np.repeat(np.arange(n), batch['n_years']),
+        '年度': np.broadcast_to(years, (n, T))[valid],
+        '年齡': (batch['ages'][:, None] + years - 1)[valid],
+        '實繳保費': batch['premium'][valid],
+        '保費費用': batch['expense'][valid].astype(np.int64),
+        '危險成本': batch['coi'][valid].astype(np.int64),
+        '帳戶價值': batch['account_value'][valid].astype(np.int64),
+        '身故保險金': batch['death_benefit'][valid].astype(np.int64),
+    })
+
+
+# --- 目標反推 (保費 / 保額 / 宣告利率) ---
+SCENARIO_KEYS = ['age', 'gender', 'target_premium', 'basic_sum_assured', 'payment_term', 'interest_rate']
+SOLVE_DEFAULTS = {
+    # 參數: (是否越大越容易達標, 預設容許誤差)
+    'target_premium': (True, 1.0),
+    'basic_sum_assured': (False, 1000.0),
+    'interest_rate': (True, 1e-5),
+}
+ALWAYS_MET = 'always_met'  # 反推結果：搜尋範圍內每個候選值都達標 (邊界在範圍外)
+
+
+def coverage_age(batch):
+    """各情境保額維持至幾歲 (最後一個有效年度的年齡)"""
+    return batch['ages'] + batch['n_years'] - 1
+
+
+def account_value_at(batch, year):
+    """各情境第 year 年末帳戶價值；已停效或超出試算期間者為 0"""
+    if year < 1 or year > batch['account_value'].shape[1]:
+        return np.zeros(len(batch['ages']))
+    return np.where(batch['n_years'] >= year, batch['account_value'][:, year - 1], 0)
+
+
+def _meets_target(batch, target_age, target_year, target_value):
+    ok = np.ones(len(batch['ages']), dtype=bool)
+    if target_age is not None:
+        ok &= coverage_age(batch) >= target_age
+    if target_year is not None:
+        ok &= account_value_at(batch, target_year) >= target_value
+    return ok
+
+
+@timed("ul.solve_for_target")
+def solve_for_target(param, scenario, target_age=None, target_year=None, target_value=0,
+                     low=None, high=None, tol=None, grid=32, max_calls=20, coi_table=None):
+    """
+    以批次試算做區間搜尋，反推達成目標所需的參數
+    param: 'target_premium' 求最低保費、'interest_rate' 求損益兩平宣告利率、'basic_sum_assured' 求最高保額
+    scenario: 其餘試算條件 (鍵同 SCENARIO_KEYS)
+    目標: target_age 保額維持至該年齡；target_year/target_value 第 N 年帳戶價值不低於指定金額 (可並用)
+    每次呼叫 kernel 同時試算 grid 個候選值，區間每次縮小約 grid 倍，通常 4~6 次即收斂
+    回傳 (解, kernel 呼叫次數)；搜尋範圍內無解時解為 None，範圍內全部達標 (找不到邊界) 時解為 ALWAYS_MET
+    """
+    if param not in SOLVE_DEFAULTS:
+        raise ValueError(f"不支援反推的參數: {param}")
+    if target_age is None and target_year is None:
+        raise ValueError("請指定 target_age 或 target_year")
+    increasing, default_tol = SOLVE_DEFAULTS[param]
+    tol = default_tol if tol is None else tol
+    if coi_table is None:
+        coi_table = load_coi_table()
+
+    if low is None:
+        low = 0.0
+    if high is None:
+        high = {
+            'target_premium': float(scenario['basic_sum_assured']),
+            'basic_sum_assured': float(scenario['target_premium']) * 1000,
+            'interest_rate': 0.2,
+        }[param]
+
+    args = [scenario[k] for k in SCENARIO_KEYS]
+    pos = SCENARIO_KEYS.index(param)
+    lo, hi = float(low), float(high)
+    calls = 0
+    while calls < max_calls:
+        candidates = np.linspace(lo, hi, grid)
+        args[pos] = candidates
+        ok = _meets_target(project_batch(*args, coi_table=coi_table), target_age, target_year, target_value)
+        calls += 1
+
+        if not ok.any():
+            return None, calls
+        if ok.all():
+            # 只會發生在第一輪 (之後區間的一端必定未達標)
+            return ALWAYS_MET, calls
+        if increasing:
+            j = int(np.argmax(ok))
+            lo, hi = candidates[j - 1], candidates[j]
+        else:
+            j = len(ok) - 1 - int(np.argmax(ok[::-1]))
+            lo, hi = candidates[j], candidates[j + 1]
+
+        if hi - lo <= tol:
+            break
+    # 回傳確定達標的一端
+    return (hi if increasing else lo), calls
@@ -1,10 +1,25 @@
-import pandas as pd
+import numpy as np
+import csv
+import hashlib
 import json
+import mmap
+import os
 
-def load_policy_data(csv_path="PDATA.csv"):
+from cache import memoize, normalize_amount
+from metrics import count, timed
+from store import STORE, code_version
+
+# --- 編譯後費率表快取 (二進位檔，mmap 讀取) ---
+CACHE_MAGIC = b"PDATAC01"
+CACHE_HEADER_SIZE = 4096  # 固定長度標頭，來源檔 mtime 變動時可原地更新
+CACHE_ALIGN = 64
+
+def _parse_policy_csv(csv_path):
     """
-    解析富邦 PDATA.csv 轉換為 Streamlit 可用的字典格式
+    解析富邦 PDATA.csv 轉換為 Streamlit 可用的字典格式 (逐列解析，較慢)
     """
+    import pandas as pd
+
     # 讀取 CSV，不帶 Header，因為格式混亂
     df = pd.read_csv(csv_path, header=None)
     
@@ -83,6 +98,261 @@ def load_policy_data(csv_path="PDATA.csv"):
             
     return data
 
+# --- 串流解析 (單次掃描、分塊讀取，只取各區塊需要的欄位) ---
+PARSE_CHUNK_ROWS = 2000          # 每塊列數，決定解析時的記憶體上限
+MARKER_COL = 129                 # 區塊標記欄 (DIE / PV0 / PV)
+PREMIUM_COLS = [5, 7, 10]        # 保費區: 性別、年齡、費率
+TABLE_KEY_COLS = [131, 132]      # 身故金/解約金區: 性別、年齡
+TABLE_VALUE_START = 134          # 身故金/解約金區: 第1年起的數值
+SECTION_MARKERS = {"DIE": "death_benefit", "PV0": None, "PV": "cash_value"}  # PV0 區不使用
+
+def _wanted_columns(csv_path):
+    """依第一列欄數決定要讀取的欄位 (與 read_csv(header=None) 推斷欄數的方式相同)"""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        width = len(next(csv.reader(f), []))
+    fixed = PREMIUM_COLS + [MARKER_COL] + TABLE_KEY_COLS
+    return [c for c in fixed if c < width] + list(range(TABLE_VALUE_START, width))
+
+def _numeric(frame):
+    """
+    逐欄轉為 float 陣列，無法解析者為 NaN
+    千分位已由 read_csv(thousands=",") 處理；只有同一塊內混到標題列 (整欄為字串) 時才需去逗號
+    """
+    import pandas as pd
+
+    cols = []
+    for col in frame.columns:
+        values = frame[col]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = values.str.replace(",", "", regex=False)
+        cols.append(pd.to_numeric(values, errors="coerce").to_numpy(dtype=float))
+    return np.column_stack(cols) if cols else np.empty((len(frame), 0))
+
+def _collect_section_rows(data, section, rows):
+    if section == "premium_rate":
+        vals = _numeric(rows.reindex(columns=PREMIUM_COLS))
+        for sex, age, rate in vals[~np.isnan(vals).any(axis=1)]:
+            data["premium_rate"][f"{int(sex)}_{int(age)}"] = float(rate)
+        return
+    keys = _numeric(rows.reindex(columns=TABLE_KEY_COLS))
+    values = _numeric(rows.loc[:, rows.columns >= TABLE_VALUE_START])
+    ok = ~np.isnan(keys).any(axis=1)
+    for (sex, age), row in zip(keys[ok], values[ok]):
+        data[section][f"{int(sex)}_{int(age)}"] = row[~np.isnan(row)].tolist()
+
+def _stream_policy_csv(csv_path, chunksize=PARSE_CHUNK_ROWS):
+    """
+    單次掃描解析 PDATA.csv，結果與 _parse_policy_csv 相同格式
+    邊讀邊偵測區塊標記 (每個標記只認第一次出現)，標記列與其下一列 (欄位標題) 略過；
+    只讀取保費/身故金/解約金需要的欄位，記憶體用量與檔案大小無關 (只和 chunksize 有關)
+    找不到完整的 DIE / PV0 / PV 標記時回傳 None，由呼叫端退回逐列解析 (含固定列號備援)
+    """
+    import pandas as pd
+
+    data = {"premium_rate": {}, "death_benefit": {}, "cash_value": {}}
+    section = "premium_rate"
+    seen = set()
+    skip = 1  # 第一列為檔頭
+    reader = pd.read_csv(csv_path, header=None, usecols=_wanted_columns(csv_path), thousands=",", chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.reset_index(drop=True)
+        markers = chunk[MARKER_COL] if MARKER_COL in chunk else pd.Series(np.nan, index=chunk.index)
+        bounds = [pos for pos in np.flatnonzero(markers.isin(list(SECTION_MARKERS))) if markers.iat[pos] not in seen]
+        start = 0
+        for pos in [*bounds, len(chunk)]:
+            if pos < len(chunk) and markers.iat[pos] in seen:
+                continue  # 同一塊內重複出現的標記視為一般資料列
+            begin = min(start + skip, pos)
+            skip -= begin - start
+            if section is not None and begin < pos:
+                _collect_section_rows(data, section, chunk.iloc[begin:pos])
+            if pos < len(chunk):
+                seen.add(markers.iat[pos])
+                section = SECTION_MARKERS[markers.iat[pos]]
+                start, skip = pos + 1, 1
+    if seen != set(SECTION_MARKERS):
+        return None
+    return data
+
+@timed("pdata.parse")
+def parse_policy_csv(csv_path, chunksize=PARSE_CHUNK_ROWS):
+    """PDATA.csv -> 字典格式；優先串流解析，缺少區塊標記時退回逐列解析"""
+    data = _stream_policy_csv(csv_path, chunksize)
+    return data if data is not None else _parse_policy_csv(csv_path)
+
+def _policy_cache_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".ratecache"
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _split_key(key):
+    sex, age = key.split("_")
+    return int(sex), int(age)
+
+def _dict_to_arrays(data):
+    """
+    字典格式 -> 密集陣列，索引為 (性別, 年齡[, 年度])，缺值補 NaN
+    sexes 為性別代碼清單，陣列第一維依此排序
+    """
+    keys = set(data["premium_rate"]) | set(data["death_benefit"]) | set(data["cash_value"])
+    pairs = [_split_key(k) for k in keys]
+    sexes = sorted({s for s, _ in pairs})
+    n_ages = max((a for _, a in pairs), default=-1) + 1
+    n_years = max((len(v) for sec in ("death_benefit", "cash_value") for v in data[sec].values()), default=0)
+    sex_idx = {s: i for i, s in enumerate(sexes)}
+
+    arrays = {
+        "premium": np.full((len(sexes), n_ages), np.nan),
+        "has_premium": np.zeros((len(sexes), n_ages), dtype=np.uint8),
+        "die": np.full((len(sexes), n_ages, n_years), np.nan),
+        "die_len": np.zeros((len(sexes), n_ages), dtype=np.int32),
+        "pv": np.full((len(sexes), n_ages, n_years), np.nan),
+        "pv_len": np.zeros((len(sexes), n_ages), dtype=np.int32),
+    }
+    for key, rate in data["premium_rate"].items():
+        sex, age = _split_key(key)
+        arrays["premium"][sex_idx[sex], age] = rate
+        arrays["has_premium"][sex_idx[sex], age] = 1
+    for sec, name in (("death_benefit", "die"), ("cash_value", "pv")):
+        for key, values in data[sec].items():
+            sex, age = _split_key(key)
+            arrays[name][sex_idx[sex], age, :len(values)] = values
+            arrays[name + "_len"][sex_idx[sex], age] = len(values)
+    return sexes, arrays
+
+def _arrays_to_dict(tables):
+    """密集陣列 -> load_policy_data 的字典格式"""
+    data = {"premium_rate": {}, "death_benefit": {}, "cash_value": {}}
+    sexes = tables["sexes"]
+    for i, a in np.argwhere(tables["has_premium"]):
+        data["premium_rate"][f"{sexes[i]}_{a}"] = float(tables["premium"][i, a])
+    for sec, name in (("death_benefit", "die"), ("cash_value", "pv")):
+        lens = tables[name + "_len"]
+        for i, a in np.argwhere(lens > 0):
+            data[sec][f"{sexes[i]}_{a}"] = tables[name][i, a, :lens[i, a]].tolist()
+    return data
+
+def _write_cache_header(f, header):
+    raw = json.dumps(header).encode("utf-8")
+    if len(CACHE_MAGIC) + 4 + len(raw) > CACHE_HEADER_SIZE:
+        raise ValueError("費率快取標頭過長")
+    f.seek(0)
+    f.write(CACHE_MAGIC + len(raw).to_bytes(4, "little") + raw)
+
+def _read_cache_header(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            head = f.read(CACHE_HEADER_SIZE)
+    except OSError:
+        return None
+    if not head.startswith(CACHE_MAGIC):
+        return None
+    n = int.from_bytes(head[len(CACHE_MAGIC):len(CACHE_MAGIC) + 4], "little")
+    try:
+        return json.loads(head[len(CACHE_MAGIC) + 4:len(CACHE_MAGIC) + 4 + n])
+    except ValueError:
+        return None
+
+@timed("pdata.compile")
+def compile_policy_data(csv_path="PDATA.csv", cache_path=None):
+    """
+    將 PDATA.csv 編譯為二進位快取檔 (預設為同名 .ratecache)
+    內容: 固定長度標頭 (來源 mtime/size/sha256、性別代碼、各陣列 dtype/shape/offset)
+         + premium[性別, 年齡]、die/pv[性別, 年齡, 年度] 等 float64 密集陣列
+    以暫存檔寫入後原子替換，其他行程已開啟的 mmap 不受影響
+    """
+    cache_path = cache_path or _policy_cache_path(csv_path)
+    stat = os.stat(csv_path)
+    sexes, arrays = _dict_to_arrays(parse_policy_csv(csv_path))
+
+    specs = {}
+    offset = CACHE_HEADER_SIZE
+    for name, arr in arrays.items():
+        specs[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += -(-arr.nbytes // CACHE_ALIGN) * CACHE_ALIGN
+    header = {
+        "version": 1,
+        "source": {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": _file_sha256(csv_path)},
+        "sexes": sexes,
+        "arrays": specs,
+    }
+
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        _write_cache_header(f, header)
+        for name, arr in arrays.items():
+            f.seek(specs[name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+def _cache_is_fresh(header, csv_path, cache_path):
+    if header is None:
+        return False
+    src = header["source"]
+    stat = os.stat(csv_path)
+    if src["mtime_ns"] == stat.st_mtime_ns and src["size"] == stat.st_size:
+        return True
+    # mtime 變動但內容相同 (例如重新 checkout)：只更新標頭，不重新編譯
+    if src["size"] != stat.st_size or src["sha256"] != _file_sha256(csv_path):
+        return False
+    src["mtime_ns"] = stat.st_mtime_ns
+    with open(cache_path, "r+b") as f:
+        _write_cache_header(f, header)
+    return True
+
+def _fresh_cache_header(csv_path, cache_path):
+    """編譯快取的標頭；快取不存在或已過期時先重新編譯"""
+    header = _read_cache_header(cache_path)
+    if not _cache_is_fresh(header, csv_path, cache_path):
+        compile_policy_data(csv_path, cache_path)
+        header = _read_cache_header(cache_path)
+    return header
+
+@timed("pdata.load_compiled")
+def load_compiled_tables(csv_path="PDATA.csv", cache_path=None):
+    """
+    以 mmap 開啟編譯後的費率表，回傳唯讀零複製陣列 view:
+    { "sexes": [1, 2], "premium": (性別, 年齡), "die"/"pv": (性別, 年齡, 年度), ... }
+    CSV 的 mtime 或內容變更時自動重建快取
+    """
+    cache_path = cache_path or _policy_cache_path(csv_path)
+    header = _fresh_cache_header(csv_path, cache_path)
+
+    with open(cache_path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    tables = {"sexes": header["sexes"]}
+    for name, spec in header["arrays"].items():
+        n_items = int(np.prod(spec["shape"]))
+        tables[name] = np.frombuffer(mm, dtype=spec["dtype"], count=n_items, offset=spec["offset"]).reshape(spec["shape"])
+    return tables
+
+@memoize(maxsize=4, ttl=None)
+def _compiled_policy_dict(csv_path, cache_path, sha256, mtime_ns, size):
+    # 以快取標頭記錄的來源版本為鍵：同一版本的費率表只轉換一次字典格式
+    return _arrays_to_dict(load_compiled_tables(csv_path, cache_path))
+
+@timed("pdata.load")
+def load_policy_data(csv_path="PDATA.csv", use_cache=True):
+    """
+    解析富邦 PDATA.csv 轉換為 Streamlit 可用的字典格式
+    預設經由編譯快取讀取，同一版本的費率表只轉換一次 (各呼叫端共用同一份字典，請勿修改)；
+    快取目錄不可寫入時直接解析 CSV。新程式請直接使用陣列表 (load_compiled_tables / calculate_policy_batch)
+    """
+    if use_cache:
+        try:
+            cache_path = _policy_cache_path(csv_path)
+            src = _fresh_cache_header(csv_path, cache_path)["source"]
+            return _compiled_policy_dict(csv_path, cache_path, src["sha256"], src["mtime_ns"], src["size"])
+        except OSError:
+            pass
+    return parse_policy_csv(csv_path)
+
 # --- Streamlit 計算邏輯 ---
 def calculate_policy(age, gender, amount, data):
     """
@@ -91,6 +361,8 @@ def calculate_policy(age, gender, amount, data):
     amount: 投保保額 (例如 100萬)
     data: 上面 load_policy_data 產出的字典
     """
+    import pandas as pd
+
     unit_base = 10000 # 假設費率是每萬元
     key = f"{gender}_{age}"
     
@@ -121,3 +393,111 @@ def calculate_policy(age, gender, amount, data):
         })
         
     return premium, pd.DataFrame(results)
+
+@memoize(maxsize=16, ttl=None)
+def _policy_version(csv_path, mtime_ns, size):
+    # 以 mtime/大小為鍵，檔案未變動時不重算 sha256
+    return f"{_file_sha256(csv_path)[:12]}-{code_version('utils')}"
+
+@memoize(maxsize=512, ttl=3600)
+def _cached_policy(age, gender, amount, csv_path, version):
+    import pandas as pd
+
+    def compute():
+        try:
+            tables = load_compiled_tables(csv_path)
+        except OSError:
+            # 快取目錄不可寫入：退回字典格式逐年試算
+            premium, frame = calculate_policy(age, gender, amount, load_policy_data(csv_path, use_cache=False))
+            return {"premium": premium, **{col: frame[col].to_numpy() for col in frame.columns}}
+        # 直接讀 mmap 陣列表 (不轉回字典)，欄位與 calculate_policy 相同
+        batch = calculate_policy_batch(age, gender, amount, tables=tables)
+        years = np.arange(1, int(batch["n_years"][0]) + 1)
+        values = batch["values"][0, :len(years)]
+        result = {"premium": float(batch["premium"][0]), "保單年度": years, "年齡": age + years}
+        for col in ("累積保費", "身故保險金", "解約金(保價)"):
+            result[col] = values[:, POLICY_METRICS.index(col)]
+        return result
+
+    result = STORE.fetch(f"pdata.{os.path.abspath(csv_path)}", version, (age, gender, amount), compute)
+    return result["premium"], pd.DataFrame({col: value for col, value in result.items() if col != "premium"})
+
+def cached_policy(age, gender, amount, csv_path="PDATA.csv"):
+    """
+    calculate_policy 的快取版本：依 PDATA.csv 內容版本查記憶體快取，再查磁碟結果庫 (store，各行程共用)
+    CSV 改變時版本不同，舊結果自動失效；回傳 (年繳保費, DataFrame)，DataFrame 為複本可任意修改
+    """
+    stat = os.stat(csv_path)
+    version = _policy_version(csv_path, stat.st_mtime_ns, stat.st_size)
+    premium, frame = _cached_policy(int(age), int(gender), normalize_amount(amount), csv_path, version)
+    return premium, frame.copy()
+
+# --- 批次試算 (整批保單一次計算) ---
+UNIT_BASE = 10000   # 費率為每萬元
+PREMIUM_TERM = 6    # 假設6年期
+POLICY_METRICS = ("年繳保費", "累積保費", "身故保險金", "解約金(保價)")
+
+@timed("pdata.calculate_policy_batch")
+def calculate_policy_batch(ages, genders=None, amounts=None, tables=None, csv_path="PDATA.csv"):
+    """
+    整批計算 calculate_policy，每筆保單不再逐年迴圈
+    ages/genders/amounts: 陣列 (或純量)；也可只傳入含 age/gender/amount 欄位的 DataFrame
+    tables: load_compiled_tables 的結果，未提供時由 csv_path 載入
+    回傳 dict:
+      premium: (保單,) 年繳保費
+      n_years: (保單,) 有效年度數 (身故金/解約金表取較短者)
+      values:  (保單, 年度, 指標) 依 POLICY_METRICS 排列，超出有效年度為 NaN
+    """
+    if hasattr(ages, "columns"):  # DataFrame (不為此匯入 pandas)
+        ages, genders, amounts = ages["age"], ages["gender"], ages["amount"]
+    if tables is None:
+        tables = load_compiled_tables(csv_path)
+
+    ages, genders, amounts = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(ages, dtype=np.int64)),
+        np.asarray(genders, dtype=np.int64),
+        np.asarray(amounts, dtype=float),
+    )
+    count("pdata.policies", len(ages))
+    sexes = np.asarray(tables["sexes"], dtype=np.int64)
+    n_sexes, n_ages = tables["has_premium"].shape
+
+    # 性別代碼 -> 陣列索引；查無此性別或年齡者視為無資料 (保費 0、年度 0)
+    sex_pos = np.searchsorted(sexes, genders)
+    sex_pos = np.minimum(sex_pos, max(n_sexes - 1, 0))
+    found = (n_sexes > 0) & (sexes[sex_pos] == genders) & (ages >= 0) & (ages < n_ages)
+    s = np.where(found, sex_pos, 0)
+    a = np.where(found, ages, 0)
+
+    rate = np.where(found & (tables["has_premium"][s, a] == 1), tables["premium"][s, a], 0)
+    units = amounts / UNIT_BASE
+    premium = units * rate
+    n_years = np.where(found, np.minimum(tables["die_len"][s, a], tables["pv_len"][s, a]), 0)
+
+    max_years = int(n_years.max()) if n_years.size else 0
+    policy_year = np.arange(1, max_years + 1)
+    valid = policy_year[None, :] <= n_years[:, None]
+
+    values = np.full((len(ages), max_years, len(POLICY_METRICS)), np.nan)
+    values[..., 0] = np.where(policy_year <= PREMIUM_TERM, premium[:, None], 0)
+    values[..., 1] = premium[:, None] * np.minimum(policy_year, PREMIUM_TERM)
+    values[..., 2] = units[:, None] * tables["die"][s, a, :max_years]
+    values[..., 3] = units[:, None] * tables["pv"][s, a, :max_years]
+    values[~valid] = np.nan
+
+    return {"ages": ages, "premium": premium, "n_years": n_years, "values": values}
+
+def policy_batch_frame(batch):
+    """批次結果轉為長格式 DataFrame (每列 = 保單 × 保單年度)"""
+    import pandas as pd
+
+    n_policies, max_years, _ = batch["values"].shape
+    policy_idx, year_idx = np.nonzero(np.arange(max_years)[None, :] < batch["n_years"][:, None])
+    frame = pd.DataFrame({
+        "保單序號": policy_idx,
+        "保單年度": year_idx + 1,
+        "年齡": batch["ages"][policy_idx] + year_idx + 1,
+    })
+    for k, name in enumerate(POLICY_METRICS):
+        frame[name] = batch["values"][policy_idx, year_idx, k]
+    return frame